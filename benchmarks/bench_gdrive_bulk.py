@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+"""Measure bulk upload/download throughput against a fake Drive backend as workers scale.
+
+Usage: python -m benchmarks.bench_gdrive_bulk [--files 64] [--latency 0.02]
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+from unittest.mock import patch
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from benchmarks.stubs import FakeDriveService
+from src.gdrive_server.bulk import bulk_download, bulk_upload
+from src.gdrive_server.transfers import UploadSessionStore
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--files", type=int, default=64)
+    parser.add_argument("--latency", type=float, default=0.02)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8, 16])
+    args = parser.parse_args()
+
+    service = FakeDriveService(latency=args.latency)
+    with tempfile.TemporaryDirectory() as tmp:
+        source_dir = os.path.join(tmp, "source")
+        os.makedirs(source_dir)
+        paths = []
+        for i in range(args.files):
+            path = os.path.join(source_dir, f"artifact-{i}.bin")
+            with open(path, "wb") as f:
+                f.write(os.urandom(service.file_size))
+            paths.append(path)
+        file_ids = [f"file-{i}" for i in range(args.files)]
+        sessions = UploadSessionStore(os.path.join(tmp, "sessions.json"))
+
+        with patch("src.gdrive_server.bulk.get_thread_http", return_value=None), \
+                patch("src.gdrive_server.bulk.upload_sessions", sessions):
+            print(f"{'workers':>8} {'upload files/s':>15} {'download files/s':>17}")
+            for workers in args.workers:
+                up = asyncio.run(bulk_upload(service, paths, max_workers=workers))
+                down = asyncio.run(bulk_download(service, file_ids, os.path.join(tmp, f"out-{workers}"),
+                                                 max_workers=workers))
+                assert up["failed"] == down["failed"] == 0
+                print(f"{workers:>8} {up['total'] / up['seconds']:>15.1f} "
+                      f"{down['total'] / down['seconds']:>17.1f}")
+
+
+if __name__ == "__main__":
+    main()
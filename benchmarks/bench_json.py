@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+"""Compare the JSON backends of shared.utils.dumps on tool-sized payloads.
+
+Usage: python -m benchmarks.bench_json [--files 5000] [--days 10] [--repeat 50]
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from benchmarks.payloads import drive_listing_payload, forecast_payload
+from src.shared.utils import SERIALIZERS
+
+
+def measure(dumps, payload, compact, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        dumps(payload, compact)
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--files", type=int, default=5000)
+    parser.add_argument("--days", type=int, default=10)
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    if "orjson" not in SERIALIZERS:
+        print("orjson is not installed; only the stdlib backend is available")
+    payloads = {f"list_files, {args.files} files": drive_listing_payload(args.files),
+                f"forecast, {args.days} days": forecast_payload(args.days)}
+    for label, payload in payloads.items():
+        print(f"{label} (median of {args.repeat} runs)")
+        for compact in (False, True):
+            baseline = None
+            for backend, dumps in SERIALIZERS.items():
+                seconds = measure(dumps, payload, compact, args.repeat)
+                baseline = baseline or seconds
+                mode = "compact" if compact else "indented"
+                print(f"  {backend:7} {mode:9} {seconds * 1e3:8.2f} ms  ({baseline / seconds:4.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,247 @@
+#!/usr/bin/env python3
+"""Load-test both MCP servers over stdio against local stand-in upstreams.
+
+Each server runs as a real subprocess, exactly as an editor launches it, with
+its upstream pointed at a stub from benchmarks.stubs that adds --latency to
+every request and fails --error-rate of them with a 503. Each scenario makes
+--calls tool calls, --concurrency at a time, over one MCP session and reports
+throughput and client-side p50/p95/p99 latency; peak RSS comes from the
+server's own get_server_metrics tool.
+
+Results are compared with benchmarks/baselines/load.json, recorded with the
+same settings: a scenario whose throughput drops, or whose p95 latency or
+peak RSS grows, by more than --tolerance fails the run (exit 1).
+--save-baseline records the current results instead.
+
+Usage: python -m benchmarks.bench_load [--calls 200] [--concurrency 10] [--latency 0.02]
+                                       [--error-rate 0] [--save-baseline] [scenario ...]
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from benchmarks.bench_startup import ROOT, SERVERS
+from benchmarks.stubs import StubDriveHandler, StubWeatherHandler, start_stub_server
+from src.shared.metrics import DIAGNOSTIC_TOOL_NAME, percentile
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baselines', 'load.json')
+# Distinct locations per weather scenario; with the default --calls half the
+# single-location calls and all batch lookups after the first pass hit the cache
+LOCATIONS = 100
+BATCH_LOCATIONS = 1000
+DRIVE_FILES = 500
+
+# name: (server, tool, arguments for the i-th call)
+SCENARIOS = {
+    "weather_current": ("weather", "get_current_weather",
+                        lambda i: {"location": f"City {i % LOCATIONS}"}),
+    "weather_forecast": ("weather", "get_weather_forecast",
+                         lambda i: {"location": f"City {i % LOCATIONS}", "days": 3, "detail": "full"}),
+    "weather_forecast_mixed": ("weather", "get_weather_forecast",
+                               lambda i: {"location": f"Village {i % LOCATIONS}", "days": (1, 3, 7, 3)[i % 4]}),
+    "weather_batch": ("weather", "get_weather_batch",
+                      lambda i: {"locations": [f"Town {(i * 10 + n) % BATCH_LOCATIONS}" for n in range(10)]}),
+    "drive_list_index": ("gdrive", "list_files",
+                         lambda i: {"query": "name contains 'report'", "max_results": 50}),
+    "drive_list_api": ("gdrive", "list_files",
+                       lambda i: {"query": f"name contains 'notes-{i % 10}'", "max_results": 50,
+                                  "fresh": True}),
+    "drive_metadata": ("gdrive", "get_files_metadata",
+                       lambda i: {"file_ids": [f"file-{(i * 20 + n) % DRIVE_FILES}" for n in range(20)]}),
+}
+
+
+def server_env(name, upstream_url, workdir):
+    """Environment for a server subprocess talking to the stub at upstream_url."""
+    env = dict(os.environ, MCP_DIAGNOSTICS="1")
+    if name == "weather":
+        config_path = os.path.join(workdir, "weather_config.json")
+        with open(config_path, "w") as f:
+            # Lift the client-side rate limit so it doesn't cap the measurement
+            json.dump({"api_key": "bench", "base_url": upstream_url, "timeout": 10,
+                       "retry": {"requests_per_second": 10000, "burst": 10000}}, f)
+        env.update(WEATHER_CONFIG_PATH=config_path, WEATHER_DOTENV_PATH=os.devnull)
+    else:
+        env.update(GDRIVE_API_ROOT=upstream_url, GDRIVE_NO_AUTH="1",
+                   GDRIVE_INDEX_PATH=os.path.join(workdir, "drive_index.sqlite"),
+                   GDRIVE_RATE_LIMIT="10000", GDRIVE_RATE_BURST="10000")
+    return env
+
+
+def is_error(result) -> bool:
+    # The weather server raises (isError); the Drive server answers "Error: ..."
+    return result.isError or any(getattr(content, "text", "").startswith("Error:")
+                                 for content in result.content)
+
+
+async def server_stats(session) -> dict:
+    result = await session.call_tool(DIAGNOSTIC_TOOL_NAME, {})
+    return json.loads(result.content[0].text)
+
+
+async def wait_for_index(session, timeout=30.0):
+    """Trigger the Drive metadata index build and wait until it is ready."""
+    await session.call_tool("list_files", {"max_results": 1})
+    deadline = time.monotonic() + timeout
+    while (await server_stats(session))["index_age_seconds"] is None:
+        if time.monotonic() > deadline:
+            raise RuntimeError("The Drive index was not built in time")
+        await asyncio.sleep(0.05)
+
+
+async def timed_calls(session, tool, make_arguments, calls, concurrency) -> tuple[list, int]:
+    """Make calls tool calls, concurrency at a time; returns (latencies, error count)."""
+    latencies = []
+    errors = 0
+    numbers = iter(range(calls))
+
+    async def worker():
+        nonlocal errors
+        for i in numbers:
+            started = time.perf_counter()
+            result = await session.call_tool(tool, make_arguments(i))
+            latencies.append(time.perf_counter() - started)
+            errors += is_error(result)
+
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return latencies, errors
+
+
+async def run_scenario(session, tool, make_arguments, calls, concurrency) -> dict:
+    started = time.perf_counter()
+    latencies, errors = await timed_calls(session, tool, make_arguments, calls, concurrency)
+    return summarize(latencies, errors, time.perf_counter() - started)
+
+
+def summarize(latencies, errors, elapsed) -> dict:
+    """Throughput and latency percentiles for one run of tool calls."""
+    calls = len(latencies)
+    latencies = sorted(latencies)
+    return {
+        "calls": calls,
+        "errors": errors,
+        "throughput": round(calls / elapsed, 1),
+        "p50_ms": round(1000 * percentile(latencies, 0.50), 2),
+        "p95_ms": round(1000 * percentile(latencies, 0.95), 2),
+        "p99_ms": round(1000 * percentile(latencies, 0.99), 2),
+    }
+
+
+async def run_server(name, scenarios, args, workdir) -> dict:
+    """Run the given scenarios against one server subprocess; returns results by scenario."""
+    from mcp import ClientSession
+    from mcp.client.stdio import StdioServerParameters, stdio_client
+
+    handler = StubWeatherHandler if name == "weather" else StubDriveHandler
+    httpd, upstream_url = start_stub_server(handler, latency=args.latency, error_rate=args.error_rate,
+                                            file_count=DRIVE_FILES)
+    params = StdioServerParameters(command=sys.executable, args=["-m", SERVERS[name]],
+                                   env=server_env(name, upstream_url, workdir), cwd=ROOT)
+    results = {}
+    try:
+        with open(os.devnull, "w") as errlog:
+            async with stdio_client(params, errlog=errlog) as (read, write), \
+                    ClientSession(read, write) as session:
+                await session.initialize()
+                if "drive_list_index" in scenarios:
+                    await wait_for_index(session)
+                for scenario in scenarios:
+                    _, tool, make_arguments = SCENARIOS[scenario]
+                    result = await run_scenario(session, tool, make_arguments,
+                                                args.calls, args.concurrency)
+                    stats = await server_stats(session)
+                    result["max_rss_mb"] = stats["process"].get("max_rss_mb")
+                    results[scenario] = result
+                    print(f"{scenario:22} {result['throughput']:8.1f} calls/s  "
+                          f"p50 {result['p50_ms']:7.2f} ms  p95 {result['p95_ms']:7.2f} ms  "
+                          f"p99 {result['p99_ms']:7.2f} ms  rss {result['max_rss_mb']} MB  "
+                          f"errors {result['errors']}")
+    finally:
+        httpd.shutdown()
+    return results
+
+
+def regressions(results, baseline, tolerance) -> list[str]:
+    """Describe every metric that is worse than the baseline by more than tolerance."""
+    found = []
+    for scenario, result in results.items():
+        base = baseline.get(scenario)
+        if base is None:
+            continue
+        if result["throughput"] < base["throughput"] * (1 - tolerance):
+            found.append(f"{scenario}: throughput {result['throughput']} < baseline {base['throughput']}")
+        for metric in ("p95_ms", "max_rss_mb"):
+            if result[metric] is not None and base.get(metric) and \
+                    result[metric] > base[metric] * (1 + tolerance):
+                found.append(f"{scenario}: {metric} {result[metric]} > baseline {base[metric]}")
+    return found
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--calls", type=int, default=200, help="Tool calls per scenario")
+    parser.add_argument("--concurrency", type=int, default=10, help="Calls in flight at once")
+    parser.add_argument("--latency", type=float, default=0.02, help="Stub upstream latency (seconds)")
+    parser.add_argument("--error-rate", type=float, default=0.0,
+                        help="Fraction of upstream requests answered with a 503")
+    parser.add_argument("--tolerance", type=float, default=0.5,
+                        help="Allowed relative regression against the baseline")
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--save-baseline", action="store_true",
+                        help="Record these results as the new baseline")
+    parser.add_argument("scenarios", nargs="*", help=f"Scenarios to run (default: {' '.join(SCENARIOS)})")
+    args = parser.parse_args()
+    unknown = set(args.scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenario: {', '.join(sorted(unknown))}")
+    selected = args.scenarios or list(SCENARIOS)
+
+    results = {}
+    with tempfile.TemporaryDirectory() as workdir:
+        for name in SERVERS:
+            scenarios = [scenario for scenario in selected if SCENARIOS[scenario][0] == name]
+            if scenarios:
+                results.update(asyncio.run(run_server(name, scenarios, args, workdir)))
+
+    settings = {"calls": args.calls, "concurrency": args.concurrency,
+                "latency": args.latency, "error_rate": args.error_rate}
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(args.baseline), exist_ok=True)
+        baseline = {"settings": settings, "scenarios": {}}
+        if os.path.exists(args.baseline):
+            with open(args.baseline) as f:
+                saved = json.load(f)
+            if saved.get("settings") == settings:
+                baseline = saved
+        baseline["scenarios"].update(results)
+        with open(args.baseline, "w") as f:
+            json.dump(baseline, f, indent=2, sort_keys=True)
+            f.write("\n")
+        print(f"Baseline saved to {args.baseline}")
+        return
+
+    if not os.path.exists(args.baseline):
+        print("No baseline to compare with; record one with --save-baseline")
+        return
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    if baseline.get("settings") != settings:
+        print(f"Baseline was recorded with different settings ({baseline.get('settings')}); not comparing")
+        return
+    found = regressions(results, baseline["scenarios"], args.tolerance)
+    for regression in found:
+        print(f"REGRESSION {regression}")
+    if found:
+        sys.exit(1)
+    print(f"Within {args.tolerance:.0%} of the baseline")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""Measure cold start of both MCP servers: time until "ready for MCP connections".
+
+Each server is launched as a fresh subprocess with stdin held open, exactly as
+an editor would. Pass --budget to fail (exit 1) when a median exceeds it, and
+--importtime to break the startup down by module with `python -X importtime`.
+
+Usage: python -m benchmarks.bench_startup [--runs 5] [--budget 1.5] [--importtime 15]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+SERVERS = {
+    "weather": "src.weather_server.server",
+    "gdrive": "src.gdrive_server.server",
+}
+READY = "ready for MCP connections"
+
+
+def start_server(module, env, importtime=False):
+    """Start a server; returns (seconds until ready, importtime lines)."""
+    args = [sys.executable] + (["-X", "importtime"] if importtime else []) + ["-m", module]
+    started = time.perf_counter()
+    process = subprocess.Popen(args, cwd=ROOT, env=env, stdin=subprocess.PIPE,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+    imports = []
+    try:
+        for line in process.stderr:
+            if READY in line:
+                return time.perf_counter() - started, imports
+            if line.startswith("import time:"):
+                imports.append(line)
+        raise RuntimeError(f"{module} exited before it was ready")
+    finally:
+        process.kill()
+        process.wait()
+
+
+def slowest_imports(lines, top):
+    """Return the top (cumulative microseconds, module) entries from -X importtime output."""
+    entries = []
+    for line in lines:
+        _, self_us, cumulative_us, name = (part.strip() for part in
+                                           line.replace("import time:", "|", 1).split("|"))
+        if cumulative_us.isdigit():
+            entries.append((int(cumulative_us), name))
+    return sorted(entries, reverse=True)[:top]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--budget", type=float, default=None,
+                        help="Fail if a server's median time to ready exceeds this (seconds)")
+    parser.add_argument("--importtime", type=int, default=0, metavar="N",
+                        help="Also show the N slowest imports of each server")
+    parser.add_argument("servers", nargs="*", help=f"Servers to start (default: {' '.join(SERVERS)})")
+    args = parser.parse_args()
+    unknown = set(args.servers) - set(SERVERS)
+    if unknown:
+        parser.error(f"unknown server: {', '.join(sorted(unknown))}")
+
+    with tempfile.NamedTemporaryFile("w", suffix=".json", delete=False) as f:
+        json.dump({"api_key": "bench", "base_url": "http://127.0.0.1:9", "timeout": 10}, f)
+    env = dict(os.environ, WEATHER_CONFIG_PATH=f.name, GDRIVE_INDEX="0")
+
+    over_budget = []
+    try:
+        for name in args.servers or SERVERS:
+            module = SERVERS[name]
+            timings = [start_server(module, env)[0] for _ in range(args.runs)]
+            median = statistics.median(timings)
+            print(f"{name:8} ready in {median * 1000:7.1f} ms "
+                  f"(median of {args.runs}, min {min(timings) * 1000:.1f} ms)")
+            if args.budget is not None and median > args.budget:
+                over_budget.append(name)
+            if args.importtime:
+                _, lines = start_server(module, env, importtime=True)
+                for cumulative_us, imported in slowest_imports(lines, args.importtime):
+                    print(f"    {cumulative_us / 1000:8.1f} ms  {imported}")
+    finally:
+        os.unlink(f.name)
+
+    if over_budget:
+        print(f"Over the {args.budget}s startup budget: {', '.join(over_budget)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+"""Compare N MCP clients on N stdio server processes with N clients on one HTTP process.
+
+With stdio every client launches its own server, so N editor windows mean N
+processes, each with its own connection pool, caches and credentials. With
+--transport http one long-lived process serves them all. For each transport
+this starts --clients sessions against a stub upstream (as in bench_load),
+waits until all of them are initialized, then has every client make --calls
+calls of the scenario, --concurrency at a time, and reports:
+
+  connect_s       time until every session was initialized
+  throughput      calls per second across all clients
+  p50/p95/p99     client-side latency over every call
+  rss_mb          peak RSS summed over the server processes
+  upstream_calls  requests the servers made to the stub
+
+Usage: python -m benchmarks.bench_transport [--clients 10] [--calls 50] [--concurrency 2]
+                                            [--latency 0.02] [--transports stdio http] [scenario]
+"""
+import argparse
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from benchmarks.bench_load import (DRIVE_FILES, SCENARIOS, server_env, server_stats, summarize,
+                                   timed_calls, wait_for_index)
+from benchmarks.bench_startup import READY, ROOT, SERVERS
+from benchmarks.stubs import StubDriveHandler, StubWeatherHandler, start_stub_server
+from src.shared.serve import HTTP_PATH
+
+TRANSPORTS = ("stdio", "http")
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def client_env(name, upstream_url, workdir, index):
+    # Separate config and index files, as separate editor windows would have
+    client_dir = os.path.join(workdir, f"client-{index}")
+    os.makedirs(client_dir, exist_ok=True)
+    return server_env(name, upstream_url, client_dir)
+
+
+def start_http_server(name, env) -> tuple[subprocess.Popen, str]:
+    """Start one server with --transport http; returns (process, MCP endpoint URL) once ready."""
+    port = free_port()
+    process = subprocess.Popen([sys.executable, "-m", SERVERS[name], "--transport", "http",
+                                "--port", str(port)],
+                               cwd=ROOT, env=env, stdin=subprocess.DEVNULL,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+    for line in process.stderr:
+        if READY in line:
+            break
+    else:
+        raise RuntimeError(f"{SERVERS[name]} exited before it was ready")
+    # Keep draining stderr so a chatty server never blocks on a full pipe
+    threading.Thread(target=process.stderr.read, daemon=True).start()
+    return process, f"http://127.0.0.1:{port}{HTTP_PATH}/"
+
+
+async def run_clients(connects, scenario, args) -> tuple[dict, list[dict]]:
+    """Run one client per connect() context; returns (summary, each client's server stats)."""
+    from mcp import ClientSession
+
+    _, tool, make_arguments = SCENARIOS[scenario]
+    connected = 0
+    all_connected = asyncio.Event()
+    go = asyncio.Event()
+
+    async def client(connect):
+        nonlocal connected
+        # Each session is opened and closed in its own task, as anyio requires
+        async with connect() as streams, ClientSession(streams[0], streams[1]) as session:
+            await session.initialize()
+            if scenario == "drive_list_index":
+                await wait_for_index(session)
+            connected += 1
+            if connected == len(connects):
+                all_connected.set()
+            await go.wait()
+            latencies, errors = await timed_calls(session, tool, make_arguments,
+                                                  args.calls, args.concurrency)
+            return latencies, errors, await server_stats(session)
+
+    started = time.perf_counter()
+    clients = asyncio.gather(*(client(connect) for connect in connects))
+    await all_connected.wait()
+    connect_s = time.perf_counter() - started
+    started = time.perf_counter()
+    go.set()
+    outcomes = await clients
+    elapsed = time.perf_counter() - started
+
+    latencies = [latency for outcome in outcomes for latency in outcome[0]]
+    summary = summarize(latencies, sum(outcome[1] for outcome in outcomes), elapsed)
+    summary["connect_s"] = round(connect_s, 2)
+    return summary, [outcome[2] for outcome in outcomes]
+
+
+def upstream_calls(stats) -> int:
+    return sum(summary["count"] for summary in stats["latency"].get("upstream", {}).values())
+
+
+async def run_stdio(name, scenario, args, upstream_url, workdir) -> dict:
+    from mcp.client.stdio import StdioServerParameters, stdio_client
+
+    errlog = open(os.devnull, "w")
+    connects = [
+        lambda params=StdioServerParameters(command=sys.executable, args=["-m", SERVERS[name]],
+                                            env=client_env(name, upstream_url, workdir, i), cwd=ROOT):
+            stdio_client(params, errlog=errlog)
+        for i in range(args.clients)
+    ]
+    try:
+        result, stats = await run_clients(connects, scenario, args)
+    finally:
+        errlog.close()
+    # One process per client
+    result["rss_mb"] = round(sum(s["process"].get("max_rss_mb") or 0 for s in stats), 1)
+    result["upstream_calls"] = sum(upstream_calls(s) for s in stats)
+    return result
+
+
+async def run_http(name, scenario, args, upstream_url, workdir) -> dict:
+    try:
+        from mcp.client.streamable_http import streamable_http_client
+    except ImportError:  # older mcp releases
+        from mcp.client.streamable_http import streamablehttp_client as streamable_http_client
+
+    process, url = start_http_server(name, client_env(name, upstream_url, workdir, "http"))
+    try:
+        result, stats = await run_clients([lambda: streamable_http_client(url)] * args.clients,
+                                          scenario, args)
+    finally:
+        process.terminate()
+        process.wait()
+    # Every client reports the same process; the latest snapshot has the highest counts
+    last = max(stats, key=upstream_calls)
+    result["rss_mb"] = last["process"].get("max_rss_mb")
+    result["upstream_calls"] = upstream_calls(last)
+    return result
+
+
+RUNNERS = {"stdio": run_stdio, "http": run_http}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clients", type=int, default=10, help="Concurrent MCP clients")
+    parser.add_argument("--calls", type=int, default=50, help="Tool calls per client")
+    parser.add_argument("--concurrency", type=int, default=2, help="Calls in flight per client")
+    parser.add_argument("--latency", type=float, default=0.02, help="Stub upstream latency (seconds)")
+    parser.add_argument("--transports", nargs="+", choices=TRANSPORTS, default=list(TRANSPORTS))
+    parser.add_argument("scenario", nargs="?", default="weather_current", choices=sorted(SCENARIOS))
+    args = parser.parse_args()
+
+    name = SCENARIOS[args.scenario][0]
+    handler = StubWeatherHandler if name == "weather" else StubDriveHandler
+    print(f"{args.scenario}: {args.clients} clients x {args.calls} calls")
+    for transport in args.transports:
+        # A fresh stub and working directory each, so neither run warms the other
+        httpd, upstream_url = start_stub_server(handler, latency=args.latency, file_count=DRIVE_FILES)
+        try:
+            with tempfile.TemporaryDirectory() as workdir:
+                result = asyncio.run(RUNNERS[transport](name, args.scenario, args, upstream_url, workdir))
+        finally:
+            httpd.shutdown()
+        print(f"{transport:6} connect {result['connect_s']:6.2f} s  {result['throughput']:8.1f} calls/s  "
+              f"p50 {result['p50_ms']:7.2f} ms  p95 {result['p95_ms']:7.2f} ms  "
+              f"p99 {result['p99_ms']:7.2f} ms  rss {result['rss_mb']} MB  "
+              f"upstream {result['upstream_calls']}  errors {result['errors']}")
+
+
+if __name__ == "__main__":
+    main()
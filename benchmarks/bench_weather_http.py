@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""Compare blocking requests.get against the shared async client in the weather server.
+
+Usage: python -m benchmarks.bench_weather_http [--calls 50] [--latency 0.05]
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+
+import requests
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from benchmarks.stubs import StubWeatherHandler, start_stub_server
+
+
+def load_server(base_url):
+    """Import the weather server against a temporary config pointing at the stub."""
+    config = {"api_key": "bench", "base_url": base_url, "timeout": 10}
+    with tempfile.NamedTemporaryFile("w", suffix=".json", delete=False) as f:
+        json.dump(config, f)
+    os.environ["WEATHER_CONFIG_PATH"] = f.name
+    from src.weather_server import server
+    return server
+
+
+async def blocking_call(base_url, location):
+    # The pre-httpx handler body: a blocking call inside an async function
+    response = requests.get(f"{base_url}/current.json",
+                            params={"key": "bench", "q": location}, timeout=10)
+    response.raise_for_status()
+    return response.json()
+
+
+async def run_blocking(base_url, calls):
+    await asyncio.gather(*(blocking_call(base_url, f"City {i}") for i in range(calls)))
+
+
+async def run_async(server, calls):
+    async with server.get_http_client():
+        await asyncio.gather(*(server.get_current_weather(f"City {i}") for i in range(calls)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--calls", type=int, default=50)
+    parser.add_argument("--latency", type=float, default=0.05)
+    args = parser.parse_args()
+
+    httpd, base_url = start_stub_server(StubWeatherHandler, latency=args.latency)
+    server = load_server(base_url)
+
+    try:
+        for label, coro in (("blocking requests", run_blocking(base_url, args.calls)),
+                            ("shared httpx client", run_async(server, args.calls))):
+            start = time.perf_counter()
+            asyncio.run(coro)
+            elapsed = time.perf_counter() - start
+            print(f"{label:>20}: {args.calls} calls in {elapsed:.3f}s "
+                  f"({args.calls / elapsed:.1f} calls/s)")
+    finally:
+        httpd.shutdown()
+        os.unlink(os.environ["WEATHER_CONFIG_PATH"])
+
+
+if __name__ == "__main__":
+    main()
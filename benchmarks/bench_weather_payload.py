@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+"""Compare weather tool response size and serialization time across detail levels.
+
+Usage: python -m benchmarks.bench_weather_payload [--days 3] [--repeat 200]
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from benchmarks.payloads import forecast_payload
+from src.weather_server.projection import project
+
+
+def dump(data, compact):
+    # Same serialization as the weather server's dump_response
+    if compact:
+        return json.dumps(data, separators=(",", ":"))
+    return json.dumps(data, indent=2)
+
+
+def measure(payload, detail, compact, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        text = dump(project(payload, detail=detail), compact)
+        timings.append(time.perf_counter() - start)
+    return len(text.encode()), statistics.median(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--days", type=int, default=3)
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    payload = forecast_payload(args.days)
+    variants = [("full", False), ("full", True), ("standard", False),
+                ("standard", True), ("summary", True)]
+    results = [measure(payload, detail, compact, args.repeat) for detail, compact in variants]
+    baseline_size, baseline_time = results[0]
+    print(f"{args.days}-day forecast, median of {args.repeat} runs")
+    for (detail, compact), (size, seconds) in zip(variants, results):
+        label = f"{detail}{' compact' if compact else ''}"
+        print(f"{label:18} {size:8d} bytes ({baseline_size / size:5.1f}x smaller)  "
+              f"{seconds * 1e6:8.1f} us ({baseline_time / seconds:5.1f}x faster)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""Realistically shaped upstream payloads for the serialization benchmarks."""
+
+CONDITION = {"text": "Patchy rain nearby", "icon": "//cdn.weatherapi.com/weather/64x64/day/176.png",
+             "code": 1063}
+
+
+def _conditions(hour: int) -> dict:
+    # The per-reading fields WeatherAPI returns for both "current" and hourly blocks
+    return {
+        "temp_c": 14.2 + hour / 10, "temp_f": 57.6 + hour / 10, "is_day": int(6 <= hour < 20),
+        "condition": dict(CONDITION), "wind_mph": 8.1, "wind_kph": 13.0, "wind_degree": 232,
+        "wind_dir": "SW", "pressure_mb": 1012.0, "pressure_in": 29.88, "precip_mm": 0.12,
+        "precip_in": 0.0, "snow_cm": 0.0, "humidity": 81, "cloud": 75, "feelslike_c": 13.1,
+        "feelslike_f": 55.6, "windchill_c": 13.1, "windchill_f": 55.6, "heatindex_c": 14.2,
+        "heatindex_f": 57.6, "dewpoint_c": 11.0, "dewpoint_f": 51.8, "vis_km": 10.0,
+        "vis_miles": 6.0, "uv": 3.0, "gust_mph": 12.4, "gust_kph": 20.0,
+    }
+
+
+def forecast_payload(days: int = 3, location: str = "London") -> dict:
+    """A forecast.json response: location, current conditions and `days` days with hourly data."""
+    return {
+        "location": {
+            "name": location, "region": "City of London, Greater London",
+            "country": "United Kingdom", "lat": 51.52, "lon": -0.11, "tz_id": "Europe/London",
+            "localtime_epoch": 1704106800, "localtime": "2024-01-01 11:00",
+        },
+        "current": {"last_updated_epoch": 1704106800, "last_updated": "2024-01-01 11:00",
+                    **_conditions(11)},
+        "forecast": {"forecastday": [
+            {
+                "date": f"2024-01-{day + 1:02d}",
+                "date_epoch": 1704067200 + day * 86400,
+                "day": {
+                    "maxtemp_c": 15.1, "maxtemp_f": 59.2, "mintemp_c": 8.4, "mintemp_f": 47.1,
+                    "avgtemp_c": 11.8, "avgtemp_f": 53.2, "maxwind_mph": 14.5,
+                    "maxwind_kph": 23.4, "totalprecip_mm": 2.3, "totalprecip_in": 0.09,
+                    "totalsnow_cm": 0.0, "avgvis_km": 9.4, "avgvis_miles": 5.0,
+                    "avghumidity": 84, "daily_will_it_rain": 1, "daily_chance_of_rain": 86,
+                    "daily_will_it_snow": 0, "daily_chance_of_snow": 0,
+                    "condition": dict(CONDITION), "uv": 2.0,
+                },
+                "astro": {"sunrise": "08:06 AM", "sunset": "04:02 PM", "moonrise": "10:34 PM",
+                          "moonset": "11:27 AM", "moon_phase": "Waning Gibbous",
+                          "moon_illumination": 68, "is_moon_up": 0, "is_sun_up": 0},
+                "hour": [
+                    {"time_epoch": 1704067200 + day * 86400 + hour * 3600,
+                     "time": f"2024-01-{day + 1:02d} {hour:02d}:00",
+                     **_conditions(hour), "will_it_rain": 1, "chance_of_rain": 86,
+                     "will_it_snow": 0, "chance_of_snow": 0}
+                    for hour in range(24)
+                ],
+            }
+            for day in range(days)
+        ]},
+    }
+
+
+def drive_listing_payload(count: int = 1000) -> dict:
+    """A list_files tool result with `count` files."""
+    return {
+        "files": [
+            {"id": f"1a2B3c4D5e6F7g8H9i0JkLmNoPqRsT{n:06d}", "name": f"Quarterly report {n}.pdf",
+             "mimeType": "application/pdf", "modifiedTime": "2024-01-01T11:00:00.000Z",
+             "size": str(1024 * (n + 1))}
+            for n in range(count)
+        ],
+        "next_cursor": "WyJ0b2tlbiIsIDEwMDBd",
+    }
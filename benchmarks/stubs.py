@@ -0,0 +1,241 @@
+"""Local stand-in HTTP servers used by the benchmarks."""
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """Base for the stubs: a fixed delay and a share of injected 503s per request."""
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def delay_or_fail(self) -> bool:
+        """Sleep for the server latency; returns True if an error response was sent instead."""
+        time.sleep(self.server.latency)
+        if random.random() < self.server.error_rate:
+            self.send_json({"error": {"code": 503, "message": "Injected failure",
+                                      "errors": [{"reason": "backendError"}]}}, 503)
+            return True
+        return False
+
+    def send_body(self, payload: bytes, content_type="application/json", status=200):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def send_json(self, body, status=200):
+        self.send_body(json.dumps(body).encode(), status=status)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class StubWeatherHandler(StubHandler):
+    """Answers /current.json and /forecast.json after a fixed delay."""
+
+    def do_GET(self):
+        parsed = urlparse(self.path)
+        params = parse_qs(parsed.query)
+        location = params.get("q", ["Nowhere"])[0]
+        if self.delay_or_fail():
+            return
+
+        body = {
+            "location": {"name": location},
+            "current": {"temp_c": 15.0, "condition": {"text": "Cloudy"}},
+        }
+        if parsed.path.endswith("/forecast.json"):
+            days = int(params.get("days", ["3"])[0])
+            body["forecast"] = {"forecastday": [
+                {"date": f"2024-01-{day + 1:02d}", "day": {"maxtemp_c": 18.0},
+                 "hour": [{"time": f"{hour:02d}:00", "temp_c": 15.0} for hour in range(24)]}
+                for day in range(days)
+            ]}
+        self.send_json(body)
+
+
+def fake_drive_file(n: int) -> dict:
+    return {
+        "id": f"file-{n}",
+        "name": f"report-{n}.txt" if n % 4 == 0 else f"notes-{n}.txt",
+        "mimeType": "text/plain",
+        "modifiedTime": f"2024-01-01T00:{n // 60 % 60:02d}:{n % 60:02d}.000Z",
+        "size": str(1024 + n),
+        "md5Checksum": f"{n:032x}",
+        "trashed": False,
+        "parents": ["root"],
+    }
+
+
+class StubDriveHandler(StubHandler):
+    """A Drive v3 stand-in for files.list/get, the changes feed and batch requests.
+
+    The server holds file_count files; queries are ignored (every listing
+    returns all of them) since the point is the request path, not search.
+    """
+
+    def route(self, method: str, path: str, params: dict):
+        """Return (status, body) for one Drive API call."""
+        if path == "/drive/v3/files" and method == "GET":
+            offset = int(params.get("pageToken", ["0"])[0])
+            size = int(params.get("pageSize", ["100"])[0])
+            files = [fake_drive_file(n) for n in range(offset, min(offset + size, self.server.file_count))]
+            body = {"files": files}
+            if offset + size < self.server.file_count:
+                body["nextPageToken"] = str(offset + size)
+            return 200, body
+        if path == "/drive/v3/changes/startPageToken":
+            return 200, {"startPageToken": "1"}
+        if path == "/drive/v3/changes":
+            return 200, {"changes": [], "newStartPageToken": "1"}
+        match = re.fullmatch(r"/drive/v3/files/file-(\d+)", path)
+        if match and int(match.group(1)) < self.server.file_count:
+            if method == "DELETE":
+                return 204, None
+            return 200, fake_drive_file(int(match.group(1)))
+        return 404, {"error": {"code": 404, "message": "File not found",
+                               "errors": [{"reason": "notFound"}]}}
+
+    def do_GET(self):
+        if self.delay_or_fail():
+            return
+        parsed = urlparse(self.path)
+        status, body = self.route("GET", parsed.path, parse_qs(parsed.query))
+        self.send_json(body, status)
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        payload = self.rfile.read(length).decode()
+        if self.delay_or_fail():
+            return
+        if not urlparse(self.path).path.startswith("/batch/"):
+            self.send_json({"error": {"code": 404, "message": "Not found"}}, 404)
+            return
+        self.send_batch(payload, self.headers.get("Content-Type", ""))
+
+    def send_batch(self, payload: str, content_type: str):
+        """Answer a multipart/mixed batch, one application/http part per call."""
+        boundary = content_type.split("boundary=")[-1].strip('"')
+        parts = []
+        for part in payload.split(f"--{boundary}")[1:-1]:
+            headers, request = re.split(r"\r?\n\r?\n", part.strip(), maxsplit=1)
+            content_id = re.search(r"Content-ID: <(.*)>", headers, re.IGNORECASE).group(1)
+            method, target, _ = request.split(None, 2)
+            parsed = urlparse(target)
+            status, body = self.route(method, parsed.path, parse_qs(parsed.query))
+            body_text = json.dumps(body) if body is not None else ""
+            parts.append(f"--batch_stub\r\nContent-Type: application/http\r\n"
+                         f"Content-ID: <response-{content_id}>\r\n\r\n"
+                         f"HTTP/1.1 {status} Stub\r\nContent-Type: application/json\r\n"
+                         f"Content-Length: {len(body_text)}\r\n\r\n{body_text}\r\n")
+        self.send_body(("".join(parts) + "--batch_stub--\r\n").encode(),
+                       "multipart/mixed; boundary=batch_stub")
+
+
+class StubHTTPServer(ThreadingHTTPServer):
+    # The stdlib default backlog of 5 drops bursts of concurrent connects
+    request_queue_size = 128
+    daemon_threads = True
+
+
+def start_stub_server(handler_class, latency=0.05, error_rate=0.0, **attributes):
+    """Start a threaded stub server on a free localhost port; returns (server, base_url).
+
+    error_rate is the fraction of requests answered with a 503; any other
+    keyword arguments (e.g. file_count for the Drive stub) are set on the server.
+    """
+    httpd = StubHTTPServer(("127.0.0.1", 0), handler_class)
+    httpd.latency = latency
+    httpd.error_rate = error_rate
+    for name, value in attributes.items():
+        setattr(httpd, name, value)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    return httpd, f"http://127.0.0.1:{httpd.server_port}"
+
+
+class FakeDriveRequest:
+    """A prepared Drive request whose execute() sleeps for the backend latency."""
+
+    def __init__(self, backend, result):
+        self.backend = backend
+        self.result = result
+
+    def execute(self, http=None, num_retries=0):
+        time.sleep(self.backend.latency)
+        return self.result
+
+
+class FakeUploadRequest:
+    """A resumable upload that accepts one chunk per latency interval."""
+
+    def __init__(self, backend, body, media_body):
+        self.backend = backend
+        self.body = body
+        self.media = media_body
+        self.resumable_uri = None
+        self.resumable_progress = 0
+        self.http = None
+
+    def next_chunk(self, http=None, num_retries=0):
+        time.sleep(self.backend.latency)
+        if self.resumable_uri is None:
+            self.resumable_uri = f"fake://upload/{id(self)}"
+            return None, None
+        self.resumable_progress = min(self.media.size(),
+                                      self.resumable_progress + self.media.chunksize())
+        if self.resumable_progress < self.media.size():
+            return None, None
+        return None, {"id": f"id-{self.body['name']}"}
+
+
+class FakeMediaHttp:
+    """Serves ranged media requests for FakeDriveService."""
+
+    def __init__(self, backend):
+        self.backend = backend
+
+    def request(self, uri, method="GET", headers=None, body=None):
+        time.sleep(self.backend.latency)
+        size = self.backend.file_size
+        start, end = (int(n) for n in headers['range'][len('bytes='):].split('-'))
+        if start >= size:
+            return _FakeResponse(416, f"bytes */{size}"), b""
+        end = min(end, size - 1)
+        return _FakeResponse(206, f"bytes {start}-{end}/{size}"), b"x" * (end - start + 1)
+
+
+class _FakeResponse(dict):
+    def __init__(self, status, content_range):
+        super().__init__({"content-range": content_range})
+        self.status = status
+
+
+class FakeDriveService:
+    """In-process stand-in for the Drive v3 service with a fixed per-request latency."""
+
+    def __init__(self, latency=0.02, file_size=64 * 1024):
+        self.latency = latency
+        self.file_size = file_size
+
+    def files(self):
+        return self
+
+    def create(self, body=None, media_body=None, fields=None):
+        return FakeUploadRequest(self, body, media_body)
+
+    def get(self, fileId=None, fields=None):
+        return FakeDriveRequest(self, {"id": fileId, "name": f"{fileId}.bin"})
+
+    def get_media(self, fileId=None):
+        request = FakeDriveRequest(self, None)
+        request.http = FakeMediaHttp(self)
+        request.uri = f"fake://media/{fileId}"
+        request.headers = {}
+        return request
@@ -1,20 +1,80 @@
-from google.oauth2.credentials import Credentials
-from google_auth_oauthlib.flow import InstalledAppFlow
-from google.auth.transport.requests import Request
+# The Google client libraries take a few hundred milliseconds to import, so
+# they are imported on first use rather than when the server starts.
+from .transport import RetryingHttp
+from datetime import datetime, timedelta, timezone
+import json
 import os.path
+import threading
 
 # If modifying these SCOPES, delete the file token.json.
 SCOPES = ['https://www.googleapis.com/auth/drive.file']
 
+# Send API calls (including uploads, media and batches) to another root URL,
+# e.g. a local stand-in used for load testing
+API_ROOT = os.environ.get("GDRIVE_API_ROOT")
+# Skip OAuth and send unauthenticated requests; only meaningful with API_ROOT
+NO_AUTH = os.environ.get("GDRIVE_NO_AUTH") == "1"
+
+# Refresh the access token this long before it expires, so in-flight calls
+# never present an expired token.
+REFRESH_MARGIN = timedelta(minutes=5)
+
+_creds = None
+_service = None
+_service_creds = None
+# Serializes token refreshes so concurrent calls don't stampede the OAuth endpoint
+_refresh_lock = threading.Lock()
+_service_lock = threading.Lock()
+_thread_local = threading.local()
+
+
+def build(*args, **kwargs):
+    from googleapiclient.discovery import build
+    return build(*args, **kwargs)
+
+
+def Request():
+    from google.auth.transport.requests import Request
+    return Request()
+
+
+def _authorized_http(creds):
+    from google_auth_httplib2 import AuthorizedHttp
+    from googleapiclient.http import build_http
+    return RetryingHttp(AuthorizedHttp(creds, http=build_http()))
+
+
+def _build_service(creds):
+    http = _authorized_http(creds)
+    if not API_ROOT:
+        return build('drive', 'v3', http=http, cache_discovery=False)
+    from googleapiclient.discovery import build_from_document
+    from googleapiclient.discovery_cache import get_static_doc
+    # Rewrite the bundled discovery document: api_endpoint alone would leave
+    # upload and batch URLs pointing at googleapis.com
+    document = json.loads(get_static_doc('drive', 'v3'))
+    document['rootUrl'] = API_ROOT.rstrip('/') + '/'
+    document['baseUrl'] = document['rootUrl'] + document['servicePath']
+    return build_from_document(document, http=http)
+
+
+def _config_path(filename):
+    return os.path.join(os.path.dirname(__file__), '../../config', filename)
+
+
+def _save_token(creds):
+    with open(_config_path('token.json'), 'w') as token:
+        token.write(creds.to_json())
+
 
 def authenticate():
     """Handles the authentication with Google Drive using OAuth2."""
+    from google.oauth2.credentials import Credentials
+    from google_auth_oauthlib.flow import InstalledAppFlow
+
     creds = None
-    # Get the directory where this file is located
-    current_dir = os.path.dirname(__file__)
-    token_path = os.path.join(current_dir, '../../config/token.json')
-    credentials_path = os.path.join(
-        current_dir, '../../config/gdrive_credentials.json')
+    token_path = _config_path('token.json')
+    credentials_path = _config_path('gdrive_credentials.json')
 
     # The file token.json stores the user's access and refresh tokens, and is
     # created automatically when the authorization flow completes for the first
@@ -30,6 +90,68 @@ def authenticate():
                 credentials_path, SCOPES)
             creds = flow.run_local_server(port=0)
         # Save the credentials for the next run
-        with open(token_path, 'w') as token:
-            token.write(creds.to_json())
+        _save_token(creds)
     return creds
+
+
+def _needs_refresh(creds):
+    if not creds.valid:
+        return True
+    if creds.expiry is None:
+        return False
+    # google-auth keeps expiry as a naive UTC datetime
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    return creds.expiry - REFRESH_MARGIN <= now
+
+
+def get_credentials():
+    """Return the process-wide credentials, refreshing them shortly before they expire."""
+    global _creds
+    creds = _creds
+    if creds is not None and not _needs_refresh(creds):
+        return creds
+
+    from google.auth.exceptions import RefreshError
+
+    with _refresh_lock:
+        # Another thread may have refreshed while we waited for the lock
+        if _creds is None and NO_AUTH:
+            from google.auth.credentials import AnonymousCredentials
+            _creds = AnonymousCredentials()
+        elif _creds is None:
+            _creds = authenticate()
+        elif _needs_refresh(_creds):
+            try:
+                _creds.refresh(Request())
+            except RefreshError:
+                # Revoked or expired refresh token: run the full flow next time
+                _creds = None
+                raise
+            _save_token(_creds)
+        return _creds
+
+
+def get_drive_service():
+    """Return the Drive v3 service, built once per process from the cached credentials."""
+    global _service, _service_creds
+    creds = get_credentials()
+    if _service is None or _service_creds is not creds:
+        with _service_lock:
+            if _service is None or _service_creds is not creds:
+                _service = _build_service(creds)
+                _service_creds = creds
+    return _service
+
+
+def get_thread_http():
+    """Return an authorized, rate-limited HTTP transport owned by the calling thread.
+
+    httplib2 is not thread-safe, so work run off the event loop passes this to
+    execute()/next_chunk() instead of sharing the service's own transport.
+    """
+    creds = get_credentials()
+    http = getattr(_thread_local, 'http', None)
+    if http is None or http.credentials is not creds:
+        http = _authorized_http(creds)
+        _thread_local.http = http
+    return http
@@ -0,0 +1,74 @@
+# The Drive API accepts at most 100 calls per HTTP batch request
+BATCH_LIMIT = 100
+
+DEFAULT_METADATA_FIELDS = 'id, name, mimeType, modifiedTime, size'
+
+
+def execute_batched(service, requests: list, http=None) -> tuple[list[dict], int]:
+    """Execute prepared requests through the Drive batch endpoint, BATCH_LIMIT per call.
+
+    Returns one {"status": "ok", "response": ...} or {"status": "error",
+    "error": ...} entry per request, in input order, plus the number of HTTP
+    batch calls made.
+    """
+    results = [None] * len(requests)
+
+    def callback(request_id, response, exception):
+        index = int(request_id)
+        if exception is not None:
+            results[index] = {"status": "error", "error": str(exception)}
+        else:
+            results[index] = {"status": "ok", "response": response}
+
+    batches = 0
+    for start in range(0, len(requests), BATCH_LIMIT):
+        batch = service.new_batch_http_request(callback=callback)
+        for index, request in enumerate(requests[start:start + BATCH_LIMIT], start):
+            batch.add(request, request_id=str(index))
+        batch.execute(http=http)
+        batches += 1
+    return results, batches
+
+
+def _report(file_ids: list[str], results: list[dict], batches: int, include_response: bool) -> dict:
+    items = []
+    for file_id, result in zip(file_ids, results):
+        item = {"file_id": file_id, "status": result["status"]}
+        if result["status"] == "error":
+            item["error"] = result["error"]
+        elif include_response:
+            item["file"] = result["response"]
+        items.append(item)
+    failed = sum(1 for item in items if item["status"] == "error")
+    return {"total": len(items), "succeeded": len(items) - failed, "failed": failed,
+            "batch_requests": batches, "results": items}
+
+
+def batch_delete(service, file_ids: list[str], http=None) -> dict:
+    """Delete many files, up to BATCH_LIMIT per HTTP request."""
+    # service.files() rebuilds the resource from the discovery document
+    # (~10 ms of CPU), so build it once rather than once per file
+    files = service.files()
+    requests = [files.delete(fileId=file_id) for file_id in file_ids]
+    results, batches = execute_batched(service, requests, http)
+    return _report(file_ids, results, batches, include_response=False)
+
+
+def batch_get_metadata(service, file_ids: list[str], fields: str = DEFAULT_METADATA_FIELDS,
+                       http=None) -> dict:
+    """Fetch metadata for many files, up to BATCH_LIMIT per HTTP request."""
+    files = service.files()
+    requests = [files.get(fileId=file_id, fields=fields) for file_id in file_ids]
+    results, batches = execute_batched(service, requests, http)
+    return _report(file_ids, results, batches, include_response=True)
+
+
+def batch_update_metadata(service, updates: list[dict], fields: str = DEFAULT_METADATA_FIELDS,
+                          http=None) -> dict:
+    """Apply {"file_id": ..., "metadata": {...}} updates, up to BATCH_LIMIT per HTTP request."""
+    file_ids = [update["file_id"] for update in updates]
+    files = service.files()
+    requests = [files.update(fileId=update["file_id"], body=update["metadata"], fields=fields)
+                for update in updates]
+    results, batches = execute_batched(service, requests, http)
+    return _report(file_ids, results, batches, include_response=True)
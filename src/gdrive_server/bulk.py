@@ -0,0 +1,132 @@
+from .auth import get_thread_http
+from .dedup import find_remote_duplicate
+from .transfers import DEFAULT_CHUNK_SIZE, REVISION_FIELDS, download_to_path, upload_path, upload_sessions
+from src.shared.retry import backoff_delay
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import functools
+import glob
+import os
+import threading
+import time
+
+DEFAULT_WORKERS = 4
+DEFAULT_RETRIES = 3
+RETRY_BACKOFF = 0.5  # seconds; the jittered backoff ceiling doubles after each failed attempt
+
+
+def expand_sources(source: str, recursive: bool = False) -> list[str]:
+    """Expand a directory or glob pattern into the list of files it matches."""
+    if os.path.isdir(source):
+        source = os.path.join(source, '**', '*') if recursive else os.path.join(source, '*')
+    return sorted(path for path in glob.glob(source, recursive=recursive) if os.path.isfile(path))
+
+
+async def run_bulk(items: list, transfer, max_workers: int = DEFAULT_WORKERS,
+                   retries: int = DEFAULT_RETRIES, on_complete=None, executor=None) -> dict:
+    """Run the blocking transfer(item) for every item, at most max_workers at a time.
+
+    Transfers run on executor (a DriveExecutor) if given, otherwise on a
+    private pool of max_workers threads. Individual requests are already
+    retried by the transport; on top of that each item is retried as a
+    whole, with jittered exponential backoff. on_complete, if given, is awaited with
+    (completed_count, entry) as each item finishes. Returns an aggregate
+    report with one entry per item, in input order.
+    """
+    max_workers = max(1, max_workers)
+    semaphore = asyncio.Semaphore(max_workers)
+    completed = 0
+
+    async def run_one(item):
+        nonlocal completed
+        async with semaphore:
+            started = time.perf_counter()
+            for attempt in range(1, retries + 2):
+                try:
+                    result = await run(transfer, item)
+                    entry = {"item": item, "status": "ok", "attempts": attempt, **result}
+                    break
+                except Exception as e:
+                    entry = {"item": item, "status": "error", "attempts": attempt, "error": str(e)}
+                    if attempt <= retries:
+                        await asyncio.sleep(backoff_delay(attempt, RETRY_BACKOFF))
+            entry["seconds"] = round(time.perf_counter() - started, 3)
+        completed += 1
+        if on_complete is not None:
+            await on_complete(completed, entry)
+        return entry
+
+    started = time.perf_counter()
+    if executor is not None:
+        run = executor.run
+        results = await asyncio.gather(*(run_one(item) for item in items))
+    else:
+        loop = asyncio.get_running_loop()
+        with ThreadPoolExecutor(max_workers, thread_name_prefix="gdrive-bulk") as pool:
+            run = functools.partial(loop.run_in_executor, pool)
+            results = await asyncio.gather(*(run_one(item) for item in items))
+    succeeded = [entry for entry in results if entry["status"] == "ok"]
+    return {
+        "total": len(results),
+        "succeeded": len(succeeded),
+        "failed": len(results) - len(succeeded),
+        "bytes": sum(entry.get("bytes", 0) for entry in succeeded),
+        "seconds": round(time.perf_counter() - started, 3),
+        "results": results,
+    }
+
+
+async def bulk_upload(service, paths: list[str], folder_id: str | None = None,
+                      max_workers: int = DEFAULT_WORKERS, retries: int = DEFAULT_RETRIES,
+                      chunk_size: int = DEFAULT_CHUNK_SIZE, dedup: bool = False,
+                      on_complete=None, executor=None) -> dict:
+    """Upload local files in parallel; returns the aggregate report.
+
+    With dedup, files whose content already exists in Drive under the same
+    name (and folder) are skipped and report the existing file's ID.
+    """
+    def upload_one(path):
+        http = get_thread_http()
+        name = os.path.basename(path)
+        if dedup:
+            existing = find_remote_duplicate(service, path, name, folder_id, http=http)
+            if existing:
+                return {"file_id": existing['id'], "bytes": 0, "deduplicated": True}
+        metadata = {'name': name}
+        if folder_id:
+            metadata['parents'] = [folder_id]
+        response = upload_path(service, path, metadata, chunk_size, upload_sessions, http=http)
+        return {"file_id": response.get('id'), "bytes": os.path.getsize(path)}
+
+    return await run_bulk(paths, upload_one, max_workers, retries, on_complete, executor)
+
+
+async def bulk_download(service, file_ids: list[str], output_dir: str,
+                        max_workers: int = DEFAULT_WORKERS, retries: int = DEFAULT_RETRIES,
+                        chunk_size: int = DEFAULT_CHUNK_SIZE, on_complete=None,
+                        executor=None) -> dict:
+    """Download Drive files in parallel into output_dir under their Drive names."""
+    os.makedirs(output_dir, exist_ok=True)
+    claimed = set()
+    destinations = {}  # file_id -> output path, kept across retries so they resume the .part file
+    claimed_lock = threading.Lock()
+
+    def destination(file_id, name):
+        with claimed_lock:
+            if file_id not in destinations:
+                # Same-named Drive files in one batch get the file ID appended
+                if name in claimed:
+                    stem, ext = os.path.splitext(name)
+                    name = f"{stem} ({file_id}){ext}"
+                claimed.add(name)
+                destinations[file_id] = os.path.join(output_dir, name)
+            return destinations[file_id]
+
+    def download_one(file_id):
+        http = get_thread_http()
+        metadata = service.files().get(fileId=file_id, fields=f'name,{REVISION_FIELDS}').execute(http=http)
+        output_path = destination(file_id, os.path.basename(metadata['name']))
+        size = download_to_path(service, file_id, output_path, chunk_size, http=http, metadata=metadata)
+        return {"output_path": output_path, "bytes": size}
+
+    return await run_bulk(file_ids, download_one, max_workers, retries, on_complete, executor)
@@ -0,0 +1,82 @@
+import hashlib
+import os
+import sqlite3
+import threading
+
+HASH_CACHE_PATH = os.path.join(os.path.dirname(__file__), '../../config/file_hashes.sqlite')
+
+# Read size while hashing; keeps memory flat for any file size
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def md5_file(path: str, chunk_size: int = HASH_CHUNK_SIZE) -> str:
+    """Return the hex MD5 of a file, reading it in chunks."""
+    digest = hashlib.md5()
+    with open(path, 'rb') as f:
+        while chunk := f.read(chunk_size):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class HashCache:
+    """Persistent MD5 cache keyed by path, size and mtime, so unchanged files aren't rehashed."""
+
+    def __init__(self, path: str = HASH_CACHE_PATH):
+        self.path = path
+        self._conn = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _connection(self):
+        # Opened on first use so importing the server has no filesystem side effects
+        if self._conn is None:
+            if self.path != ":memory:":
+                os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS hashes "
+                "(path TEXT PRIMARY KEY, size INTEGER, mtime_ns INTEGER, md5 TEXT)")
+        return self._conn
+
+    def md5(self, file_path: str) -> str:
+        """Return the MD5 of file_path, hashing it only if it changed since last time."""
+        path = os.path.abspath(file_path)
+        stat = os.stat(path)
+        with self._lock:
+            row = self._connection().execute(
+                "SELECT md5 FROM hashes WHERE path = ? AND size = ? AND mtime_ns = ?",
+                (path, stat.st_size, stat.st_mtime_ns)).fetchone()
+            if row:
+                self.hits += 1
+                return row[0]
+            self.misses += 1
+
+        md5 = md5_file(path)
+        with self._lock, self._connection() as conn:
+            conn.execute("INSERT OR REPLACE INTO hashes (path, size, mtime_ns, md5) VALUES (?, ?, ?, ?)",
+                         (path, stat.st_size, stat.st_mtime_ns, md5))
+        return md5
+
+
+hash_cache = HashCache()
+
+
+def _quote(value: str) -> str:
+    return "'" + value.replace("\\", "\\\\").replace("'", "\\'") + "'"
+
+
+def find_remote_duplicate(service, file_path: str, name: str, folder_id: str | None = None,
+                          hashes: HashCache | None = None, http=None) -> dict | None:
+    """Return the Drive file with this name whose md5Checksum matches file_path, if any."""
+    md5 = (hashes or hash_cache).md5(file_path)
+    query = f"name = {_quote(name)} and trashed = false"
+    if folder_id:
+        query += f" and {_quote(folder_id)} in parents"
+    candidates = service.files().list(
+        q=query, fields="files(id, name, md5Checksum, size)", pageSize=100
+    ).execute(http=http).get('files', [])
+    for candidate in candidates:
+        if candidate.get('md5Checksum') == md5:
+            return candidate
+    return None
@@ -0,0 +1,73 @@
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import functools
+import os
+import threading
+import time
+
+DEFAULT_MAX_WORKERS = int(os.environ.get("GDRIVE_MAX_WORKERS", "16"))
+
+
+class DriveExecutor:
+    """Sized thread pool for blocking googleapiclient calls, with queue-depth metrics.
+
+    httplib2 is not thread-safe, so work submitted here should use the calling
+    thread's own transport (auth.get_thread_http) rather than the service's.
+    """
+
+    def __init__(self, max_workers: int = DEFAULT_MAX_WORKERS):
+        self.max_workers = max(1, max_workers)
+        self._pool = ThreadPoolExecutor(self.max_workers, thread_name_prefix="gdrive")
+        self._lock = threading.Lock()
+        self.queued = 0
+        self.running = 0
+        self.completed = 0
+        self.max_queue_depth = 0
+        self.total_wait = 0.0
+
+    def _track(self, fn, submitted_at):
+        @functools.wraps(fn)
+        def tracked():
+            with self._lock:
+                self.queued -= 1
+                self.running += 1
+                self.total_wait += time.perf_counter() - submitted_at
+            try:
+                return fn()
+            finally:
+                with self._lock:
+                    self.running -= 1
+                    self.completed += 1
+        return tracked
+
+    async def run(self, fn, *args, **kwargs):
+        """Run fn(*args, **kwargs) on the pool and await its result."""
+        call = functools.partial(fn, *args, **kwargs)
+        with self._lock:
+            self.queued += 1
+            self.max_queue_depth = max(self.max_queue_depth, self.queued)
+        future = self._pool.submit(self._track(call, time.perf_counter()))
+        future.add_done_callback(self._on_done)
+        return await asyncio.wrap_future(future)
+
+    def _on_done(self, future):
+        # Work cancelled while still queued never reaches tracked()
+        if future.cancelled():
+            with self._lock:
+                self.queued -= 1
+
+    def stats(self) -> dict:
+        """Return pool size, current queue depth and wait-time metrics."""
+        with self._lock:
+            started = self.completed + self.running
+            return {
+                "max_workers": self.max_workers,
+                "queued": self.queued,
+                "running": self.running,
+                "completed": self.completed,
+                "max_queue_depth": self.max_queue_depth,
+                "avg_wait_ms": round(1000 * self.total_wait / started, 3) if started else 0.0,
+            }
+
+    def shutdown(self, wait: bool = True):
+        self._pool.shutdown(wait=wait)
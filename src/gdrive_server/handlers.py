@@ -1,75 +1,64 @@
 from google.oauth2.credentials import Credentials
 from google_auth_oauthlib.flow import InstalledAppFlow
-from googleapiclient.discovery import build
 from googleapiclient.errors import HttpError
-from googleapiclient.http import MediaFileUpload, MediaIoBaseDownload
 import os
-import io
-from .auth import authenticate
+from .auth import get_drive_service
+from .dedup import find_remote_duplicate
+from .listing import iter_drive_files
+from .transfers import DEFAULT_CHUNK_SIZE, ResumableUpload, download_to_path, upload_sessions
 
 
-def upload_file_to_drive(file_path: str, name: str = None) -> dict:
-    """Upload a file to Google Drive."""
-    creds = authenticate()
-    service = build('drive', 'v3', credentials=creds)
+def upload_file_to_drive(file_path: str, name: str = None,
+                         chunk_size: int = DEFAULT_CHUNK_SIZE, dedup: bool = False) -> dict:
+    """Upload a file to Google Drive in resumable chunks.
+
+    With dedup, an identical file already in Drive under the same name is
+    returned instead of uploading again.
+    """
+    service = get_drive_service()
 
     file_name = name or os.path.basename(file_path)
     file_metadata = {'name': file_name}
-    media = MediaFileUpload(file_path)
 
     try:
-        uploaded_file = service.files().create(
-            body=file_metadata,
-            media_body=media,
-            fields='id'
-        ).execute()
-        return {'file_id': uploaded_file.get('id'), 'message': 'File uploaded successfully'}
+        if dedup:
+            existing = find_remote_duplicate(service, file_path, file_name)
+            if existing:
+                return {'file_id': existing['id'], 'deduplicated': True,
+                        'message': 'Identical file already in Drive; upload skipped'}
+        upload = ResumableUpload(service, file_path, file_metadata, chunk_size, upload_sessions)
+        while not upload.next_chunk():
+            pass
+        return {'file_id': upload.response.get('id'), 'message': 'File uploaded successfully'}
     except HttpError as error:
         raise Exception(f"Upload failed: {str(error)}")
 
 
-def download_file_from_drive(file_id: str, output_path: str) -> str:
+def download_file_from_drive(file_id: str, output_path: str,
+                             chunk_size: int = DEFAULT_CHUNK_SIZE) -> str:
     """Download a file from Google Drive."""
-    creds = authenticate()
-    service = build('drive', 'v3', credentials=creds)
+    service = get_drive_service()
 
     try:
-        request = service.files().get_media(fileId=file_id)
-        fh = io.BytesIO()
-        downloader = MediaIoBaseDownload(fh, request)
-
-        done = False
-        while done is False:
-            status, done = downloader.next_chunk()
-
-        with open(output_path, 'wb') as f:
-            f.write(fh.getvalue())
-
+        download_to_path(service, file_id, output_path, chunk_size)
         return f"File downloaded to {output_path}"
     except HttpError as error:
         raise Exception(f"Download failed: {str(error)}")
 
 
 def list_drive_files(query: str = None, max_results: int = 10) -> list:
-    """List files in Google Drive."""
-    creds = authenticate()
-    service = build('drive', 'v3', credentials=creds)
+    """List files in Google Drive, following pages until max_results are collected."""
+    service = get_drive_service()
 
     try:
-        results = service.files().list(
-            pageSize=max_results,
-            fields="nextPageToken, files(id, name, mimeType, modifiedTime, size)",
-            q=query if query else None
-        ).execute()
-        return results.get('files', [])
+        return [file for file, _ in iter_drive_files(service, query, limit=max_results)]
     except HttpError as error:
         raise Exception(f"List files failed: {str(error)}")
 
 
 def delete_file_from_drive(file_id: str) -> str:
     """Delete a file from Google Drive."""
-    creds = authenticate()
-    service = build('drive', 'v3', credentials=creds)
+    service = get_drive_service()
 
     try:
         service.files().delete(fileId=file_id).execute()
@@ -0,0 +1,203 @@
+from googleapiclient.errors import HttpError
+from .listing import iter_pages
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+
+INDEX_PATH = os.environ.get("GDRIVE_INDEX_PATH") or os.path.join(
+    os.path.dirname(__file__), '../../config/drive_index.sqlite')
+
+FILE_FIELDS = "id, name, mimeType, modifiedTime, size, md5Checksum, trashed, parents"
+CHANGES_FIELDS = f"nextPageToken, newStartPageToken, changes(fileId, removed, file({FILE_FIELDS}))"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    id TEXT PRIMARY KEY,
+    name TEXT NOT NULL,
+    mime_type TEXT,
+    modified_time TEXT,
+    size TEXT,
+    md5_checksum TEXT,
+    trashed INTEGER NOT NULL DEFAULT 0,
+    parents TEXT NOT NULL DEFAULT '[]'
+);
+CREATE INDEX IF NOT EXISTS files_name ON files (name);
+CREATE INDEX IF NOT EXISTS files_mime_type ON files (mime_type);
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+"""
+
+# One clause of the Drive query subset the index can answer:
+#   name = 'x' | name != 'x' | name contains 'x' | mimeType = 'x' | mimeType != 'x'
+#   mimeType contains 'x' | trashed = true|false | 'folderId' in parents
+_STRING = r"'((?:[^'\\]|\\.)*)'"
+_CLAUSE = re.compile(
+    rf"\s*(?:(name|mimeType)\s*(=|!=|contains)\s*{_STRING}"
+    rf"|trashed\s*(=|!=)\s*(true|false)"
+    rf"|{_STRING}\s+in\s+parents)\s*",
+    re.IGNORECASE)
+_AND = re.compile(r"and\b", re.IGNORECASE)
+_COLUMNS = {"name": "name", "mimetype": "mime_type"}
+
+
+def _unescape(value: str) -> str:
+    return re.sub(r"\\(.)", r"\1", value)
+
+
+def _like_pattern(value: str) -> str:
+    return "%" + value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+
+
+def translate_query(query: str | None) -> tuple[str, list] | None:
+    """Translate a Drive query into a SQL WHERE clause and parameters.
+
+    Only conjunctions ('and') of simple name, mimeType, trashed and parents
+    clauses are supported; returns None for anything else so the caller can
+    fall back to the API. 'contains' is matched as a case-insensitive
+    substring, which is slightly broader than Drive's prefix matching.
+    """
+    if not query or not query.strip():
+        return "1", []
+    conditions, params = [], []
+    position = 0
+    while True:
+        match = _CLAUSE.match(query, position)
+        if not match:
+            return None
+        field, op, value, trashed_op, trashed_value, parent = match.groups()
+        if field:
+            column = _COLUMNS[field.lower()]
+            if op.lower() == "contains":
+                conditions.append(f"{column} LIKE ? ESCAPE '\\'")
+                params.append(_like_pattern(_unescape(value)))
+            else:
+                conditions.append(f"{column} {op} ?")
+                params.append(_unescape(value))
+        elif trashed_op:
+            conditions.append(f"trashed {trashed_op} ?")
+            params.append(1 if trashed_value.lower() == "true" else 0)
+        else:
+            conditions.append("EXISTS (SELECT 1 FROM json_each(files.parents) WHERE value = ?)")
+            params.append(_unescape(parent))
+        position = match.end()
+        if position == len(query):
+            return " AND ".join(conditions), params
+        separator = _AND.match(query, position)
+        if not separator:
+            return None
+        position = separator.end()
+
+
+class DriveIndex:
+    """Local SQLite copy of Drive file metadata, kept current with the Changes API.
+
+    populate() records a changes start token and then lists every file once;
+    sync() applies the changes recorded since that token. The index is
+    accessed from worker threads, so every use of the connection is locked.
+    """
+
+    def __init__(self, path: str = INDEX_PATH):
+        self.path = path
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.executescript(_SCHEMA)
+
+    def _get_meta(self, key: str):
+        row = self._conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def _set_meta(self, key: str, value):
+        self._conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, value))
+
+    def is_populated(self) -> bool:
+        with self._lock:
+            return self._get_meta("start_page_token") is not None
+
+    def age(self) -> float:
+        """Seconds since the index was last brought up to date."""
+        with self._lock:
+            synced_at = self._get_meta("synced_at")
+        return time.time() - float(synced_at) if synced_at else float("inf")
+
+    def _upsert(self, files: list[dict]):
+        self._conn.executemany(
+            "INSERT OR REPLACE INTO files "
+            "(id, name, mime_type, modified_time, size, md5_checksum, trashed, parents) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            [(f['id'], f.get('name', ''), f.get('mimeType'), f.get('modifiedTime'), f.get('size'),
+              f.get('md5Checksum'), int(bool(f.get('trashed'))), json.dumps(f.get('parents', [])))
+             for f in files])
+
+    def populate(self, service, http_factory=None):
+        """Rebuild the index from a full listing."""
+        http = http_factory() if http_factory else None
+        # Take the token first so changes made during the listing are replayed
+        start_token = service.changes().getStartPageToken().execute(http=http)['startPageToken']
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM files")
+            self._conn.execute("DELETE FROM meta")
+        for page in iter_pages(service, http_factory=http_factory,
+                               fields=f"nextPageToken, files({FILE_FIELDS})"):
+            with self._lock, self._conn:
+                self._upsert([file for file, _ in page])
+        with self._lock, self._conn:
+            self._set_meta("start_page_token", start_token)
+            self._set_meta("synced_at", str(time.time()))
+
+    def sync(self, service, http_factory=None) -> int:
+        """Apply changes since the last sync; returns the number of changes applied."""
+        with self._lock:
+            page_token = self._get_meta("start_page_token")
+        if page_token is None:
+            self.populate(service, http_factory)
+            return 0
+
+        applied = 0
+        while True:
+            try:
+                response = service.changes().list(
+                    pageToken=page_token, pageSize=1000, includeRemoved=True,
+                    fields=CHANGES_FIELDS
+                ).execute(http=http_factory() if http_factory else None)
+            except HttpError as error:
+                if error.resp.status in (400, 404, 410):
+                    # The stored token is no longer valid: start over
+                    self.populate(service, http_factory)
+                    return applied
+                raise
+            changes = response.get('changes', [])
+            with self._lock, self._conn:
+                removed = [(c['fileId'],) for c in changes if c.get('removed') or 'file' not in c]
+                self._conn.executemany("DELETE FROM files WHERE id = ?", removed)
+                self._upsert([c['file'] for c in changes if not c.get('removed') and 'file' in c])
+                applied += len(changes)
+                if 'newStartPageToken' in response:
+                    self._set_meta("start_page_token", response['newStartPageToken'])
+                    self._set_meta("synced_at", str(time.time()))
+                    return applied
+            page_token = response['nextPageToken']
+
+    def query(self, query: str | None, limit: int, offset: int = 0) -> list[dict] | None:
+        """Answer a Drive query locally, or return None if it isn't supported."""
+        translated = translate_query(query)
+        if translated is None:
+            return None
+        where, params = translated
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT id, name, mime_type, modified_time, size FROM files WHERE {where} "
+                "ORDER BY modified_time DESC, id LIMIT ? OFFSET ?",
+                (*params, limit, offset)).fetchall()
+        files = []
+        for file_id, name, mime_type, modified_time, size in rows:
+            file = {'id': file_id, 'name': name, 'mimeType': mime_type, 'modifiedTime': modified_time}
+            if size is not None:
+                file['size'] = size
+            files.append(file)
+        return files
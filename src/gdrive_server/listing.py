@@ -0,0 +1,83 @@
+import asyncio
+import base64
+import json
+
+# Largest page the Drive API will return
+MAX_PAGE_SIZE = 1000
+LIST_FIELDS = "nextPageToken, files(id, name, mimeType, modifiedTime, size)"
+
+
+def encode_cursor(page_token: str | None, offset: int) -> str:
+    """Encode a resume position: a Drive page token plus an offset into that page."""
+    return base64.urlsafe_b64encode(json.dumps([page_token, offset]).encode()).decode()
+
+
+def decode_cursor(cursor: str) -> tuple[str | None, int]:
+    try:
+        page_token, offset = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return page_token, int(offset)
+    except (ValueError, TypeError):
+        raise ValueError(f"Invalid cursor: {cursor}")
+
+
+def iter_pages(service, query: str | None = None, cursor: str | None = None,
+               limit: int | None = None, http_factory=None, fields: str = LIST_FIELDS):
+    """Walk every page of a files.list query, yielding one page at a time.
+
+    Each page is a list of (file, cursor) pairs, where cursor resumes the
+    listing just after that file (None once the listing is exhausted). Page
+    sizes are chosen to fetch no more than limit files. http_factory, if
+    given, is called in the running thread for the transport to use.
+    """
+    page_token, offset = decode_cursor(cursor) if cursor else (None, 0)
+    remaining = limit
+    files_resource = service.files()
+    while remaining is None or remaining > 0:
+        page_size = MAX_PAGE_SIZE if remaining is None else min(MAX_PAGE_SIZE, offset + remaining)
+        response = files_resource.list(
+            pageSize=page_size,
+            fields=fields,
+            q=query if query else None,
+            pageToken=page_token
+        ).execute(http=http_factory() if http_factory else None)
+        files = response.get('files', [])
+        next_token = response.get('nextPageToken')
+
+        end = len(files) if remaining is None else min(len(files), offset + remaining)
+        page = []
+        for position in range(offset + 1, end + 1):
+            if position < len(files):
+                item_cursor = encode_cursor(page_token, position)
+            else:
+                item_cursor = encode_cursor(next_token, 0) if next_token else None
+            page.append((files[position - 1], item_cursor))
+        if page:
+            yield page
+
+        if remaining is not None:
+            remaining -= len(page)
+        if not next_token:
+            break
+        page_token, offset = next_token, 0
+
+
+def iter_drive_files(service, query: str | None = None, cursor: str | None = None,
+                     limit: int | None = None, http_factory=None, fields: str = LIST_FIELDS):
+    """Yield (file, cursor) pairs for a query, following every page."""
+    for page in iter_pages(service, query, cursor, limit, http_factory, fields):
+        yield from page
+
+
+async def aiter_drive_files(service, query: str | None = None, cursor: str | None = None,
+                            limit: int | None = None, http_factory=None, executor=None):
+    """Async version of iter_drive_files; each page is fetched off the event loop.
+
+    Pages are fetched on executor (a DriveExecutor) if given, otherwise on the
+    default thread pool. Only one page is held in memory at a time, however
+    many files match.
+    """
+    run = executor.run if executor is not None else asyncio.to_thread
+    pages = iter_pages(service, query, cursor, limit, http_factory)
+    while (page := await run(next, pages, None)) is not None:
+        for item in page:
+            yield item
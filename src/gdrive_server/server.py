@@ -1,35 +1,65 @@
 #!/usr/bin/env python3
-from .auth import authenticate
-import io
-from googleapiclient.http import MediaFileUpload, MediaIoBaseDownload
-from googleapiclient.errors import HttpError
-from googleapiclient.discovery import build
-from google_auth_oauthlib.flow import InstalledAppFlow
-from google.oauth2.credentials import Credentials
+from .auth import get_drive_service, get_thread_http
+from .transfers import DEFAULT_CHUNK_SIZE, ResumableUpload, download_to_path, upload_sessions
+from .bulk import DEFAULT_RETRIES, DEFAULT_WORKERS, bulk_download, bulk_upload, expand_sources
+from .batch import DEFAULT_METADATA_FIELDS, batch_delete, batch_get_metadata, batch_update_metadata
+from .listing import aiter_drive_files
+from .index import DriveIndex
+from .dedup import find_remote_duplicate, hash_cache
+from .executor import DriveExecutor
+from .transport import chunk_retrier, drive_retrier
 import mcp.types as types
-from pydantic import AnyUrl
-from mcp.types import Resource, Tool, TextContent, ImageContent, EmbeddedResource
-from mcp.server import NotificationOptions, Server
-from mcp.server.models import InitializationOptions
+from mcp.server import Server
 import asyncio
-import json
 import os
 import sys
-from typing import Any, Sequence
 
 # Add the parent directory to the Python path so we can import modules
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..'))
 
 
-# Import from the same directory
-
-server = Server("gdrive-server")
+from src.shared.coalesce import SingleFlight, call_key
+from src.shared.metrics import DIAGNOSTIC_TOOL_NAME, DIAGNOSTICS, diagnostic_tool, instrument_tool, metrics
+from src.shared.progress import report_progress
+from src.shared.serve import parse_transport_args, serve
+from src.shared.utils import dumps
+
+server = Server("gdrive-server", version="0.1.0")
+metrics.service = "gdrive-server"
+# Port for --transport http, where one process serves every MCP client
+DEFAULT_HTTP_PORT = 8766
+
+# Concurrent identical read-only calls share one upstream request
+inflight = SingleFlight()
+
+# Every blocking Google client call runs here, never on the event loop;
+# size it with GDRIVE_MAX_WORKERS
+drive_executor = DriveExecutor()
+
+# Local metadata index answering list_files; disable with GDRIVE_INDEX=0
+drive_index = None
+# Sync the index with the Drive changes feed when it is older than this (seconds)
+INDEX_MAX_AGE = float(os.environ.get("GDRIVE_INDEX_MAX_AGE", "30"))
+INDEX_CURSOR_PREFIX = "index:"
+background_tasks = set()
+# Failed index builds and syncs; list_files falls back to the API meanwhile
+index_failures = 0
+index_last_error = None
+
+# Default for the compact argument: minified rather than indented JSON results
+COMPACT_RESPONSES = os.environ.get("GDRIVE_COMPACT_RESPONSES", "0") == "1"
+COMPACT_PROPERTY = {
+    "compact": {
+        "type": "boolean",
+        "description": "Return minified JSON instead of indented JSON"
+    }
+}
 
 
 @server.list_tools()
 async def handle_list_tools() -> list[types.Tool]:
     """List available Google Drive tools."""
-    return [
+    tools = [
         types.Tool(
             name="list_files",
             description="List files in Google Drive",
@@ -44,7 +74,17 @@ async def handle_list_tools() -> list[types.Tool]:
                         "type": "integer",
                         "description": "Maximum number of files to return",
                         "default": 10
-                    }
+                    },
+                    "cursor": {
+                        "type": "string",
+                        "description": "next_cursor from a previous call, to continue the listing (optional)"
+                    },
+                    "fresh": {
+                        "type": "boolean",
+                        "description": "Query the Drive API directly instead of the local index",
+                        "default": False
+                    },
+                    **COMPACT_PROPERTY
                 }
             }
         ),
@@ -61,7 +101,18 @@ async def handle_list_tools() -> list[types.Tool]:
                     "name": {
                         "type": "string",
                         "description": "Name for the file in Drive (optional)"
-                    }
+                    },
+                    "dedup": {
+                        "type": "boolean",
+                        "description": "Skip the upload if a file with the same name and content is already in Drive",
+                        "default": False
+                    },
+                    "chunk_size": {
+                        "type": "integer",
+                        "description": "Bytes sent per request, rounded up to a multiple of 256 KiB (optional)",
+                        "default": DEFAULT_CHUNK_SIZE
+                    },
+                    **COMPACT_PROPERTY
                 },
                 "required": ["file_path"]
             }
@@ -79,6 +130,11 @@ async def handle_list_tools() -> list[types.Tool]:
                     "output_path": {
                         "type": "string",
                         "description": "Local path to save the file"
+                    },
+                    "chunk_size": {
+                        "type": "integer",
+                        "description": "Bytes fetched per request (optional)",
+                        "default": DEFAULT_CHUNK_SIZE
                     }
                 },
                 "required": ["file_id", "output_path"]
@@ -97,24 +153,166 @@ async def handle_list_tools() -> list[types.Tool]:
                 },
                 "required": ["file_id"]
             }
+        ),
+        types.Tool(
+            name="upload_files",
+            description="Upload every file in a local directory or glob pattern to Google Drive in parallel",
+            inputSchema={
+                "type": "object",
+                "properties": {
+                    "source": {
+                        "type": "string",
+                        "description": "Local directory or glob pattern, e.g. 'build/*.zip'"
+                    },
+                    "recursive": {
+                        "type": "boolean",
+                        "description": "Include subdirectories ('**' in patterns)",
+                        "default": False
+                    },
+                    "folder_id": {
+                        "type": "string",
+                        "description": "Drive folder ID to upload into (optional)"
+                    },
+                    "dedup": {
+                        "type": "boolean",
+                        "description": "Skip the upload if a file with the same name and content is already in Drive",
+                        "default": False
+                    },
+                    "max_workers": {
+                        "type": "integer",
+                        "description": "Number of files transferred at once",
+                        "default": DEFAULT_WORKERS
+                    },
+                    "retries": {
+                        "type": "integer",
+                        "description": "Retries per file before reporting it as failed",
+                        "default": DEFAULT_RETRIES
+                    },
+                    **COMPACT_PROPERTY
+                },
+                "required": ["source"]
+            }
+        ),
+        types.Tool(
+            name="download_files",
+            description="Download a list of Google Drive files into a local directory in parallel",
+            inputSchema={
+                "type": "object",
+                "properties": {
+                    "file_ids": {
+                        "type": "array",
+                        "items": {"type": "string"},
+                        "description": "Google Drive file IDs"
+                    },
+                    "output_dir": {
+                        "type": "string",
+                        "description": "Local directory to save the files in"
+                    },
+                    "max_workers": {
+                        "type": "integer",
+                        "description": "Number of files transferred at once",
+                        "default": DEFAULT_WORKERS
+                    },
+                    "retries": {
+                        "type": "integer",
+                        "description": "Retries per file before reporting it as failed",
+                        "default": DEFAULT_RETRIES
+                    },
+                    **COMPACT_PROPERTY
+                },
+                "required": ["file_ids", "output_dir"]
+            }
+        ),
+        types.Tool(
+            name="delete_files",
+            description="Delete many files from Google Drive using batched API requests",
+            inputSchema={
+                "type": "object",
+                "properties": {
+                    "file_ids": {
+                        "type": "array",
+                        "items": {"type": "string"},
+                        "description": "Google Drive file IDs"
+                    },
+                    **COMPACT_PROPERTY
+                },
+                "required": ["file_ids"]
+            }
+        ),
+        types.Tool(
+            name="get_files_metadata",
+            description="Get metadata for many Google Drive files using batched API requests",
+            inputSchema={
+                "type": "object",
+                "properties": {
+                    "file_ids": {
+                        "type": "array",
+                        "items": {"type": "string"},
+                        "description": "Google Drive file IDs"
+                    },
+                    "fields": {
+                        "type": "string",
+                        "description": "Drive file fields to return",
+                        "default": DEFAULT_METADATA_FIELDS
+                    },
+                    **COMPACT_PROPERTY
+                },
+                "required": ["file_ids"]
+            }
+        ),
+        types.Tool(
+            name="update_files_metadata",
+            description="Update metadata (e.g. name, description) of many Google Drive files using batched API requests",
+            inputSchema={
+                "type": "object",
+                "properties": {
+                    "updates": {
+                        "type": "array",
+                        "items": {
+                            "type": "object",
+                            "properties": {
+                                "file_id": {"type": "string"},
+                                "metadata": {"type": "object"}
+                            },
+                            "required": ["file_id", "metadata"]
+                        },
+                        "description": "Per-file metadata changes"
+                    },
+                    "fields": {
+                        "type": "string",
+                        "description": "Drive file fields to return",
+                        "default": DEFAULT_METADATA_FIELDS
+                    },
+                    **COMPACT_PROPERTY
+                },
+                "required": ["updates"]
+            }
         )
     ]
+    if DIAGNOSTICS:
+        tools.append(diagnostic_tool())
+    return tools
 
 
 @server.call_tool()
+@instrument_tool
 async def handle_call_tool(name: str, arguments: dict | None) -> list[types.TextContent]:
     """Handle tool calls."""
+    compact = (arguments or {}).get("compact", COMPACT_RESPONSES)
     try:
-        creds = authenticate()
-        service = build('drive', 'v3', credentials=creds)
+        if name == DIAGNOSTIC_TOOL_NAME:
+            return [types.TextContent(type="text", text=dumps(server_stats(), compact))]
+
+        service = await drive_executor.run(get_drive_service)
 
         if name == "list_files":
-            files = await list_drive_files(service, arguments)
-            return [types.TextContent(type="text", text=json.dumps(files, indent=2))]
+            files = await inflight.do(call_key(name, arguments),
+                                      lambda: list_drive_files(service, arguments))
+            return [types.TextContent(type="text", text=dumps(files, compact))]
 
         elif name == "upload_file":
             result = await upload_file_to_drive(service, arguments)
-            return [types.TextContent(type="text", text=json.dumps(result, indent=2))]
+            return [types.TextContent(type="text", text=dumps(result, compact))]
 
         elif name == "download_file":
             result = await download_file_from_drive(service, arguments)
@@ -124,6 +322,33 @@ async def handle_call_tool(name: str, arguments: dict | None) -> list[types.Text
             result = await delete_file_from_drive(service, arguments)
             return [types.TextContent(type="text", text=result)]
 
+        elif name == "upload_files":
+            report = await upload_files_to_drive(service, arguments)
+            return [types.TextContent(type="text", text=dumps(report, compact))]
+
+        elif name == "download_files":
+            report = await download_files_from_drive(service, arguments)
+            return [types.TextContent(type="text", text=dumps(report, compact))]
+
+        elif name == "delete_files":
+            report = await drive_executor.run(
+                lambda: batch_delete(service, arguments["file_ids"], http=get_thread_http()))
+            return [types.TextContent(type="text", text=dumps(report, compact))]
+
+        elif name == "get_files_metadata":
+            fields = arguments.get("fields", DEFAULT_METADATA_FIELDS)
+            report = await drive_executor.run(
+                lambda: batch_get_metadata(service, arguments["file_ids"], fields,
+                                           http=get_thread_http()))
+            return [types.TextContent(type="text", text=dumps(report, compact))]
+
+        elif name == "update_files_metadata":
+            fields = arguments.get("fields", DEFAULT_METADATA_FIELDS)
+            report = await drive_executor.run(
+                lambda: batch_update_metadata(service, arguments["updates"], fields,
+                                              http=get_thread_http()))
+            return [types.TextContent(type="text", text=dumps(report, compact))]
+
         else:
             raise ValueError(f"Unknown tool: {name}")
 
@@ -131,52 +356,146 @@ async def handle_call_tool(name: str, arguments: dict | None) -> list[types.Text
         return [types.TextContent(type="text", text=f"Error: {str(e)}")]
 
 
+def server_stats() -> dict:
+    """Latency percentiles plus retry, executor, coalescing, hash cache and index counters."""
+    # The index as list_files left it; asking for stats must not create one on disk
+    index = drive_index
+    age = index.age() if index is not None and index.is_populated() else None
+    return {
+        **metrics.snapshot(),
+        "retries": drive_retrier.stats(),
+        "chunk_retries": chunk_retrier.stats(),
+        "executor": drive_executor.stats(),
+        "coalescing": inflight.stats(),
+        "hash_cache": {"hits": hash_cache.hits, "misses": hash_cache.misses},
+        "index_age_seconds": round(age, 1) if age is not None else None,
+        "index_failures": index_failures,
+        "index_last_error": index_last_error,
+    }
+
+
+def get_drive_index():
+    """Return the local metadata index, creating it on first use; None if disabled."""
+    global drive_index
+    if drive_index is None and os.environ.get("GDRIVE_INDEX", "1") != "0":
+        drive_index = DriveIndex()
+    return drive_index
+
+
+async def refresh_index(index: DriveIndex, service):
+    """Populate or sync the index, once however many callers ask at the same time."""
+    await inflight.do("drive-index-sync",
+                      lambda: drive_executor.run(index.sync, service, get_thread_http))
+
+
+def index_failed(error: BaseException):
+    """Log and count a failed index build or sync."""
+    global index_failures, index_last_error
+    index_failures += 1
+    index_last_error = str(error)
+    metrics.incr("drive_index", "failed")
+    print(f"Drive index update failed; answering list_files from the API: {error}", file=sys.stderr)
+
+
+def _index_build_done(task: asyncio.Task):
+    if not task.cancelled() and task.exception() is not None:
+        index_failed(task.exception())
+
+
+async def list_from_index(service, query: str, max_results: int, cursor: str | None) -> dict | None:
+    """Answer list_files from the local index, or return None to fall back to the API."""
+    index = get_drive_index()
+    if index is None:
+        return None
+    if not index.is_populated():
+        # Build the index in the background and let this call go to the API
+        task = asyncio.ensure_future(refresh_index(index, service))
+        background_tasks.add(task)
+        task.add_done_callback(background_tasks.discard)
+        task.add_done_callback(_index_build_done)
+        return None
+    if index.age() > INDEX_MAX_AGE:
+        try:
+            await refresh_index(index, service)
+        except Exception as e:
+            index_failed(e)
+            return None
+
+    offset = int(cursor[len(INDEX_CURSOR_PREFIX):]) if cursor else 0
+    files = await drive_executor.run(index.query, query, max_results + 1, offset)
+    if files is None:
+        return None
+    next_cursor = None
+    if len(files) > max_results:
+        next_cursor = f"{INDEX_CURSOR_PREFIX}{offset + max_results}"
+    return {"files": files[:max_results], "next_cursor": next_cursor}
+
+
 async def list_drive_files(service, arguments: dict) -> dict:
-    """List files in Google Drive."""
+    """List files in Google Drive, following pages until max_results are collected.
+
+    Common queries are answered from the local index unless fresh is set;
+    anything the index can't answer goes to the API.
+    """
     query = arguments.get("query", "")
     max_results = arguments.get("max_results", 10)
+    cursor = arguments.get("cursor")
+
+    from_index = cursor is not None and cursor.startswith(INDEX_CURSOR_PREFIX)
+    if not arguments.get("fresh") and (cursor is None or from_index):
+        result = await list_from_index(service, query, max_results, cursor)
+        if result is not None:
+            metrics.incr("list_files", "index")
+            return result
+    if from_index:
+        raise ValueError("This cursor came from the local index, which is unavailable; "
+                         "start the listing again")
 
-    results = service.files().list(
-        pageSize=max_results,
-        fields="nextPageToken, files(id, name, mimeType, modifiedTime, size)",
-        q=query if query else None
-    ).execute()
+    files = []
+    next_cursor = None
+    async for file, next_cursor in aiter_drive_files(
+            service, query, cursor, limit=max_results,
+            http_factory=get_thread_http, executor=drive_executor):
+        files.append(file)
 
-    return results.get('files', [])
+    metrics.incr("list_files", "api")
+    return {"files": files, "next_cursor": next_cursor}
 
 
 async def upload_file_to_drive(service, arguments: dict) -> dict:
-    """Upload file to Google Drive."""
+    """Upload file to Google Drive in resumable chunks, reporting progress per chunk."""
     file_path = arguments["file_path"]
     file_name = arguments.get("name", os.path.basename(file_path))
+    chunk_size = arguments.get("chunk_size", DEFAULT_CHUNK_SIZE)
 
-    file_metadata = {'name': file_name}
-    media = MediaFileUpload(file_path)
+    if arguments.get("dedup"):
+        existing = await drive_executor.run(
+            lambda: find_remote_duplicate(service, file_path, file_name, http=get_thread_http()))
+        if existing:
+            return {"file_id": existing['id'], "deduplicated": True,
+                    "message": "Identical file already in Drive; upload skipped"}
 
-    file = service.files().create(
-        body=file_metadata,
-        media_body=media,
-        fields='id'
-    ).execute()
+    file_metadata = {'name': file_name}
+    # Each step blocks on the network, so run it off the event loop
+    upload = await drive_executor.run(
+        lambda: ResumableUpload(service, file_path, file_metadata, chunk_size,
+                                upload_sessions, http=get_thread_http()))
+    while not await drive_executor.run(lambda: upload.next_chunk(http=get_thread_http())):
+        await report_progress(server, upload.bytes_sent, upload.total_size,
+                              message=f"Uploaded {upload.bytes_sent} of {upload.total_size} bytes")
+    await report_progress(server, upload.total_size, upload.total_size)
 
-    return {"file_id": file.get('id'), "message": "File uploaded successfully"}
+    return {"file_id": upload.response.get('id'), "message": "File uploaded successfully"}
 
 
 async def download_file_from_drive(service, arguments: dict) -> str:
     """Download file from Google Drive."""
     file_id = arguments["file_id"]
     output_path = arguments["output_path"]
+    chunk_size = arguments.get("chunk_size", DEFAULT_CHUNK_SIZE)
 
-    request = service.files().get_media(fileId=file_id)
-    fh = io.BytesIO()
-    downloader = MediaIoBaseDownload(fh, request)
-
-    done = False
-    while done is False:
-        status, done = downloader.next_chunk()
-
-    with open(output_path, 'wb') as f:
-        f.write(fh.getvalue())
+    await drive_executor.run(
+        lambda: download_to_path(service, file_id, output_path, chunk_size, http=get_thread_http()))
 
     return f"File downloaded to {output_path}"
 
@@ -184,29 +503,53 @@ async def download_file_from_drive(service, arguments: dict) -> str:
 async def delete_file_from_drive(service, arguments: dict) -> str:
     """Delete file from Google Drive."""
     file_id = arguments["file_id"]
-    service.files().delete(fileId=file_id).execute()
+    await drive_executor.run(
+        lambda: service.files().delete(fileId=file_id).execute(http=get_thread_http()))
     return f"File {file_id} deleted successfully"
 
 
-async def main():
-    from mcp.server.stdio import stdio_server
-
+def report_bulk_progress(total: int):
+    """Build an on_complete callback that streams bulk transfer results as progress."""
+    async def on_complete(completed: int, entry: dict):
+        await report_progress(server, completed, total,
+                              message=f"{entry['item']}: {entry['status']}")
+    return on_complete
+
+
+async def upload_files_to_drive(service, arguments: dict) -> dict:
+    """Upload a local directory or glob of files to Google Drive in parallel."""
+    paths = expand_sources(arguments["source"], arguments.get("recursive", False))
+    return await bulk_upload(
+        service, paths,
+        folder_id=arguments.get("folder_id"),
+        dedup=arguments.get("dedup", False),
+        max_workers=arguments.get("max_workers", DEFAULT_WORKERS),
+        retries=arguments.get("retries", DEFAULT_RETRIES),
+        on_complete=report_bulk_progress(len(paths)),
+        executor=drive_executor,
+    )
+
+
+async def download_files_from_drive(service, arguments: dict) -> dict:
+    """Download a list of Google Drive files in parallel."""
+    file_ids = arguments["file_ids"]
+    return await bulk_download(
+        service, file_ids, arguments["output_dir"],
+        max_workers=arguments.get("max_workers", DEFAULT_WORKERS),
+        retries=arguments.get("retries", DEFAULT_RETRIES),
+        on_complete=report_bulk_progress(len(file_ids)),
+        executor=drive_executor,
+    )
+
+
+async def main(argv=None):
+    args = parse_transport_args("Google Drive MCP server", DEFAULT_HTTP_PORT, argv)
     print("Starting Google Drive MCP server...", file=sys.stderr)
 
-    async with stdio_server() as (read_stream, write_stream):
-        print("Google Drive server ready for MCP connections", file=sys.stderr)
-        await server.run(
-            read_stream,
-            write_stream,
-            InitializationOptions(
-                server_name="gdrive-server",
-                server_version="0.1.0",
-                capabilities=server.get_capabilities(
-                    notification_options=NotificationOptions(),
-                    experimental_capabilities={},
-                ),
-            ),
-        )
+    try:
+        await serve(server, args, "Google Drive server ready for MCP connections")
+    finally:
+        drive_executor.shutdown(wait=False)
 
 if __name__ == "__main__":
     asyncio.run(main())
@@ -0,0 +1,257 @@
+from googleapiclient.errors import HttpError
+import json
+import os
+import threading
+
+from .dedup import md5_file
+from .transport import chunk_retrier
+
+# Bytes fetched per ranged request; bounds peak memory during a download
+DEFAULT_CHUNK_SIZE = 8 * 1024 * 1024
+
+# Resumable upload chunks must be a multiple of 256 KiB
+UPLOAD_CHUNK_ALIGNMENT = 256 * 1024
+
+UPLOAD_SESSIONS_PATH = os.path.join(
+    os.path.dirname(__file__), '../../config/upload_sessions.json')
+
+
+def MediaFileUpload(*args, **kwargs):
+    # googleapiclient.http is slow to import; load it with the first upload
+    from googleapiclient.http import MediaFileUpload
+    return MediaFileUpload(*args, **kwargs)
+
+
+def partial_path(output_path: str) -> str:
+    """Path of the in-progress file written beside output_path."""
+    return output_path + '.part'
+
+
+def partial_meta_path(output_path: str) -> str:
+    """Path of the sidecar recording which file and revision the .part file holds."""
+    return partial_path(output_path) + '.json'
+
+
+# Fields identifying a file's revision, so a .part file is only resumed for the same content
+REVISION_FIELDS = 'md5Checksum,modifiedTime'
+
+
+def _discard_partial(output_path: str):
+    for path in (partial_path(output_path), partial_meta_path(output_path)):
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def _resume_offset(output_path: str, revision: dict) -> int:
+    """Bytes already downloaded for this revision; a .part file from anything else is discarded."""
+    part_path = partial_path(output_path)
+    meta_path = partial_meta_path(output_path)
+    try:
+        with open(meta_path) as f:
+            saved = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        saved = None
+    if saved == revision and os.path.exists(part_path):
+        return os.path.getsize(part_path)
+    _discard_partial(output_path)
+    with open(meta_path, 'w') as f:
+        json.dump(revision, f)
+    return 0
+
+
+def _content_range_total(content_range):
+    # "bytes 0-1023/4096" -> 4096; "bytes */4096" -> 4096; unknown -> None
+    if not content_range or '/' not in content_range:
+        return None
+    total = content_range.rsplit('/', 1)[1]
+    return int(total) if total.isdigit() else None
+
+
+def download_to_path(service, file_id: str, output_path: str,
+                     chunk_size: int = DEFAULT_CHUNK_SIZE, http=None, metadata: dict | None = None) -> int:
+    """Stream a Drive file to output_path one ranged chunk at a time.
+
+    Bytes are appended to a .part file beside output_path, which is renamed
+    into place once complete. If an earlier download of the same file and
+    revision was interrupted, the existing .part file is resumed with an
+    HTTP Range request rather than starting over; a .part file left by
+    another file or an older revision is discarded. The result is checked
+    against the file's md5Checksum before the rename. metadata, if the
+    caller already fetched it, must include REVISION_FIELDS. Returns the
+    size of the downloaded file.
+    """
+    request = service.files().get_media(fileId=file_id)
+    http = http or request.http
+    if metadata is None:
+        metadata = service.files().get(fileId=file_id, fields=REVISION_FIELDS).execute(http=http)
+    md5 = metadata.get('md5Checksum')
+    revision = {'file_id': file_id, 'md5Checksum': md5, 'modifiedTime': metadata.get('modifiedTime')}
+    part_path = partial_path(output_path)
+    offset = _resume_offset(output_path, revision)
+    total = None
+
+    with open(part_path, 'ab') as f:
+        while total is None or offset < total:
+            headers = dict(request.headers)
+            headers['range'] = f'bytes={offset}-{offset + chunk_size - 1}'
+            resp, content = http.request(request.uri, headers=headers)
+
+            if resp.status == 416:
+                # Nothing left past offset: the .part file already holds it all,
+                # unless it is longer than the remote file and must be restarted
+                total = _content_range_total(resp.get('content-range'))
+                if total is not None and total < offset:
+                    f.truncate(0)
+                    offset, total = 0, None
+                    continue
+                break
+            if resp.status == 200:
+                # Range ignored; the body is the whole file
+                f.truncate(0)
+                f.write(content)
+                offset = len(content)
+                break
+            if resp.status != 206:
+                raise HttpError(resp, content, uri=request.uri)
+
+            total = _content_range_total(resp.get('content-range'))
+            if not content and (total is None or offset < total):
+                # Keep the .part file so a retry resumes from here
+                raise IOError(f"Download of {file_id} stalled at byte {offset}")
+            f.write(content)
+            offset += len(content)
+            if total is None and len(content) < chunk_size:
+                break
+
+    if md5 is not None and md5_file(part_path) != md5:
+        _discard_partial(output_path)
+        raise IOError(f"Download of {file_id} is corrupt: md5 does not match md5Checksum")
+    os.replace(part_path, output_path)
+    os.remove(partial_meta_path(output_path))
+    return offset
+
+
+class UploadSessionStore:
+    """Persists resumable upload session URIs so a restarted server can continue.
+
+    Sessions are keyed on the local file's path, size and mtime plus the Drive
+    metadata, so a modified file never resumes a stale session.
+    """
+
+    def __init__(self, path: str = UPLOAD_SESSIONS_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def session_key(file_path: str, metadata: dict) -> str:
+        stat = os.stat(file_path)
+        return json.dumps([os.path.abspath(file_path), stat.st_size, stat.st_mtime_ns, metadata],
+                          sort_keys=True)
+
+    def _load(self) -> dict:
+        try:
+            with open(self.path, 'r') as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+
+    def _save(self, sessions: dict):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(sessions, f)
+        os.replace(tmp_path, self.path)
+
+    def get(self, key: str):
+        with self._lock:
+            return self._load().get(key)
+
+    def put(self, key: str, uri: str):
+        with self._lock:
+            sessions = self._load()
+            sessions[key] = uri
+            self._save(sessions)
+
+    def remove(self, key: str):
+        with self._lock:
+            sessions = self._load()
+            if sessions.pop(key, None) is not None:
+                self._save(sessions)
+
+
+upload_sessions = UploadSessionStore()
+
+
+def align_upload_chunk_size(chunk_size: int) -> int:
+    """Round chunk_size up to the 256 KiB multiple the resumable protocol requires."""
+    chunks = max(1, -(-chunk_size // UPLOAD_CHUNK_ALIGNMENT))
+    return chunks * UPLOAD_CHUNK_ALIGNMENT
+
+
+class ResumableUpload:
+    """A chunked resumable upload whose session survives server restarts.
+
+    Call next_chunk() until it returns True; each call sends one chunk and
+    blocks, so async callers should run it off the event loop.
+    """
+
+    def __init__(self, service, file_path: str, metadata: dict,
+                 chunk_size: int = DEFAULT_CHUNK_SIZE, sessions: UploadSessionStore | None = None,
+                 http=None):
+        self.media = MediaFileUpload(file_path, chunksize=align_upload_chunk_size(chunk_size),
+                                     resumable=True)
+        self.request = service.files().create(body=metadata, media_body=self.media, fields='id')
+        self.sessions = sessions
+        self.key = UploadSessionStore.session_key(file_path, metadata) if sessions else None
+        self.response = None
+        if sessions is not None:
+            self._resume(http or self.request.http)
+
+    @property
+    def total_size(self) -> int:
+        return self.media.size()
+
+    @property
+    def bytes_sent(self) -> int:
+        return self.total_size if self.response is not None else self.request.resumable_progress
+
+    def _resume(self, http):
+        uri = self.sessions.get(self.key)
+        if uri is None:
+            return
+        # Ask the upload session how much it already has
+        headers = {'Content-Range': f'bytes */{self.total_size}', 'Content-Length': '0'}
+        resp, content = http.request(uri, 'PUT', headers=headers)
+        if resp.status in (200, 201):
+            self.response = json.loads(content)
+            self.sessions.remove(self.key)
+        elif resp.status == 308:
+            self.request.resumable_uri = uri
+            received = resp.get('range')
+            self.request.resumable_progress = int(received.split('-')[1]) + 1 if received else 0
+        else:
+            # Expired or unknown session: start a new one
+            self.sessions.remove(self.key)
+
+    def next_chunk(self, http=None) -> bool:
+        """Send the next chunk; returns True once the upload is complete."""
+        if self.response is not None:
+            return True
+        new_session = self.request.resumable_uri is None
+        # A failed chunk leaves resumable_progress alone, so a retry resends it
+        _, self.response = chunk_retrier.call_sync(lambda: self.request.next_chunk(http=http))
+        if self.sessions is not None:
+            if self.response is not None:
+                self.sessions.remove(self.key)
+            elif new_session:
+                self.sessions.put(self.key, self.request.resumable_uri)
+        return self.response is not None
+
+
+def upload_path(service, file_path: str, metadata: dict, chunk_size: int = DEFAULT_CHUNK_SIZE,
+                sessions: UploadSessionStore | None = None, http=None) -> dict:
+    """Upload file_path with a blocking ResumableUpload; returns the created file resource."""
+    upload = ResumableUpload(service, file_path, metadata, chunk_size, sessions, http=http)
+    while not upload.next_chunk(http=http):
+        pass
+    return upload.response
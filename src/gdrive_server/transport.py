@@ -0,0 +1,124 @@
+from googleapiclient.errors import HttpError
+from urllib.parse import urlparse
+import json
+import os
+
+from src.shared.metrics import metrics
+from src.shared.retry import (NO_RETRY, RETRYABLE_STATUSES, Retrier, RetryDecision, RetryPolicy,
+                              TokenBucket, parse_retry_after)
+
+# Client-side request budget for the Drive API, shared by every thread
+RATE_LIMIT = float(os.environ.get("GDRIVE_RATE_LIMIT", "20"))  # requests per second
+RATE_BURST = float(os.environ.get("GDRIVE_RATE_BURST", "40"))
+MAX_ATTEMPTS = int(os.environ.get("GDRIVE_MAX_ATTEMPTS", "5"))
+
+# 403 reasons Drive uses for quota throttling rather than a real permission error
+RATE_LIMIT_REASONS = frozenset({"userRateLimitExceeded", "rateLimitExceeded"})
+
+
+def _error_reasons(content) -> set[str]:
+    try:
+        error = json.loads(content).get('error', {})
+    except (TypeError, ValueError, AttributeError):
+        return set()
+    if not isinstance(error, dict):
+        return set()
+    return {item.get('reason') for item in error.get('errors', []) + error.get('details', [])
+            if isinstance(item, dict)}
+
+
+def classify_response(resp, content) -> RetryDecision:
+    """Decide whether a Drive response is worth retrying."""
+    status = resp.status
+    rate_limited = status == 429 or (
+        status == 403 and _error_reasons(content) & RATE_LIMIT_REASONS)
+    if not rate_limited and status not in RETRYABLE_STATUSES:
+        return NO_RETRY
+    return RetryDecision(True, parse_retry_after(resp.get('retry-after')), bool(rate_limited))
+
+
+def classify_drive_error(exc) -> RetryDecision:
+    """Retry throttling, transient server errors and dropped connections."""
+    if isinstance(exc, HttpError):
+        return classify_response(exc.resp, exc.content)
+    # Imported here, not at startup: by the time a request fails httplib2 is loaded
+    from httplib2 import ServerNotFoundError
+    if isinstance(exc, (ConnectionError, TimeoutError, ServerNotFoundError)):
+        return RetryDecision(True)
+    return NO_RETRY
+
+
+retry_policy = RetryPolicy(max_attempts=MAX_ATTEMPTS)
+drive_retrier = Retrier(classify_drive_error, retry_policy, TokenBucket(RATE_LIMIT, RATE_BURST))
+# Upload chunks are retried above the transport (their bodies are streams it
+# can't replay), so they reuse the policy but not the bucket.
+chunk_retrier = Retrier(classify_drive_error, retry_policy)
+
+
+def request_kind(uri: str, method: str) -> str:
+    """Group a Drive request for metrics, e.g. "GET files" or "PUT upload"."""
+    parsed = urlparse(uri)
+    if parsed.path.startswith("/upload/"):
+        kind = "upload"
+    elif parsed.path.startswith("/batch/"):
+        kind = "batch"
+    elif "alt=media" in parsed.query:
+        kind = "media"
+    elif "/changes" in parsed.path:
+        kind = "changes"
+    else:
+        kind = "files"
+    return f"{method} {kind}"
+
+
+def _content_length(body, headers) -> int:
+    if isinstance(body, (str, bytes)):
+        return len(body)
+    for name, value in (headers or {}).items():
+        if name.lower() == "content-length":
+            return int(value)
+    return 0
+
+
+class RetryingHttp:
+    """httplib2-compatible wrapper adding rate limiting and retries to every request.
+
+    Every request draws from drive_retrier's token bucket. Requests with a
+    replayable body are retried on 429, 5xx and rate-limit 403 responses;
+    once retries run out the last response is returned unchanged so
+    googleapiclient raises its usual HttpError. Each attempt's latency and
+    bytes sent and received are recorded in the shared metrics.
+    """
+
+    def __init__(self, http, retrier: Retrier = drive_retrier):
+        self.http = http
+        self.retrier = retrier
+
+    def __getattr__(self, name):
+        # credentials, timeout, etc. are read from the wrapped transport
+        return getattr(self.http, name)
+
+    def _send(self, uri, method, body, headers, *args, **kwargs):
+        kind = request_kind(uri, method)
+        with metrics.timer("upstream", kind):
+            resp, content = self.http.request(uri, method, body, headers, *args, **kwargs)
+        metrics.incr("upstream_bytes_sent", kind, _content_length(body, headers))
+        metrics.incr("upstream_bytes_received", kind, len(content or b""))
+        return resp, content
+
+    def request(self, uri, method="GET", body=None, headers=None, *args, **kwargs):
+        def attempt():
+            resp, content = self._send(uri, method, body, headers, *args, **kwargs)
+            if classify_response(resp, content).retry:
+                raise HttpError(resp, content, uri=uri)
+            return resp, content
+
+        if body is not None and not isinstance(body, (str, bytes)):
+            # A stream would be half consumed after a failed attempt
+            if self.retrier.bucket is not None:
+                self.retrier.bucket.acquire_sync()
+            return self._send(uri, method, body, headers, *args, **kwargs)
+        try:
+            return self.retrier.call_sync(attempt)
+        except HttpError as error:
+            return error.resp, error.content
@@ -0,0 +1,252 @@
+import json
+import os
+import re
+import sqlite3
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+
+class TTLCache:
+    """Bounded LRU cache whose entries expire after a per-entry time-to-live.
+
+    Safe to share between threads. Values are returned as stored, so callers
+    must not mutate them.
+    """
+
+    def __init__(self, max_entries: int = 256, default_ttl: float = 300, clock=time.monotonic):
+        self.max_entries = max_entries
+        self.default_ttl = default_ttl
+        self._clock = clock
+        self._entries = OrderedDict()  # key -> (expires_at, value)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key, default=None):
+        """Return the cached value for key, or default if missing or expired."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            expires_at, value = entry
+            if expires_at <= self._clock():
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value, ttl: float | None = None):
+        """Store value under key, evicting the least recently used entries if full."""
+        ttl = self.default_ttl if ttl is None else ttl
+        with self._lock:
+            self._entries[key] = (self._clock() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def expires_in(self, key) -> float | None:
+        """Seconds until key expires, or None if it isn't cached; not counted as a lookup."""
+        with self._lock:
+            entry = self._entries.get(key)
+            remaining = entry[0] - self._clock() if entry is not None else 0
+        return remaining if remaining > 0 else None
+
+    def __contains__(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            return entry is not None and entry[0] > self._clock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def clear(self):
+        """Drop all entries and reset the counters."""
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = self.evictions = self.expirations = 0
+
+    def stats(self) -> dict:
+        """Return hit, miss and eviction counters along with the current size."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "size": len(self._entries),
+                "max_entries": self.max_entries,
+            }
+
+
+class DiskCache:
+    """TTLCache counterpart kept in SQLite, shared by every process using the same file.
+
+    Entries survive restarts and are visible to other processes as soon as
+    they are written. The database runs in WAL mode so readers don't block
+    the writer, and expiry uses wall-clock time since processes share no
+    monotonic clock. Keys and values must be JSON-serializable; values come
+    back as fresh copies, with tuples turned into lists. Once more than
+    max_entries are stored, expired and then least recently used entries are
+    evicted. A database error is counted and treated as a miss rather than
+    failing the caller.
+    """
+
+    def __init__(self, path: str, max_entries: int = 256, default_ttl: float = 300,
+                 table: str = "entries", clock=time.time):
+        if not re.fullmatch(r"[A-Za-z_]\w*", table):
+            raise ValueError(f"Invalid table name: {table}")
+        self.path = path
+        self.max_entries = max_entries
+        self.default_ttl = default_ttl
+        self.table = table
+        self._clock = clock
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        # Operations are sub-millisecond, so callers on an event loop use it
+        # directly; this bounds the wait when another process is writing.
+        self._conn = sqlite3.connect(path, timeout=1, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute(
+                f"CREATE TABLE IF NOT EXISTS {table} (key TEXT PRIMARY KEY, value TEXT NOT NULL, "
+                "expires_at REAL NOT NULL, accessed_at REAL NOT NULL)")
+            self._conn.execute(f"CREATE INDEX IF NOT EXISTS {table}_accessed ON {table} (accessed_at)")
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.errors = 0
+
+    @staticmethod
+    def _key(key) -> str:
+        return json.dumps(key, separators=(",", ":"))
+
+    def _failed(self, error):
+        self.errors += 1
+        print(f"Disk cache {self.path}: {error}", file=sys.stderr)
+
+    def get(self, key, default=None):
+        """Return the cached value for key, or default if missing or expired."""
+        key = self._key(key)
+        now = self._clock()
+        with self._lock:
+            try:
+                with self._conn:
+                    row = self._conn.execute(
+                        f"SELECT value, expires_at FROM {self.table} WHERE key = ?", (key,)).fetchone()
+                    if row is not None and row[1] <= now:
+                        self._conn.execute(
+                            f"DELETE FROM {self.table} WHERE key = ? AND expires_at <= ?", (key, now))
+                        self.expirations += 1
+                        row = None
+                    elif row is not None:
+                        self._conn.execute(
+                            f"UPDATE {self.table} SET accessed_at = ? WHERE key = ?", (now, key))
+            except sqlite3.Error as e:
+                self._failed(e)
+                row = None
+            if row is None:
+                self.misses += 1
+                return default
+            self.hits += 1
+        return json.loads(row[0])
+
+    def set(self, key, value, ttl: float | None = None):
+        """Store value under key, evicting the least recently used entries if full."""
+        ttl = self.default_ttl if ttl is None else ttl
+        row = (self._key(key), json.dumps(value, separators=(",", ":")))
+        now = self._clock()
+        with self._lock:
+            try:
+                with self._conn:
+                    self._conn.execute(
+                        f"INSERT OR REPLACE INTO {self.table} (key, value, expires_at, accessed_at) "
+                        "VALUES (?, ?, ?, ?)", (*row, now + ttl, now))
+                    excess = self._conn.execute(
+                        f"SELECT COUNT(*) FROM {self.table}").fetchone()[0] - self.max_entries
+                    if excess > 0:
+                        excess -= self._evict(f"DELETE FROM {self.table} WHERE expires_at <= ?",
+                                              (now,), "expirations")
+                    if excess > 0:
+                        self._evict(f"DELETE FROM {self.table} WHERE key IN (SELECT key FROM "
+                                    f"{self.table} ORDER BY accessed_at LIMIT ?)", (excess,), "evictions")
+            except sqlite3.Error as e:
+                self._failed(e)
+
+    def _evict(self, statement: str, params: tuple, counter: str) -> int:
+        removed = self._conn.execute(statement, params).rowcount
+        setattr(self, counter, getattr(self, counter) + removed)
+        return removed
+
+    def expires_in(self, key) -> float | None:
+        """Seconds until key expires, or None if it isn't cached; not counted as a lookup."""
+        with self._lock:
+            try:
+                row = self._conn.execute(f"SELECT expires_at FROM {self.table} WHERE key = ?",
+                                         (self._key(key),)).fetchone()
+            except sqlite3.Error as e:
+                self._failed(e)
+                row = None
+        remaining = row[0] - self._clock() if row is not None else 0
+        return remaining if remaining > 0 else None
+
+    def __contains__(self, key):
+        with self._lock:
+            try:
+                row = self._conn.execute(f"SELECT 1 FROM {self.table} WHERE key = ? AND expires_at > ?",
+                                         (self._key(key), self._clock())).fetchone()
+            except sqlite3.Error as e:
+                self._failed(e)
+                row = None
+        return row is not None
+
+    def __len__(self):
+        with self._lock:
+            try:
+                return self._conn.execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()[0]
+            except sqlite3.Error as e:
+                self._failed(e)
+                return 0
+
+    def clear(self):
+        """Drop all entries, for every process sharing the file, and reset the counters."""
+        with self._lock:
+            try:
+                with self._conn:
+                    self._conn.execute(f"DELETE FROM {self.table}")
+            except sqlite3.Error as e:
+                self._failed(e)
+                return
+            self.hits = self.misses = self.evictions = self.expirations = self.errors = 0
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def stats(self) -> dict:
+        """Return this process's hit, miss and eviction counters along with the shared size."""
+        size = len(self)
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "errors": self.errors,
+            "size": size,
+            "max_entries": self.max_entries,
+            "path": self.path,
+        }
@@ -0,0 +1,142 @@
+import threading
+import time
+from collections import deque
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling an upstream the breaker considers down."""
+
+    def __init__(self, name: str, retry_in: float):
+        super().__init__(f"{name} circuit is open; not retrying for {retry_in:.1f}s")
+        self.retry_in = retry_in
+
+
+class CircuitBreaker:
+    """Fails fast once an upstream's recent error rate crosses a threshold.
+
+    Outcomes are kept over a rolling window. Once at least min_requests have
+    been seen and the failure rate reaches failure_threshold, the circuit
+    opens and calls raise CircuitOpenError without touching the upstream.
+    After open_seconds it goes half-open and lets up to half_open_max_calls
+    probes through: a successful probe closes the circuit, a failed one
+    reopens it. is_failure(exception) decides which errors count against the
+    upstream; anything else (a bad request, say) counts as a success.
+    """
+
+    def __init__(self, name: str = "upstream", failure_threshold: float = 0.5,
+                 min_requests: int = 10, window: float = 30.0, open_seconds: float = 30.0,
+                 half_open_max_calls: int = 1, is_failure=None, clock=time.monotonic):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.min_requests = max(1, min_requests)
+        self.window = window
+        self.open_seconds = open_seconds
+        self.half_open_max_calls = max(1, half_open_max_calls)
+        self.is_failure = is_failure or (lambda exc: True)
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._outcomes = deque()  # (timestamp, failed)
+        self._failures = 0
+        self._state = CLOSED
+        self._opened_at = 0.0
+        self._probes = 0
+        self.opened = 0
+        self.rejected = 0
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._state == OPEN and self._clock() - self._opened_at >= self.open_seconds:
+                return HALF_OPEN
+            return self._state
+
+    def _prune(self, now):
+        while self._outcomes and now - self._outcomes[0][0] > self.window:
+            _, failed = self._outcomes.popleft()
+            self._failures -= failed
+
+    def _trip(self, now):
+        self._state = OPEN
+        self._opened_at = now
+        self._outcomes.clear()
+        self._failures = 0
+        self.opened += 1
+
+    def _before_call(self) -> int | None:
+        """Admit or reject a call; returns a probe token for half-open probes, else None.
+
+        The token is the trip count the probe was admitted under, so a probe
+        from an earlier half-open round can't close or reopen a later one.
+        """
+        with self._lock:
+            now = self._clock()
+            if self._state == OPEN:
+                remaining = self.open_seconds - (now - self._opened_at)
+                if remaining > 0:
+                    self.rejected += 1
+                    raise CircuitOpenError(self.name, remaining)
+                self._state = HALF_OPEN
+                self._probes = 0
+            if self._state == HALF_OPEN:
+                if self._probes >= self.half_open_max_calls:
+                    self.rejected += 1
+                    raise CircuitOpenError(self.name, 0.0)
+                self._probes += 1
+                return self.opened
+            return None
+
+    def _after_call(self, failed: bool | None, probe: int | None):
+        """Record an outcome; failed is None when the call was cancelled.
+
+        Only the probes of the current half-open round decide whether the
+        circuit closes; calls admitted while it was closed only count
+        towards the window if it still is.
+        """
+        with self._lock:
+            now = self._clock()
+            if probe is not None:
+                if self._state == HALF_OPEN and probe == self.opened:
+                    self._probes -= 1
+                    if failed:
+                        self._trip(now)
+                    elif failed is not None:
+                        self._state = CLOSED
+                return
+            if failed is None or self._state != CLOSED:
+                return
+            self._outcomes.append((now, failed))
+            self._failures += failed
+            self._prune(now)
+            if (failed and len(self._outcomes) >= self.min_requests
+                    and self._failures / len(self._outcomes) >= self.failure_threshold):
+                self._trip(now)
+
+    async def call(self, fn):
+        """Await fn() unless the circuit is open."""
+        probe = self._before_call()
+        try:
+            result = await fn()
+        except Exception as exc:
+            self._after_call(bool(self.is_failure(exc)), probe)
+            raise
+        except BaseException:
+            self._after_call(None, probe)
+            raise
+        self._after_call(False, probe)
+        return result
+
+    def stats(self) -> dict:
+        state = self.state
+        with self._lock:
+            self._prune(self._clock())
+            return {
+                "state": state,
+                "recent_requests": len(self._outcomes),
+                "recent_failures": self._failures,
+                "opened": self.opened,
+                "rejected": self.rejected,
+            }
@@ -0,0 +1,39 @@
+import asyncio
+import json
+
+
+def call_key(name: str, arguments: dict | None) -> str:
+    """Canonical key for a call: the name plus its arguments as sorted, compact JSON."""
+    canonical = json.dumps(arguments or {}, sort_keys=True, separators=(",", ":"), default=str)
+    return f"{name}:{canonical}"
+
+
+class SingleFlight:
+    """Coalesce concurrent identical calls into one upstream request.
+
+    The first caller for a key starts the work; callers arriving while it is
+    in flight await the same task and receive its result or exception.
+    Cancelling one caller does not cancel the shared work for the others.
+    """
+
+    def __init__(self):
+        self._inflight: dict[str, asyncio.Task] = {}
+        self.started = 0
+        self.coalesced = 0
+
+    async def do(self, key: str, fn):
+        """Return the result of fn(), sharing it with concurrent callers using key."""
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(fn())
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+            self.started += 1
+        else:
+            self.coalesced += 1
+        return await asyncio.shield(task)
+
+    def stats(self) -> dict:
+        """Return the number of upstream calls started and callers that joined one."""
+        return {"started": self.started, "coalesced": self.coalesced,
+                "in_flight": len(self._inflight)}
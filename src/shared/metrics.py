@@ -0,0 +1,170 @@
+import functools
+import json
+import math
+import os
+import sys
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+# Latency percentiles are computed over each histogram's most recent samples
+WINDOW = 2048
+
+# Where structured events go: "stderr" (default), "off", or a file path.
+# Never stdout, which carries the MCP stdio transport.
+METRICS_LOG = os.environ.get("MCP_METRICS_LOG", "stderr")
+
+# Set MCP_DIAGNOSTICS=1 to expose the get_server_metrics tool
+DIAGNOSTICS = os.environ.get("MCP_DIAGNOSTICS") == "1"
+DIAGNOSTIC_TOOL_NAME = "get_server_metrics"
+
+
+def percentile(sorted_values: list[float], q: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    return sorted_values[max(0, math.ceil(q * len(sorted_values)) - 1)]
+
+
+def process_stats() -> dict:
+    """Peak resident memory and CPU time of this process, where the platform reports them."""
+    try:
+        import resource
+    except ImportError:  # Windows
+        return {}
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    # ru_maxrss is in bytes on macOS and kilobytes elsewhere
+    max_rss = usage.ru_maxrss if sys.platform == "darwin" else usage.ru_maxrss * 1024
+    return {"max_rss_mb": round(max_rss / 2 ** 20, 1),
+            "cpu_seconds": round(usage.ru_utime + usage.ru_stime, 3)}
+
+
+class Histogram:
+    """Latency samples: exact count, mean and max, percentiles over a recent window."""
+
+    def __init__(self, window: int = WINDOW):
+        self.samples = deque(maxlen=window)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds: float):
+        self.samples.append(seconds)
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    def summary(self) -> dict:
+        ordered = sorted(self.samples)
+        return {
+            "count": self.count,
+            "mean_ms": round(1000 * self.total / self.count, 3) if self.count else 0.0,
+            "p50_ms": round(1000 * percentile(ordered, 0.50), 3),
+            "p95_ms": round(1000 * percentile(ordered, 0.95), 3),
+            "p99_ms": round(1000 * percentile(ordered, 0.99), 3),
+            "max_ms": round(1000 * self.max, 3),
+        }
+
+
+class Metrics:
+    """Process-wide latency histograms and counters, plus a JSON-lines event log.
+
+    Histograms and counters are keyed by a name ("tool", "upstream") and a
+    key within it (the tool or endpoint). timer() records both and emits one
+    event per call. Safe to use from worker threads.
+    """
+
+    def __init__(self, service: str = "mcp-server", log: str = METRICS_LOG):
+        self.service = service
+        self._lock = threading.Lock()
+        self._histograms = {}
+        self._counters = {}
+        self._log = log
+        self._log_file = None
+
+    def observe(self, name: str, key: str, seconds: float):
+        with self._lock:
+            histogram = self._histograms.setdefault(name, {}).get(key)
+            if histogram is None:
+                histogram = self._histograms[name][key] = Histogram()
+            histogram.observe(seconds)
+
+    def incr(self, name: str, key: str, value: int = 1):
+        with self._lock:
+            counters = self._counters.setdefault(name, {})
+            counters[key] = counters.get(key, 0) + value
+
+    @contextmanager
+    def timer(self, name: str, key: str, **fields):
+        """Time the block; failures are also counted under "<name>_errors"."""
+        started = time.perf_counter()
+        ok = False
+        try:
+            yield
+            ok = True
+        finally:
+            seconds = time.perf_counter() - started
+            self.observe(name, key, seconds)
+            if not ok:
+                self.incr(f"{name}_errors", key)
+            self.emit(name, key=key, ms=round(1000 * seconds, 3), ok=ok, **fields)
+
+    def _stream(self):
+        if self._log == "stderr":
+            return sys.stderr
+        if self._log_file is None:
+            self._log_file = open(self._log, "a", buffering=1)
+        return self._log_file
+
+    def emit(self, event: str, **fields):
+        """Write one structured event as a JSON line, unless logging is off."""
+        if self._log == "off":
+            return
+        line = json.dumps({"ts": round(time.time(), 3), "service": self.service,
+                           "event": event, **fields}, default=str)
+        with self._lock:
+            stream = self._stream()
+            stream.write(line + "\n")
+            stream.flush()
+
+    def snapshot(self) -> dict:
+        """Return latency summaries and counters recorded so far, plus process stats."""
+        with self._lock:
+            return {
+                "latency": {name: {key: histogram.summary() for key, histogram in keys.items()}
+                            for name, keys in self._histograms.items()},
+                "counters": {name: dict(keys) for name, keys in self._counters.items()},
+                "process": process_stats(),
+            }
+
+    def reset(self):
+        with self._lock:
+            self._histograms.clear()
+            self._counters.clear()
+
+
+metrics = Metrics()
+
+
+def instrument_tool(handler):
+    """Wrap an MCP call_tool handler to record per-tool latency and response size."""
+    @functools.wraps(handler)
+    async def wrapper(name, arguments):
+        with metrics.timer("tool", name):
+            result = await handler(name, arguments)
+        metrics.incr("response_bytes", name,
+                     sum(len(content.text.encode()) for content in result
+                         if getattr(content, "text", None)))
+        return result
+    return wrapper
+
+
+def diagnostic_tool():
+    """The get_server_metrics tool definition, listed only when DIAGNOSTICS is on."""
+    import mcp.types as types
+    return types.Tool(
+        name=DIAGNOSTIC_TOOL_NAME,
+        description="Report server latency percentiles, upstream timings, cache hit rates and retry counts",
+        inputSchema={"type": "object", "properties": {}},
+    )
@@ -0,0 +1,17 @@
+async def report_progress(server, progress: float, total: float | None = None,
+                          message: str | None = None):
+    """Send an MCP progress notification if the current request asked for them.
+
+    A no-op outside a request or when the client sent no progress token.
+    Notifications are tied to the request, so over streamable HTTP they go
+    out on that call's response stream rather than the standalone one.
+    """
+    try:
+        ctx = server.request_context
+    except LookupError:
+        return
+    token = ctx.meta.progressToken if ctx.meta else None
+    if token is None:
+        return
+    await ctx.session.send_progress_notification(token, progress, total=total, message=message,
+                                                 related_request_id=ctx.request_id)
@@ -0,0 +1,200 @@
+import asyncio
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from typing import NamedTuple
+
+# HTTP statuses worth retrying: throttling and transient server errors
+RETRYABLE_STATUSES = frozenset({408, 429, 500, 502, 503, 504})
+
+
+class RetryDecision(NamedTuple):
+    """How a classifier judged a failure."""
+    retry: bool
+    retry_after: float | None = None  # seconds the upstream asked us to wait
+    throttled: bool = False           # the upstream said we are over its rate limit
+
+
+NO_RETRY = RetryDecision(False)
+
+
+def parse_retry_after(value) -> float | None:
+    """Parse a Retry-After header given as seconds or an HTTP date."""
+    if value is None:
+        return None
+    value = str(value).strip()
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def backoff_delay(attempt: int, base_delay: float, max_delay: float = 30.0) -> float:
+    """Full-jitter exponential backoff: uniform in [0, base_delay * 2**(attempt - 1)], capped."""
+    return random.uniform(0, min(max_delay, base_delay * 2 ** (attempt - 1)))
+
+
+class RetryPolicy:
+    """Exponential backoff with full jitter, honouring Retry-After up to a limit."""
+
+    def __init__(self, max_attempts: int = 4, base_delay: float = 0.5, max_delay: float = 30.0,
+                 max_retry_after: float = 60.0):
+        self.max_attempts = max(1, max_attempts)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.max_retry_after = max_retry_after
+
+    def delay(self, attempt: int, retry_after: float | None = None) -> float:
+        """Seconds to wait after the given failed attempt (1-based)."""
+        if retry_after is not None:
+            return min(retry_after, self.max_retry_after)
+        return backoff_delay(attempt, self.base_delay, self.max_delay)
+
+
+class TokenBucket:
+    """Client-side rate limiter that backs off when the upstream throttles us.
+
+    Callers reserve a token and wait until it is available. throttle() halves
+    the refill rate and can pause all callers; each success then restores a
+    tenth of the configured rate, so throughput recovers gradually.
+    """
+
+    def __init__(self, rate: float, capacity: float | None = None, min_rate: float | None = None,
+                 clock=time.monotonic):
+        self.max_rate = rate
+        self.rate = rate
+        self.min_rate = min_rate if min_rate is not None else rate / 16
+        self.capacity = capacity if capacity is not None else rate
+        self._clock = clock
+        self._tokens = self.capacity
+        self._updated = clock()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def reserve(self) -> float:
+        """Take one token; returns how many seconds the caller must wait before using it."""
+        with self._lock:
+            now = self._clock()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0.0
+            return max(wait, self._paused_until - now)
+
+    def try_acquire(self) -> bool:
+        """Take a token only if one is available right now; never waits."""
+        with self._lock:
+            now = self._clock()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            if self._tokens < 1 or now < self._paused_until:
+                return False
+            self._tokens -= 1
+            return True
+
+    async def acquire(self):
+        wait = self.reserve()
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    def acquire_sync(self):
+        wait = self.reserve()
+        if wait > 0:
+            time.sleep(wait)
+
+    def throttle(self, pause: float | None = None):
+        """The upstream rejected us for rate: slow down, and pause everyone if told to."""
+        with self._lock:
+            self.rate = max(self.min_rate, self.rate / 2)
+            if pause:
+                self._paused_until = max(self._paused_until, self._clock() + pause)
+
+    def recover(self):
+        with self._lock:
+            self.rate = min(self.max_rate, self.rate + self.max_rate / 10)
+
+
+class Retrier:
+    """Retries and rate-limits calls to one upstream API.
+
+    classify(exception) returns a RetryDecision. Calls are rate limited by
+    bucket (if any), retried with the policy's jittered backoff, and the
+    bucket is slowed down whenever the upstream reports throttling.
+    """
+
+    def __init__(self, classify, policy: RetryPolicy | None = None, bucket: TokenBucket | None = None):
+        self.classify = classify
+        self.policy = policy or RetryPolicy()
+        self.bucket = bucket
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.retries = 0
+        self.throttled = 0
+        self.failures = 0
+
+    def _count(self, **counters):
+        with self._lock:
+            for name, value in counters.items():
+                setattr(self, name, getattr(self, name) + value)
+
+    def _after_failure(self, exc, attempt) -> float | None:
+        """Return the delay before the next attempt, or None to give up."""
+        decision = self.classify(exc)
+        if decision.throttled:
+            self._count(throttled=1)
+            if self.bucket is not None:
+                self.bucket.throttle(decision.retry_after)
+        if not decision.retry or attempt >= self.policy.max_attempts:
+            self._count(failures=1)
+            return None
+        self._count(retries=1)
+        return self.policy.delay(attempt, decision.retry_after)
+
+    async def call(self, fn):
+        """Await fn() with rate limiting and retries."""
+        self._count(calls=1)
+        for attempt in range(1, self.policy.max_attempts + 1):
+            if self.bucket is not None:
+                await self.bucket.acquire()
+            try:
+                result = await fn()
+            except Exception as exc:
+                delay = self._after_failure(exc, attempt)
+                if delay is None:
+                    raise
+                await asyncio.sleep(delay)
+            else:
+                if self.bucket is not None:
+                    self.bucket.recover()
+                return result
+
+    def call_sync(self, fn):
+        """Blocking version of call(), for worker threads."""
+        self._count(calls=1)
+        for attempt in range(1, self.policy.max_attempts + 1):
+            if self.bucket is not None:
+                self.bucket.acquire_sync()
+            try:
+                result = fn()
+            except Exception as exc:
+                delay = self._after_failure(exc, attempt)
+                if delay is None:
+                    raise
+                time.sleep(delay)
+            else:
+                if self.bucket is not None:
+                    self.bucket.recover()
+                return result
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = {"calls": self.calls, "retries": self.retries,
+                     "throttled": self.throttled, "failures": self.failures}
+        if self.bucket is not None:
+            stats["rate_limit"] = round(self.bucket.rate, 3)
+        return stats
@@ -0,0 +1,88 @@
+import argparse
+import asyncio
+import sys
+
+TRANSPORTS = ("stdio", "http")
+DEFAULT_HOST = "127.0.0.1"
+# The HTTP transport has no authentication of its own, so it only listens on loopback
+LOOPBACK_HOSTS = ("127.0.0.1", "localhost", "::1")
+HTTP_PATH = "/mcp"
+
+
+def parse_transport_args(description: str, default_port: int, argv=None) -> argparse.Namespace:
+    """Parse --transport, --host and --port for a server's main()."""
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument("--transport", choices=TRANSPORTS, default="stdio",
+                        help="stdio (one client, launched by it) or http (many clients, one process)")
+    parser.add_argument("--host", default=DEFAULT_HOST, help="Loopback address for --transport http")
+    parser.add_argument("--port", type=int, default=default_port, help="Port for --transport http")
+    args = parser.parse_args(argv)
+    if args.host not in LOOPBACK_HOSTS:
+        parser.error(f"--host must be a loopback address ({', '.join(LOOPBACK_HOSTS)})")
+    return args
+
+
+def build_http_app(server, host: str, port: int):
+    """Starlette app serving server over streamable HTTP at HTTP_PATH.
+
+    Every client gets its own MCP session, but all of them share this
+    process's connection pools, credentials and caches. Requests whose Host
+    or Origin header isn't this loopback address are rejected, so a web page
+    can't reach the server through DNS rebinding.
+    """
+    # Imported here so the default stdio transport doesn't pay for them at startup
+    import contextlib
+
+    from mcp.server.streamable_http_manager import StreamableHTTPSessionManager
+    from mcp.server.transport_security import TransportSecuritySettings
+    from starlette.applications import Starlette
+    from starlette.routing import Mount
+
+    addresses = [f"{name}:{port}" for name in ("127.0.0.1", "localhost", "[::1]")]
+    security = TransportSecuritySettings(
+        enable_dns_rebinding_protection=True,
+        allowed_hosts=addresses,
+        allowed_origins=[f"http://{address}" for address in addresses],
+    )
+    session_manager = StreamableHTTPSessionManager(app=server, security_settings=security)
+
+    async def handle_mcp(scope, receive, send):
+        await session_manager.handle_request(scope, receive, send)
+
+    @contextlib.asynccontextmanager
+    async def lifespan(app):
+        async with session_manager.run():
+            yield
+
+    return Starlette(routes=[Mount(HTTP_PATH, app=handle_mcp)], lifespan=lifespan)
+
+
+async def serve(server, args: argparse.Namespace, ready_message: str):
+    """Run server on the transport chosen by args until the client (stdio) or process (http) exits."""
+    if args.transport == "stdio":
+        from mcp.server.stdio import stdio_server
+
+        async with stdio_server() as (read_stream, write_stream):
+            print(ready_message, file=sys.stderr)
+            await server.run(read_stream, write_stream, server.create_initialization_options())
+        return
+
+    import uvicorn
+
+    app = build_http_app(server, args.host, args.port)
+    http_server = uvicorn.Server(uvicorn.Config(app, host=args.host, port=args.port,
+                                                log_level="warning", lifespan="on",
+                                                timeout_graceful_shutdown=5))
+    task = asyncio.ensure_future(http_server.serve())
+    try:
+        # Print the ready line only once the socket is listening, as clients wait for it
+        while not http_server.started and not task.done():
+            await asyncio.sleep(0.01)
+        if http_server.started:
+            print(f"{ready_message} on http://{args.host}:{args.port}{HTTP_PATH}", file=sys.stderr)
+        await asyncio.shield(task)
+    except asyncio.CancelledError:
+        # Shut down as on SIGTERM, closing the listening socket and open connections
+        http_server.should_exit = True
+        await task
+        raise
@@ -1,14 +1,61 @@
+import json
+import os
+import sys
+
+try:
+    import orjson
+except ImportError:  # optional: falls back to the stdlib encoder
+    orjson = None
+
+
 def log_message(message):
-    # Function to log messages
-    print(f"[LOG] {message}")
+    # Function to log messages; stderr, since stdout is the MCP stdio transport
+    print(f"[LOG] {message}", file=sys.stderr)
 
 def handle_error(error):
     # Function to handle errors
-    print(f"[ERROR] {error}")
+    print(f"[ERROR] {error}", file=sys.stderr)
 
 def validate_response(response):
     # Function to validate API responses
     if response.status_code != 200:
         handle_error(f"Invalid response: {response.status_code}")
         return False
-    return True
\ No newline at end of file
+    return True
+
+
+def _stdlib_dumps(data, compact=False):
+    if compact:
+        return json.dumps(data, separators=(",", ":"))
+    return json.dumps(data, indent=2)
+
+
+def _orjson_dumps(data, compact=False):
+    # Non-string keys are stringified, as the stdlib encoder does
+    option = orjson.OPT_NON_STR_KEYS if compact else orjson.OPT_NON_STR_KEYS | orjson.OPT_INDENT_2
+    return orjson.dumps(data, option=option).decode()
+
+
+SERIALIZERS = {"json": _stdlib_dumps}
+if orjson is not None:
+    SERIALIZERS["orjson"] = _orjson_dumps
+
+
+def get_serializer(backend=None):
+    """Return the dumps(data, compact=False) function for a JSON backend.
+
+    backend defaults to the MCP_JSON_BACKEND environment variable, then to
+    orjson when it is installed and the stdlib json module otherwise.
+    """
+    backend = backend or os.environ.get("MCP_JSON_BACKEND") or ("orjson" if orjson else "json")
+    if backend not in SERIALIZERS:
+        raise ValueError(f"JSON backend not available: {backend}")
+    return SERIALIZERS[backend]
+
+
+_dumps = get_serializer()
+
+
+def dumps(data, compact=False) -> str:
+    """Serialize a tool result: indented by default, minified with compact."""
+    return _dumps(data, compact)
@@ -0,0 +1,68 @@
+import os
+import re
+
+from src.shared.cache import DiskCache, TTLCache
+
+DEFAULT_CACHE_PATH = os.path.join(os.path.dirname(__file__), '../../config/weather_cache.sqlite')
+
+DEFAULT_CACHE_SETTINGS = {
+    "enabled": True,
+    "max_entries": 512,
+    "current_ttl": 300,      # 5 minutes
+    "forecast_ttl": 1800,    # 30 minutes
+    "merge_country_suffix": False,
+    "stale_ttl": 86400,      # how long a last-known-good response can stand in for the upstream
+    # Keep both caches in SQLite instead, shared across restarts and editor windows
+    "persistent": False,
+    "path": None,            # defaults to config/weather_cache.sqlite
+}
+
+_COORDINATES = re.compile(r"^-?\d+(\.\d+)?,-?\d+(\.\d+)?$")
+
+
+def cache_settings(config: dict) -> dict:
+    """Return the response cache settings with defaults applied."""
+    return {**DEFAULT_CACHE_SETTINGS, **config.get("cache", {})}
+
+
+def normalize_location(location: str, merge_country_suffix: bool = False) -> str:
+    """Normalize a location so equivalent spellings share a cache entry.
+
+    "london", "London " and "LONDON" all map to "london". With
+    merge_country_suffix, "London,UK" and "London, United Kingdom" do as well.
+    Coordinates such as "51.5,-0.12" are never split.
+    """
+    key = " ".join(location.split()).lower()
+    key = re.sub(r"\s*,\s*", ",", key)
+    if merge_country_suffix and not _COORDINATES.match(key):
+        key = key.split(",")[0]
+    return key
+
+
+def make_cache_key(endpoint: str, location: str, config: dict, *extra) -> tuple:
+    """Build the cache key for an endpoint lookup of location."""
+    settings = cache_settings(config)
+    return (endpoint, normalize_location(location, settings["merge_country_suffix"])) + extra
+
+
+def _build_cache(settings: dict, default_ttl: float, table: str) -> TTLCache | DiskCache:
+    if settings["persistent"]:
+        path = os.path.expanduser(settings["path"] or DEFAULT_CACHE_PATH)
+        return DiskCache(path, max_entries=settings["max_entries"], default_ttl=default_ttl, table=table)
+    return TTLCache(max_entries=settings["max_entries"], default_ttl=default_ttl)
+
+
+def build_response_cache(config: dict) -> TTLCache | DiskCache | None:
+    """Create the response cache described by config, or None if disabled."""
+    settings = cache_settings(config)
+    if not settings["enabled"]:
+        return None
+    return _build_cache(settings, settings["current_ttl"], "responses")
+
+
+def build_stale_cache(config: dict) -> TTLCache | DiskCache | None:
+    """Create the last-known-good cache served while the upstream is down, or None if disabled."""
+    settings = cache_settings(config)
+    if not settings["enabled"] or not settings["stale_ttl"]:
+        return None
+    return _build_cache(settings, settings["stale_ttl"], "last_good")
@@ -0,0 +1,150 @@
+import json
+import os
+import signal
+import sys
+import threading
+import time
+
+from dotenv import dotenv_values
+
+DEFAULT_CONFIG_PATH = os.path.join(os.path.dirname(__file__), '../../config/weather_config.json')
+DEFAULT_DOTENV_PATH = os.path.join(os.path.dirname(__file__), '../../.env')
+
+# WEATHER_API_KEY overrides "api_key"; a double underscore reaches into
+# nested settings, so WEATHER_CACHE__CURRENT_TTL overrides cache.current_ttl.
+ENV_PREFIX = "WEATHER_"
+# Variables with the prefix that configure the provider itself
+_RESERVED = {"WEATHER_CONFIG_PATH", "WEATHER_DOTENV_PATH"}
+
+
+# Settings that are always strings, even when the value looks like JSON ("12345", "true")
+STRING_SETTINGS = frozenset({"api_key", "base_url", "default_location", "cache.path", "forecast.widen"})
+
+
+def _parse_value(value: str):
+    # Numbers, booleans and JSON objects come through typed; anything else is a string
+    try:
+        return json.loads(value)
+    except ValueError:
+        return value
+
+
+def _lookup(config: dict, path: list[str]):
+    for key in path:
+        if not isinstance(config, dict):
+            return None
+        config = config.get(key)
+    return config
+
+
+def env_overrides(environ, prefix: str = ENV_PREFIX, base: dict | None = None) -> dict:
+    """Build a nested config dict from prefixed variables in environ.
+
+    Values are typed as JSON, except for STRING_SETTINGS and settings whose
+    value in base is a string, which are kept exactly as given.
+    """
+    overrides = {}
+    for name, value in environ.items():
+        if not name.startswith(prefix) or name in _RESERVED or value is None:
+            continue
+        path = name[len(prefix):].lower().split("__")
+        *parents, leaf = path
+        target = overrides
+        for parent in parents:
+            target = target.setdefault(parent, {})
+        if ".".join(path) in STRING_SETTINGS or isinstance(_lookup(base or {}, path), str):
+            target[leaf] = value
+        else:
+            target[leaf] = _parse_value(value)
+    return overrides
+
+
+def _merge(base: dict, overrides: dict) -> dict:
+    merged = dict(base)
+    for key, value in overrides.items():
+        if isinstance(value, dict) and isinstance(merged.get(key), dict):
+            value = _merge(merged[key], value)
+        merged[key] = value
+    return merged
+
+
+def _mtime(path):
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+
+class ConfigProvider:
+    """Caches the parsed weather config and reloads it only when it changes.
+
+    get() is cheap: the config file and .env file are stat'ed at most once
+    every check_interval seconds, and re-read only if either mtime moved or
+    invalidate() was called (e.g. from a SIGHUP handler). Variables from the
+    environment and the .env file override the JSON file, in that order of
+    precedence. If a reload fails the last good config is kept.
+    """
+
+    def __init__(self, path: str | None = None, dotenv_path: str | None = None,
+                 check_interval: float = 1.0, clock=time.monotonic):
+        # Unset paths are resolved from the environment on first use, not at import
+        self.path = path
+        self.dotenv_path = dotenv_path
+        self.check_interval = check_interval
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._config = None
+        self._signature = None
+        self._checked_at = 0.0
+        self._invalidated = False
+        self.reloads = 0
+
+    def _load(self, signature) -> dict:
+        with open(self.path, 'r') as f:
+            config = json.load(f)
+        environ = {**dotenv_values(self.dotenv_path), **os.environ}
+        self._config = _merge(config, env_overrides(environ, base=config))
+        self._signature = signature
+        self.reloads += 1
+        return self._config
+
+    def get(self) -> dict:
+        """Return the current config, reloading it first if it changed."""
+        now = self._clock()
+        config = self._config
+        if config is not None and not self._invalidated and now - self._checked_at < self.check_interval:
+            return config
+        with self._lock:
+            if self._config is None:
+                self.path = self.path or os.environ.get("WEATHER_CONFIG_PATH") or DEFAULT_CONFIG_PATH
+                self.dotenv_path = (self.dotenv_path or os.environ.get("WEATHER_DOTENV_PATH")
+                                    or DEFAULT_DOTENV_PATH)
+            self._checked_at = now
+            invalidated, self._invalidated = self._invalidated, False
+            signature = (_mtime(self.path), _mtime(self.dotenv_path))
+            if self._config is None:
+                return self._load(signature)
+            if invalidated or signature != self._signature:
+                try:
+                    self._load(signature)
+                except (OSError, ValueError) as e:
+                    # Don't retry until the files change again
+                    self._signature = signature
+                    print(f"Keeping previous weather config; reload failed: {e}", file=sys.stderr)
+            return self._config
+
+    def invalidate(self):
+        """Force a reload on the next get(). Safe to call from a signal handler."""
+        self._invalidated = True
+
+    def install_signal_handler(self, loop=None):
+        """Reload the config on SIGHUP, where the platform has it."""
+        if not hasattr(signal, "SIGHUP"):
+            return
+        if loop is not None:
+            loop.add_signal_handler(signal.SIGHUP, self.invalidate)
+        else:
+            signal.signal(signal.SIGHUP, lambda signum, frame: self.invalidate())
+
+
+weather_config = ConfigProvider()
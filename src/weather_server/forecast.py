@@ -0,0 +1,106 @@
+import threading
+from collections import deque
+
+from src.shared.metrics import percentile
+
+DEFAULT_FORECAST_SETTINGS = {
+    # How many days to fetch when a forecast isn't cached:
+    #   "adaptive" - enough to cover `coverage` of recently requested horizons
+    #   "max"      - always max_days
+    #   "exact"    - only the days requested
+    "widen": "adaptive",
+    "max_days": 10,       # longest horizon worth fetching; WeatherAPI plans cap it at 3-14
+    "coverage": 0.9,
+    "window": 256,        # requested horizons the adaptive policy remembers
+}
+
+WIDEN_MODES = ("adaptive", "max", "exact")
+
+
+def forecast_settings(config: dict) -> dict:
+    """Return the forecast horizon settings with defaults applied."""
+    return {**DEFAULT_FORECAST_SETTINGS, **config.get("forecast", {})}
+
+
+def forecast_days(data: dict) -> int:
+    """Number of days in a forecast response."""
+    return len((data.get("forecast") or {}).get("forecastday") or [])
+
+
+def slice_forecast(data: dict, days: int) -> dict:
+    """Return data with only the first days of forecast.forecastday.
+
+    The cached response is not modified; a shallow copy is returned when it
+    holds more days than requested.
+    """
+    if forecast_days(data) <= days:
+        return data
+    forecast = data["forecast"]
+    return {**data, "forecast": {**forecast, "forecastday": forecast["forecastday"][:days]}}
+
+
+class HorizonPolicy:
+    """Decides how many forecast days to fetch, so shorter requests can be sliced locally.
+
+    One upstream call for the widest horizon in demand answers every shorter
+    request for that location until it expires. The policy also notices when
+    the API returns fewer days than asked for (the plan's cap) and then treats
+    a capped response as covering any longer request.
+    """
+
+    def __init__(self, widen: str = "adaptive", max_days: int = 10, coverage: float = 0.9,
+                 window: int = 256):
+        if widen not in WIDEN_MODES:
+            raise ValueError(f"Unknown forecast widen mode: {widen}")
+        self.widen = widen
+        self.max_days = max_days
+        self.coverage = coverage
+        self._recent = deque(maxlen=window)
+        self._lock = threading.Lock()
+        # Longest horizon the API has been seen to return, once it returned fewer days than asked
+        self.upstream_limit = None
+
+    def observe(self, days: int):
+        """Record a requested horizon."""
+        with self._lock:
+            self._recent.append(days)
+
+    def fetch_days(self, days: int) -> int:
+        """Days to request upstream for a request of days that missed the cache."""
+        if self.widen == "exact" or days >= self.max_days:
+            return days
+        if self.widen == "max":
+            return self.max_days
+        with self._lock:
+            recent = sorted(self._recent)
+        return min(self.max_days, max(days, percentile(recent, self.coverage)))
+
+    def covers(self, data: dict, days: int) -> bool:
+        """Whether a cached forecast can answer a request for days."""
+        available = forecast_days(data)
+        return available >= days or (self.upstream_limit is not None and available >= self.upstream_limit)
+
+    def learn(self, requested: int, data: dict):
+        """Note how many days the API actually returned for a request."""
+        returned = forecast_days(data)
+        if returned < requested:
+            self.upstream_limit = returned
+        elif self.upstream_limit is not None and returned > self.upstream_limit:
+            self.upstream_limit = None
+
+    def stats(self) -> dict:
+        with self._lock:
+            recent = sorted(self._recent)
+        return {
+            "widen": self.widen,
+            "fetch_days": self.fetch_days(1),
+            "p50_requested_days": percentile(recent, 0.5),
+            "upstream_limit": self.upstream_limit,
+        }
+
+
+def build_horizon_policy(config: dict) -> HorizonPolicy:
+    """Create the forecast horizon policy described by config."""
+    settings = forecast_settings(config)
+    return HorizonPolicy(settings["widen"], settings["max_days"], settings["coverage"],
+                         settings["window"])
@@ -1,38 +1,67 @@
 import requests
-import json
-import os
+from .cache import build_response_cache, cache_settings, make_cache_key
+from .config import weather_config
+from .retry import build_retrier
+
+_response_cache = None
+_retrier = None
 
 
 def load_weather_config():
-    """Load weather configuration from config file."""
-    config_path = os.path.join(os.path.dirname(
-        __file__), '../../config/weather_config.json')
-    with open(config_path, 'r') as f:
-        return json.load(f)
+    """Return the weather configuration, re-read from disk only when it changes."""
+    return weather_config.get()
+
+
+def get_response_cache(config):
+    """Return the process-wide response cache, creating it on first use."""
+    global _response_cache
+    if _response_cache is None:
+        _response_cache = build_response_cache(config)
+    return _response_cache
+
+
+def get_retrier(config):
+    """Return the process-wide upstream retrier, creating it on first use."""
+    global _retrier
+    if _retrier is None:
+        _retrier = build_retrier(config)
+    return _retrier
+
+
+def _cached_request(config, endpoint, location, params, ttl_setting):
+    """Request an endpoint, serving repeat lookups of a location from the cache."""
+    cache = get_response_cache(config)
+    key = make_cache_key(endpoint, location, config, *sorted(params.items()))
+    if cache is not None:
+        data = cache.get(key)
+        if data is not None:
+            return data
+
+    url = f"{config['base_url']}/{endpoint}"
+
+    def request():
+        response = requests.get(url, params={"key": config["api_key"], "q": location, **params},
+                                timeout=config["timeout"])
+        response.raise_for_status()
+        return response.json()
+
+    data = get_retrier(config).call_sync(request)
+
+    if cache is not None:
+        cache.set(key, data, ttl=cache_settings(config)[ttl_setting])
+    return data
 
 
 def get_current_weather(location):
     """Function to fetch current weather data for a given location"""
     config = load_weather_config()
-    api_key = config["api_key"]
-    url = f"{config['base_url']}/current.json"
-    params = {"key": api_key, "q": location}
-
-    response = requests.get(url, params=params, timeout=config["timeout"])
-    response.raise_for_status()
-    return response.json()
+    return _cached_request(config, "current.json", location, {}, "current_ttl")
 
 
 def get_forecast(location, days=3):
     """Function to fetch weather forecast data for a given location"""
     config = load_weather_config()
-    api_key = config["api_key"]
-    url = f"{config['base_url']}/forecast.json"
-    params = {"key": api_key, "q": location, "days": days}
-
-    response = requests.get(url, params=params, timeout=config["timeout"])
-    response.raise_for_status()
-    return response.json()
+    return _cached_request(config, "forecast.json", location, {"days": days}, "forecast_ttl")
 
 
 def handle_weather_request(request):
@@ -0,0 +1,169 @@
+import asyncio
+import sys
+import threading
+import time
+
+from src.shared.metrics import metrics
+from src.shared.retry import TokenBucket
+
+DEFAULT_PREFETCH_SETTINGS = {
+    "enabled": True,
+    "top_n": 10,                # most popular lookups kept warm
+    "min_score": 2.0,           # popularity needed to qualify, roughly two recent lookups
+    "half_life": 1800,          # seconds for a lookup's popularity to halve
+    "refresh_ahead": 60,        # refresh entries expiring within this many seconds
+    "interval": 15,             # seconds between checks
+    "requests_per_hour": 300,   # upstream budget for background refreshes
+    "locations": [],            # always kept warm, along with default_location
+    "max_tracked": 1000,
+    "max_failures": 3,          # failures in a row before a key waits for its next lookup
+}
+
+
+def prefetch_settings(config: dict) -> dict:
+    """Return the background prefetch settings with defaults applied."""
+    return {**DEFAULT_PREFETCH_SETTINGS, **config.get("prefetch", {})}
+
+
+class Prefetcher:
+    """Keeps the most popular lookups cached by refreshing them shortly before they expire.
+
+    Every lookup is passed to record() with its cache key and the arguments
+    refresh() needs to fetch it again. Popularity decays exponentially with
+    half_life, so yesterday's hot city doesn't stay warm forever. Every
+    interval the top_n keys (plus any pinned ones) that are missing or expire
+    within refresh_ahead seconds are refreshed, as long as the hourly request
+    budget allows. A key whose refresh fails is retried after a backoff that
+    doubles from interval with each failure in a row; after max_failures it
+    is skipped until a client looks it up again, so a pinned location that
+    keeps failing doesn't spend the budget forever. No refreshes run while
+    paused() is true, e.g. while the upstream's circuit breaker is open.
+    """
+
+    def __init__(self, refresh, expires_in, top_n: int = 10, min_score: float = 2.0,
+                 half_life: float = 1800, refresh_ahead: float = 60, interval: float = 15,
+                 requests_per_hour: float = 300, max_tracked: int = 1000, max_failures: int = 3,
+                 paused=None, clock=time.monotonic):
+        self.refresh = refresh
+        self.expires_in = expires_in
+        self.top_n = top_n
+        self.min_score = min_score
+        self.half_life = half_life
+        self.refresh_ahead = refresh_ahead
+        self.interval = interval
+        self.max_tracked = max_tracked
+        self.max_failures = max(1, max_failures)
+        self.paused = paused or (lambda: False)
+        self.budget = TokenBucket(requests_per_hour / 3600, capacity=max(1, top_n), clock=clock)
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._scores = {}  # key -> (score, updated_at, refresh args)
+        self._pinned = {}  # key -> refresh args
+        self._failures = {}  # key -> (failures in a row, retry not before)
+        self.refreshed = 0
+        self.failed = 0
+        self.over_budget = 0
+
+    def _decayed(self, score: float, updated_at: float, now: float) -> float:
+        return score * 0.5 ** ((now - updated_at) / self.half_life)
+
+    def record(self, key, *args):
+        """Count one lookup of key; args are what refresh() needs to fetch it."""
+        now = self._clock()
+        with self._lock:
+            score, updated_at, _ = self._scores.get(key, (0.0, now, None))
+            self._scores[key] = (self._decayed(score, updated_at, now) + 1, now, args)
+            # A client asked for it again, so give a failing key another chance
+            self._failures.pop(key, None)
+            if len(self._scores) > self.max_tracked:
+                # Forget the least popular tenth rather than pruning on every lookup
+                ranked = sorted(self._scores, key=lambda k: self._decayed(*self._scores[k][:2], now))
+                for stale in ranked[:max(1, self.max_tracked // 10)]:
+                    del self._scores[stale]
+
+    def _backing_off(self, key, now: float) -> bool:
+        with self._lock:
+            failures, retry_at = self._failures.get(key, (0, now))
+        return failures >= self.max_failures or now < retry_at
+
+    def _failed(self, key, now: float):
+        with self._lock:
+            failures = self._failures.get(key, (0, now))[0] + 1
+            self._failures[key] = (failures, now + self.interval * 2 ** (failures - 1))
+
+    def pin(self, key, *args):
+        """Keep key warm regardless of its popularity."""
+        self._pinned[key] = args
+
+    def hottest(self) -> list[tuple]:
+        """Return (key, args) for the pinned keys and the top_n popular ones."""
+        now = self._clock()
+        with self._lock:
+            scored = [(self._decayed(score, updated_at, now), key, args)
+                      for key, (score, updated_at, args) in self._scores.items()
+                      if key not in self._pinned]
+        scored.sort(key=lambda item: item[0], reverse=True)
+        popular = [(key, args) for score, key, args in scored[:self.top_n] if score >= self.min_score]
+        return list(self._pinned.items()) + popular
+
+    async def run_once(self) -> int:
+        """Refresh the hot keys that are about to expire; returns how many were refreshed."""
+        refreshed = 0
+        if self.paused():
+            return 0
+        now = self._clock()
+        for key, args in self.hottest():
+            if self._backing_off(key, now):
+                continue
+            remaining = self.expires_in(key)
+            if remaining is not None and remaining > self.refresh_ahead:
+                continue
+            if not self.budget.try_acquire():
+                self.over_budget += 1
+                metrics.incr("prefetch", "over_budget")
+                break
+            try:
+                await self.refresh(*args)
+            except Exception as e:
+                self.failed += 1
+                self._failed(key, now)
+                metrics.incr("prefetch", "failed")
+                print(f"Prefetch of {args} failed: {e}", file=sys.stderr)
+                continue
+            with self._lock:
+                self._failures.pop(key, None)
+            self.refreshed += 1
+            refreshed += 1
+            metrics.incr("prefetch", "refreshed")
+        return refreshed
+
+    async def run(self):
+        """Refresh hot keys every interval seconds until cancelled."""
+        while True:
+            await self.run_once()
+            await asyncio.sleep(self.interval)
+
+    def start(self) -> asyncio.Task:
+        return asyncio.ensure_future(self.run())
+
+    def stats(self) -> dict:
+        return {
+            "tracked": len(self._scores),
+            "pinned": len(self._pinned),
+            "refreshed": self.refreshed,
+            "failed": self.failed,
+            "over_budget": self.over_budget,
+            "backing_off": len(self._failures),
+        }
+
+
+def build_prefetcher(config: dict, refresh, expires_in, paused=None) -> Prefetcher | None:
+    """Create the background prefetcher described by config, or None if disabled."""
+    settings = prefetch_settings(config)
+    if not settings["enabled"]:
+        return None
+    return Prefetcher(refresh, expires_in, top_n=settings["top_n"], min_score=settings["min_score"],
+                      half_life=settings["half_life"], refresh_ahead=settings["refresh_ahead"],
+                      interval=settings["interval"], requests_per_hour=settings["requests_per_hour"],
+                      max_tracked=settings["max_tracked"], max_failures=settings["max_failures"],
+                      paused=paused)
@@ -0,0 +1,96 @@
+DETAIL_LEVELS = ("summary", "standard", "full")
+DEFAULT_DETAIL = "standard"
+
+# Fields kept by detail="summary"; list levels (forecastday) are traversed implicitly
+SUMMARY_FIELDS = (
+    "location.name", "location.region", "location.country", "location.localtime",
+    "current.last_updated", "current.temp_c", "current.feelslike_c", "current.condition.text",
+    "current.wind_kph", "current.wind_dir", "current.humidity", "current.precip_mm",
+    "forecast.forecastday.date", "forecast.forecastday.day.maxtemp_c",
+    "forecast.forecastday.day.mintemp_c", "forecast.forecastday.day.condition.text",
+    "forecast.forecastday.day.daily_chance_of_rain", "forecast.forecastday.day.totalprecip_mm",
+)
+
+# Annotations added by the server rather than WeatherAPI; always passed through
+_KEEP = ("stale",)
+
+_MISSING = object()
+
+
+def _select(value, path: list[str]):
+    """Return the parts of value along path, or _MISSING if the path doesn't exist."""
+    if not path:
+        return value
+    if isinstance(value, list):
+        items = [_select(element, path) for element in value]
+        if all(item is _MISSING for item in items):
+            return _MISSING
+        # Placeholders keep list positions aligned for _merge
+        return [{} if item is _MISSING else item for item in items]
+    if isinstance(value, dict) and path[0] in value:
+        selected = _select(value[path[0]], path[1:])
+        return _MISSING if selected is _MISSING else {path[0]: selected}
+    return _MISSING
+
+
+def _merge(into, value):
+    """Merge two selections taken from the same document."""
+    if isinstance(into, dict) and isinstance(value, dict):
+        for key, item in value.items():
+            into[key] = _merge(into[key], item) if key in into else item
+        return into
+    if isinstance(into, list) and isinstance(value, list) and len(into) == len(value):
+        return [_merge(a, b) for a, b in zip(into, value)]
+    return value
+
+
+def _copy_containers(value):
+    if isinstance(value, dict):
+        return {key: _copy_containers(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_copy_containers(item) for item in value]
+    return value
+
+
+def project_fields(data: dict, fields) -> dict:
+    """Keep only the given dotted field paths, e.g. "current.temp_c".
+
+    Lists along a path are projected element by element, so
+    "forecast.forecastday.day.maxtemp_c" keeps every day's high. Unknown
+    paths are ignored.
+    """
+    result = {}
+    for field in list(fields) + list(_KEEP):
+        selected = _select(data, field.split("."))
+        if selected is not _MISSING:
+            # Fresh containers per field so merging never writes into data
+            result = _merge(result, _copy_containers(selected))
+    return result
+
+
+def _without_hourly(data: dict) -> dict:
+    forecast = data.get("forecast")
+    if not isinstance(forecast, dict) or "forecastday" not in forecast:
+        return data
+    days = [{key: value for key, value in day.items() if key != "hour"}
+            for day in forecast["forecastday"]]
+    return {**data, "forecast": {**forecast, "forecastday": days}}
+
+
+def project(data: dict, fields=None, detail: str = DEFAULT_DETAIL) -> dict:
+    """Shape a WeatherAPI payload for a tool response without modifying it.
+
+    fields, if given, selects exactly those dotted paths. Otherwise detail
+    picks a preset: "summary" keeps a handful of headline fields, "standard"
+    is the full payload minus the hourly forecast blocks, and "full" is the
+    payload as returned by WeatherAPI.
+    """
+    if fields:
+        return project_fields(data, fields)
+    if detail not in DETAIL_LEVELS:
+        raise ValueError(f"Unknown detail level: {detail}")
+    if detail == "summary":
+        return project_fields(data, SUMMARY_FIELDS)
+    if detail == "standard":
+        return _without_hourly(data)
+    return data
@@ -0,0 +1,83 @@
+import sys
+
+import httpx
+
+from src.shared.circuit_breaker import CircuitBreaker
+from src.shared.retry import (NO_RETRY, RETRYABLE_STATUSES, Retrier, RetryDecision, RetryPolicy,
+                              TokenBucket, parse_retry_after)
+
+DEFAULT_RETRY_SETTINGS = {
+    "max_attempts": 4,
+    "base_delay": 0.5,          # seconds; backoff ceiling doubles per attempt
+    "max_delay": 10,
+    "max_retry_after": 60,      # longest Retry-After we are willing to honor
+    "requests_per_second": 20,  # client-side limit on upstream calls
+    "burst": 40,
+}
+
+DEFAULT_CIRCUIT_BREAKER_SETTINGS = {
+    "enabled": True,
+    "failure_threshold": 0.5,   # failure rate that opens the circuit
+    "min_requests": 10,         # outcomes needed in the window before it can open
+    "window": 30,               # seconds of history considered
+    "open_seconds": 30,         # how long to fail fast before probing again
+    "half_open_max_calls": 1,
+}
+
+
+def retry_settings(config: dict) -> dict:
+    """Return the upstream retry and rate-limit settings with defaults applied."""
+    return {**DEFAULT_RETRY_SETTINGS, **config.get("retry", {})}
+
+
+def classify_weather_error(exc) -> RetryDecision:
+    """Retry 429s, transient 5xx responses and connection failures from WeatherAPI."""
+    # Only the legacy handlers use requests; don't import it just to classify httpx errors
+    requests = sys.modules.get("requests")
+    status_errors, transport_errors = (httpx.HTTPStatusError,), (httpx.TransportError,)
+    if requests is not None:
+        status_errors += (requests.HTTPError,)
+        transport_errors += (requests.ConnectionError, requests.Timeout)
+    if isinstance(exc, status_errors) and exc.response is not None:
+        status = exc.response.status_code
+        if status not in RETRYABLE_STATUSES:
+            return NO_RETRY
+        return RetryDecision(True, parse_retry_after(exc.response.headers.get("retry-after")),
+                             throttled=status == 429)
+    if isinstance(exc, transport_errors):
+        return RetryDecision(True)
+    return NO_RETRY
+
+
+def build_retrier(config: dict) -> Retrier:
+    """Create the retrier and token bucket for WeatherAPI described by config."""
+    settings = retry_settings(config)
+    policy = RetryPolicy(max_attempts=settings["max_attempts"], base_delay=settings["base_delay"],
+                         max_delay=settings["max_delay"], max_retry_after=settings["max_retry_after"])
+    bucket = TokenBucket(settings["requests_per_second"], settings["burst"])
+    return Retrier(classify_weather_error, policy, bucket)
+
+
+def circuit_breaker_settings(config: dict) -> dict:
+    """Return the upstream circuit breaker settings with defaults applied."""
+    return {**DEFAULT_CIRCUIT_BREAKER_SETTINGS, **config.get("circuit_breaker", {})}
+
+
+def build_circuit_breaker(config: dict) -> CircuitBreaker | None:
+    """Create the WeatherAPI circuit breaker described by config, or None if disabled.
+
+    Only failures worth retrying (throttling, 5xx, timeouts, connection
+    errors) count against the upstream; a bad location is not an outage.
+    """
+    settings = circuit_breaker_settings(config)
+    if not settings["enabled"]:
+        return None
+    return CircuitBreaker(
+        "WeatherAPI",
+        failure_threshold=settings["failure_threshold"],
+        min_requests=settings["min_requests"],
+        window=settings["window"],
+        open_seconds=settings["open_seconds"],
+        half_open_max_calls=settings["half_open_max_calls"],
+        is_failure=lambda exc: classify_weather_error(exc).retry,
+    )
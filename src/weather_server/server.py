@@ -1,38 +1,103 @@
 #!/usr/bin/env python3
 import mcp.types as types
-from pydantic import AnyUrl
-from mcp.types import Resource, Tool, TextContent, ImageContent, EmbeddedResource
-from mcp.server import NotificationOptions, Server
-from mcp.server.models import InitializationOptions
+from mcp.server import Server
 import asyncio
-import json
 import os
 import sys
-from typing import Any, Sequence
-import requests
+import time
+import httpx
 
 # Add the parent directory to the Python path so we can import modules
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..'))
 
+from src.shared.circuit_breaker import CLOSED, CircuitOpenError
+from src.shared.coalesce import SingleFlight, call_key
+from src.shared.metrics import (DIAGNOSTIC_TOOL_NAME, DIAGNOSTICS, diagnostic_tool, instrument_tool,
+                                metrics)
+from src.shared.progress import report_progress
+from src.shared.serve import parse_transport_args, serve
+from src.shared.utils import dumps
+from src.weather_server.cache import (build_response_cache, build_stale_cache, cache_settings,
+                                      make_cache_key)
+from src.weather_server.config import weather_config
+from src.weather_server.forecast import build_horizon_policy, forecast_days, slice_forecast
+from src.weather_server.prefetch import build_prefetcher, prefetch_settings
+from src.weather_server.projection import DEFAULT_DETAIL, DETAIL_LEVELS, project
+from src.weather_server.retry import build_circuit_breaker, build_retrier, classify_weather_error
 
-# Load config
+# Settings that size long-lived objects (cache, pool, rate limits) are read
+# once here; per-request settings such as the API key come from
+# weather_config.get() so edits apply without a restart.
+config = weather_config.get()
+server = Server("weather-server", version="0.1.0")
+metrics.service = "weather-server"
+# Port for --transport http, where one process serves every MCP client
+DEFAULT_HTTP_PORT = 8765
+response_cache = build_response_cache(config)
+# Last-known-good responses, served marked stale while the upstream is failing
+stale_cache = build_stale_cache(config)
+inflight = SingleFlight()
+retrier = build_retrier(config)
+# Forecasts are cached per location at the widest horizon in demand
+horizon_policy = build_horizon_policy(config)
+# Refreshes popular lookups in the background before they expire; started in main()
+prefetcher = build_prefetcher(
+    config, lambda endpoint, location: refresh_cached(endpoint, location),
+    lambda key: response_cache.expires_in(key) if response_cache is not None else None,
+    # Background refreshes wait while the circuit is open or probing rather than spend the budget
+    paused=lambda: circuit_breaker is not None and circuit_breaker.state != CLOSED,
+) if response_cache is not None else None
+if prefetcher is not None:
+    for location in [config.get("default_location"), *prefetch_settings(config)["locations"]]:
+        if location:
+            prefetcher.pin(make_cache_key("current.json", location, config), "current.json", location)
+circuit_breaker = build_circuit_breaker(config)
 
+# Shared keep-alive client, opened for the lifetime of server.run in main()
+http_client: httpx.AsyncClient | None = None
 
-def load_weather_config():
-    config_path = os.path.join(os.path.dirname(
-        __file__), '../../config/weather_config.json')
-    with open(config_path, 'r') as f:
-        return json.load(f)
 
+def get_http_client() -> httpx.AsyncClient:
+    """Return the shared pooled HTTP client, creating it on first use."""
+    global http_client
+    if http_client is None or http_client.is_closed:
+        max_connections = config.get("max_connections", 20)
+        http_client = httpx.AsyncClient(
+            timeout=config["timeout"],
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_connections,
+            ),
+        )
+    return http_client
 
-config = load_weather_config()
-server = Server("weather-server")
+
+# Response shaping arguments accepted by every tool
+PROJECTION_PROPERTIES = {
+    "fields": {
+        "type": "array",
+        "items": {"type": "string"},
+        "description": "Dotted field paths to return, e.g. current.temp_c or "
+                       "forecast.forecastday.day.maxtemp_c; overrides detail"
+    },
+    "detail": {
+        "type": "string",
+        "enum": list(DETAIL_LEVELS),
+        "description": "summary: headline fields only; standard: everything except hourly "
+                       "forecasts; full: the raw WeatherAPI payload",
+        "default": DEFAULT_DETAIL
+    },
+    "compact": {
+        "type": "boolean",
+        "description": "Return minified JSON instead of indented JSON"
+    }
+}
 
 
 @server.list_tools()
 async def handle_list_tools() -> list[types.Tool]:
     """List available weather tools."""
-    return [
+    tools = [
         types.Tool(
             name="get_current_weather",
             description="Get current weather for a location",
@@ -42,7 +107,8 @@ async def handle_list_tools() -> list[types.Tool]:
                     "location": {
                         "type": "string",
                         "description": "City name or coordinates"
-                    }
+                    },
+                    **PROJECTION_PROPERTIES
                 },
                 "required": ["location"]
             }
@@ -61,74 +127,265 @@ async def handle_list_tools() -> list[types.Tool]:
                         "type": "integer",
                         "description": "Number of forecast days (1-10)",
                         "default": 3
-                    }
+                    },
+                    **PROJECTION_PROPERTIES
                 },
                 "required": ["location"]
             }
+        ),
+        types.Tool(
+            name="get_weather_batch",
+            description="Get current weather or forecasts for many locations in one call",
+            inputSchema={
+                "type": "object",
+                "properties": {
+                    "locations": {
+                        "type": "array",
+                        "items": {"type": "string"},
+                        "description": "City names or coordinates"
+                    },
+                    "type": {
+                        "type": "string",
+                        "enum": ["current", "forecast"],
+                        "description": "Fetch current conditions or forecasts",
+                        "default": "current"
+                    },
+                    "days": {
+                        "type": "integer",
+                        "description": "Number of forecast days (1-10) when type is forecast",
+                        "default": 3
+                    },
+                    "max_concurrency": {
+                        "type": "integer",
+                        "description": "Maximum number of upstream requests in flight",
+                        "minimum": 1
+                    },
+                    **PROJECTION_PROPERTIES
+                },
+                "required": ["locations"]
+            }
         )
     ]
+    if DIAGNOSTICS:
+        tools.append(diagnostic_tool())
+    return tools
 
 
 @server.call_tool()
+@instrument_tool
 async def handle_call_tool(name: str, arguments: dict | None) -> list[types.TextContent]:
     """Handle tool calls."""
+    arguments = arguments or {}
+    settings = weather_config.get()
+    fields = arguments.get("fields")
+    detail = arguments.get("detail", DEFAULT_DETAIL)
+    compact = arguments.get("compact", settings.get("compact_responses", False))
+
     if name == "get_current_weather":
         location = arguments.get("location")
         weather_data = await get_current_weather(location)
-        return [types.TextContent(type="text", text=json.dumps(weather_data, indent=2))]
+        return [types.TextContent(type="text",
+                                  text=dumps(project(weather_data, fields, detail), compact))]
 
     elif name == "get_weather_forecast":
         location = arguments.get("location")
         days = arguments.get("days", 3)
         forecast_data = await get_weather_forecast(location, days)
-        return [types.TextContent(type="text", text=json.dumps(forecast_data, indent=2))]
+        return [types.TextContent(type="text",
+                                  text=dumps(project(forecast_data, fields, detail), compact))]
+
+    elif name == "get_weather_batch":
+        batch_data = await get_weather_batch(
+            arguments["locations"],
+            arguments.get("type", "current"),
+            arguments.get("days", 3),
+            arguments.get("max_concurrency", settings.get("batch_concurrency", 10)),
+            fields=fields,
+            detail=detail,
+        )
+        return [types.TextContent(type="text", text=dumps(batch_data, compact))]
+
+    elif name == DIAGNOSTIC_TOOL_NAME:
+        return [types.TextContent(type="text", text=dumps(server_stats(), compact))]
 
     else:
         raise ValueError(f"Unknown tool: {name}")
 
 
+async def fetch_weather_api(endpoint: str, params: dict) -> dict:
+    """Call a WeatherAPI endpoint over the shared async client.
+
+    Requests are rate limited and retried, and fail fast with
+    CircuitOpenError while the circuit breaker considers the API down.
+    """
+    settings = weather_config.get()
+    url = f"{settings['base_url']}/{endpoint}"
+
+    async def request():
+        with metrics.timer("upstream", endpoint):
+            response = await get_http_client().get(
+                url, params={"key": settings["api_key"], **params}, timeout=settings["timeout"])
+            response.raise_for_status()
+        metrics.incr("upstream_bytes", endpoint, len(response.content))
+        return response.json()
+
+    if circuit_breaker is None:
+        return await retrier.call(request)
+    return await circuit_breaker.call(lambda: retrier.call(request))
+
+
+async def fetch_cached(endpoint: str, location: str, params: dict, ttl_setting: str) -> dict:
+    """Fetch from WeatherAPI, serving repeat lookups of a location from the cache."""
+    settings = weather_config.get()
+    key = make_cache_key(endpoint, location, settings, *sorted(params.items()))
+    if response_cache is not None:
+        data = response_cache.get(key)
+        if data is not None:
+            return data
+    return await fetch_and_store(endpoint, location, params, key, ttl_setting)
+
+
+async def fetch_and_store(endpoint: str, location: str, params: dict, key: tuple,
+                          ttl_setting: str) -> dict:
+    """Fetch from WeatherAPI and cache the response under key.
+
+    Concurrent misses for the same key and parameters share a single
+    upstream request. If the upstream is down (circuit open, or a retryable
+    failure) the last-known-good response is returned instead, with a
+    "stale" entry giving its age and the reason.
+    """
+    settings = weather_config.get()
+
+    async def fetch():
+        try:
+            data = await fetch_weather_api(endpoint, {"q": location, **params})
+        except Exception as e:
+            last_good = stale_cache.get(key) if stale_cache is not None else None
+            if last_good is None or not (
+                    isinstance(e, CircuitOpenError) or classify_weather_error(e).retry):
+                raise
+            fetched_at, data = last_good
+            metrics.incr("stale_responses", endpoint)
+            return {**data, "stale": {"age_seconds": round(time.time() - fetched_at),
+                                      "reason": str(e)}}
+        if response_cache is not None:
+            response_cache.set(key, data, ttl=cache_settings(settings)[ttl_setting])
+        if stale_cache is not None:
+            stale_cache.set(key, (time.time(), data))
+        return data
+
+    return await inflight.do(call_key(endpoint, [key, params]), fetch)
+
+
+def record_lookup(endpoint: str, location: str, key: tuple):
+    if prefetcher is not None:
+        prefetcher.record(key, endpoint, location)
+
+
+async def refresh_cached(endpoint: str, location: str):
+    """Fetch a current or forecast lookup again, replacing its cache entry."""
+    settings = weather_config.get()
+    key = make_cache_key(endpoint, location, settings)
+    if endpoint == "forecast.json":
+        params, ttl_setting = {"days": horizon_policy.fetch_days(1)}, "forecast_ttl"
+    else:
+        params, ttl_setting = {}, "current_ttl"
+    await fetch_and_store(endpoint, location, params, key, ttl_setting)
+
+
 async def get_current_weather(location: str) -> dict:
     """Fetch current weather data."""
-    api_key = config["api_key"]
-    url = f"{config['base_url']}/current.json"
-    params = {"key": api_key, "q": location}
-
-    response = requests.get(url, params=params, timeout=config["timeout"])
-    response.raise_for_status()
-    return response.json()
+    record_lookup("current.json", location,
+                  make_cache_key("current.json", location, weather_config.get()))
+    return await fetch_cached("current.json", location, {}, "current_ttl")
 
 
 async def get_weather_forecast(location: str, days: int) -> dict:
-    """Fetch weather forecast."""
-    api_key = config["api_key"]
-    url = f"{config['base_url']}/forecast.json"
-    params = {"key": api_key, "q": location, "days": days}
+    """Fetch weather forecast, slicing it from a cached longer forecast when possible.
+
+    A miss fetches the horizon chosen by horizon_policy, which may be more
+    days than asked for, so later shorter requests are answered locally.
+    """
+    days = max(1, days)  # WeatherAPI accepts 1 to 14 days
+    settings = weather_config.get()
+    horizon_policy.observe(days)
+    key = make_cache_key("forecast.json", location, settings)
+    record_lookup("forecast.json", location, key)
+    data = response_cache.get(key) if response_cache is not None else None
+    if data is None or not horizon_policy.covers(data, days):
+        fetch_days = horizon_policy.fetch_days(days)
+        data = await fetch_and_store("forecast.json", location, {"days": fetch_days}, key,
+                                     "forecast_ttl")
+        if "stale" not in data:
+            horizon_policy.learn(fetch_days, data)
+        if fetch_days > days:
+            metrics.incr("forecast_horizon", "widened")
+    elif forecast_days(data) > days:
+        metrics.incr("forecast_horizon", "sliced")
+    return slice_forecast(data, days)
+
+
+async def get_weather_batch(locations: list[str], kind: str = "current", days: int = 3,
+                            max_concurrency: int = 10, fields=None, detail: str = "full") -> dict:
+    """Fetch many locations concurrently, at most max_concurrency at a time.
+
+    Each location's data is shaped with project(fields, detail). Each
+    completed location is streamed to the client as a progress notification;
+    the response holds every result or error in input order.
+    """
+    semaphore = asyncio.Semaphore(max(1, max_concurrency))
 
-    response = requests.get(url, params=params, timeout=config["timeout"])
-    response.raise_for_status()
-    return response.json()
+    async def fetch_one(index: int, location: str) -> tuple[int, dict]:
+        async with semaphore:
+            try:
+                if kind == "forecast":
+                    data = await get_weather_forecast(location, days)
+                else:
+                    data = await get_current_weather(location)
+                return index, {"location": location, "data": project(data, fields, detail)}
+            except Exception as e:
+                return index, {"location": location, "error": str(e)}
 
+    results = [None] * len(locations)
+    tasks = [fetch_one(i, location) for i, location in enumerate(locations)]
+    for completed, next_result in enumerate(asyncio.as_completed(tasks), 1):
+        index, result = await next_result
+        results[index] = result
+        await report_progress(server, completed, len(locations),
+                              message=dumps(result, compact=True))
 
-async def main():
-    # Import here to avoid issues with event loops
-    from mcp.server.stdio import stdio_server
+    failed = sum(1 for result in results if "error" in result)
+    return {"results": results, "succeeded": len(results) - failed, "failed": failed}
 
+
+def server_stats() -> dict:
+    """Latency percentiles plus cache, retry, circuit breaker and coalescing counters."""
+    return {
+        **metrics.snapshot(),
+        "response_cache": response_cache.stats() if response_cache is not None else None,
+        "stale_cache": stale_cache.stats() if stale_cache is not None else None,
+        "retries": retrier.stats(),
+        "forecast_horizon": horizon_policy.stats(),
+        "circuit_breaker": circuit_breaker.stats() if circuit_breaker is not None else None,
+        "coalescing": inflight.stats(),
+        "prefetch": prefetcher.stats() if prefetcher is not None else None,
+    }
+
+
+async def main(argv=None):
+    args = parse_transport_args("Weather MCP server", DEFAULT_HTTP_PORT, argv)
     print("Starting weather MCP server...", file=sys.stderr)
 
-    async with stdio_server() as (read_stream, write_stream):
-        print("Weather server ready for MCP connections", file=sys.stderr)
-        await server.run(
-            read_stream,
-            write_stream,
-            InitializationOptions(
-                server_name="weather-server",
-                server_version="0.1.0",
-                capabilities=server.get_capabilities(
-                    notification_options=NotificationOptions(),
-                    experimental_capabilities={},
-                ),
-            ),
-        )
+    weather_config.install_signal_handler(asyncio.get_running_loop())
+
+    # Over HTTP every client shares this client, the caches and the prefetcher
+    async with get_http_client():
+        prefetch_task = prefetcher.start() if prefetcher is not None else None
+        try:
+            await serve(server, args, "Weather server ready for MCP connections")
+        finally:
+            if prefetch_task is not None:
+                prefetch_task.cancel()
 
 
 if __name__ == "__main__":
@@ -1,91 +1,197 @@
 import unittest
 import asyncio
+import hashlib
+import io
+import json
 import tempfile
 import os
+import subprocess
+import sys
+import threading
+import httplib2
+from datetime import datetime, timedelta
 from unittest.mock import patch, MagicMock, mock_open
+from src.gdrive_server import auth, batch, bulk, dedup, listing
+from src.gdrive_server.executor import DriveExecutor
+from src.gdrive_server.index import DriveIndex, translate_query
+from src.gdrive_server import server as gdrive_server
 from src.gdrive_server.handlers import upload_file_to_drive, download_file_from_drive, list_drive_files, delete_file_from_drive
+from src.gdrive_server.transport import RetryingHttp, classify_drive_error, request_kind
+from src.shared.metrics import metrics
+from src.shared.retry import Retrier, RetryPolicy, TokenBucket
+from src.gdrive_server.transfers import (
+    DEFAULT_CHUNK_SIZE, ResumableUpload, UploadSessionStore, align_upload_chunk_size, partial_meta_path,
+    partial_path)
 
 
-class TestGDriveServer(unittest.TestCase):
+class FakeRangeHttp:
+    """Serves content to ranged GET requests the way the Drive media endpoint does."""
+
+    def __init__(self, content):
+        self.content = content
+        self.ranges = []
+
+    def request(self, uri, headers=None):
+        self.ranges.append(headers['range'])
+        start, end = (int(n) for n in headers['range'][len('bytes='):].split('-'))
+        total = len(self.content)
+        if start >= total:
+            return MagicMock(status=416, get=lambda key: f'bytes */{total}'), b''
+        chunk = self.content[start:end + 1]
+        content_range = f'bytes {start}-{start + len(chunk) - 1}/{total}'
+        return MagicMock(status=206, get=lambda key: content_range), chunk
+
+
+def fake_media_request(http):
+    request = MagicMock()
+    request.http = http
+    request.uri = 'https://www.googleapis.com/drive/v3/files/test_file_id?alt=media'
+    request.headers = {}
+    return request
+
 
-    @patch('src.gdrive_server.handlers.MediaFileUpload')
-    @patch('src.gdrive_server.handlers.authenticate')
-    @patch('src.gdrive_server.handlers.build')
-    @patch('os.path.exists')
-    def test_upload_file(self, mock_exists, mock_build, mock_auth, mock_media_upload):
-        # Mock file existence
-        mock_exists.return_value = True
+def drive_revision(content, modified='2026-01-01T00:00:00.000Z'):
+    """files().get metadata for a Drive file holding content."""
+    return {'md5Checksum': hashlib.md5(content).hexdigest(), 'modifiedTime': modified}
 
-        # Mock authentication and service
-        mock_creds = MagicMock()
-        mock_auth.return_value = mock_creds
 
+class TestGDriveServer(unittest.TestCase):
+
+    @patch('src.gdrive_server.transfers.MediaFileUpload')
+    @patch('src.gdrive_server.handlers.get_drive_service')
+    def test_upload_file(self, mock_get_service, mock_media_upload):
+        # Mock the cached Drive service
         mock_service = MagicMock()
-        mock_build.return_value = mock_service
+        mock_get_service.return_value = mock_service
 
         # Mock MediaFileUpload
         mock_media = MagicMock()
+        mock_media.size.return_value = 100
         mock_media_upload.return_value = mock_media
 
-        # Mock file upload response
+        # Mock the resumable upload: one chunk in progress, then done
+        mock_request = MagicMock()
+        mock_request.resumable_uri = None
         mock_file_response = {'id': 'test_file_id',
                               'name': 'test_file.txt', 'size': '100'}
-        mock_service.files().create().execute.return_value = mock_file_response
 
-        # Test the upload file functionality
-        result = upload_file_to_drive('test_file.txt')
+        def next_chunk(http=None):
+            if mock_request.resumable_uri is None:
+                mock_request.resumable_uri = 'https://upload.example/session'
+                return MagicMock(), None
+            return None, mock_file_response
+        mock_request.next_chunk.side_effect = next_chunk
+        mock_service.files().create.return_value = mock_request
 
-        self.assertIsInstance(result, dict)
-        self.assertIn('file_id', result)
-        self.assertEqual(result['file_id'], 'test_file_id')
+        with tempfile.TemporaryDirectory() as tmp:
+            file_path = os.path.join(tmp, 'test_file.txt')
+            with open(file_path, 'wb') as f:
+                f.write(b'x' * 100)
+            sessions = UploadSessionStore(os.path.join(tmp, 'sessions.json'))
 
-    @patch('src.gdrive_server.handlers.MediaIoBaseDownload')
-    @patch('src.gdrive_server.handlers.authenticate')
-    @patch('src.gdrive_server.handlers.build')
-    @patch('builtins.open', new_callable=mock_open)
-    @patch('os.makedirs')
-    def test_download_file(self, mock_makedirs, mock_file_open, mock_build, mock_auth, mock_download):
-        # Mock authentication and service
-        mock_creds = MagicMock()
-        mock_auth.return_value = mock_creds
+            # Test the upload file functionality
+            with patch('src.gdrive_server.handlers.upload_sessions', sessions):
+                result = upload_file_to_drive(file_path)
 
+            self.assertIsInstance(result, dict)
+            self.assertIn('file_id', result)
+            self.assertEqual(result['file_id'], 'test_file_id')
+            self.assertEqual(mock_request.next_chunk.call_count, 2)
+            self.assertEqual(sessions._load(), {})
+            mock_media_upload.assert_called_once_with(
+                file_path, chunksize=DEFAULT_CHUNK_SIZE, resumable=True)
+
+    @patch('src.gdrive_server.handlers.get_drive_service')
+    def test_download_file(self, mock_get_service):
+        # Mock the cached Drive service serving a file in ranged chunks
         mock_service = MagicMock()
-        mock_build.return_value = mock_service
+        mock_get_service.return_value = mock_service
+        content = b'test file content'
+        http = FakeRangeHttp(content)
+        mock_service.files().get_media.return_value = fake_media_request(http)
+        mock_service.files().get().execute.return_value = drive_revision(content)
 
-        # Mock file metadata
-        mock_file_meta = {'name': 'test_file.txt', 'size': '100'}
-        mock_service.files().get.return_value.execute.return_value = mock_file_meta
+        with tempfile.TemporaryDirectory() as tmp:
+            output_path = os.path.join(tmp, 'output.txt')
 
-        # Mock download functionality
-        mock_request = MagicMock()
-        mock_service.files().get_media.return_value = mock_request
+            # Test the download file functionality
+            result = download_file_from_drive('test_file_id', output_path, chunk_size=5)
 
-        # Mock downloader
-        mock_downloader = MagicMock()
-        mock_download.return_value = mock_downloader
-        mock_downloader.next_chunk.side_effect = [(None, False), (None, True)]
+            self.assertIn('File downloaded to', result)
+            with open(output_path, 'rb') as f:
+                self.assertEqual(f.read(), content)
+            self.assertFalse(os.path.exists(partial_path(output_path)))
+            self.assertFalse(os.path.exists(partial_meta_path(output_path)))
+            self.assertEqual(len(http.ranges), 4)
 
-        # Mock BytesIO
-        with patch('src.gdrive_server.handlers.io.BytesIO') as mock_bytesio:
-            mock_fh = MagicMock()
-            mock_bytesio.return_value = mock_fh
-            mock_fh.getvalue.return_value = b'test file content'
+    @patch('src.gdrive_server.handlers.get_drive_service')
+    def test_download_resumes_partial_file(self, mock_get_service):
+        mock_service = MagicMock()
+        mock_get_service.return_value = mock_service
+        http = FakeRangeHttp(b'0123456789')
+        mock_service.files().get_media.return_value = fake_media_request(http)
+        revision = drive_revision(b'0123456789')
+        mock_service.files().get().execute.return_value = revision
 
-            # Test the download file functionality
-            result = download_file_from_drive('test_file_id', 'output.txt')
+        with tempfile.TemporaryDirectory() as tmp:
+            output_path = os.path.join(tmp, 'output.bin')
+            with open(partial_path(output_path), 'wb') as f:
+                f.write(b'012345')
+            with open(partial_meta_path(output_path), 'w') as f:
+                json.dump({'file_id': 'test_file_id', **revision}, f)
 
-            self.assertIsNotNone(result)
-            self.assertIn('File downloaded to', result)
+            download_file_from_drive('test_file_id', output_path, chunk_size=1024)
 
-    @patch('src.gdrive_server.handlers.authenticate')
-    @patch('src.gdrive_server.handlers.build')
-    def test_list_files(self, mock_build, mock_auth):
-        # Mock authentication and service
-        mock_creds = MagicMock()
-        mock_auth.return_value = mock_creds
+            with open(output_path, 'rb') as f:
+                self.assertEqual(f.read(), b'0123456789')
+            self.assertEqual(http.ranges, ['bytes=6-1029'])
 
+    @patch('src.gdrive_server.handlers.get_drive_service')
+    def test_download_restarts_partial_file_of_another_revision(self, mock_get_service):
         mock_service = MagicMock()
-        mock_build.return_value = mock_service
+        mock_get_service.return_value = mock_service
+        http = FakeRangeHttp(b'BBBBBBBBBB')
+        mock_service.files().get_media.return_value = fake_media_request(http)
+        mock_service.files().get().execute.return_value = drive_revision(b'BBBBBBBBBB', '2026-02-01')
+
+        for stale in ({'file_id': 'other_file_id', **drive_revision(b'AAAAAAAAAA', '2026-02-01')},
+                      {'file_id': 'test_file_id', **drive_revision(b'AAAAAAAAAA', '2026-01-01')},
+                      None):
+            with self.subTest(stale=stale), tempfile.TemporaryDirectory() as tmp:
+                output_path = os.path.join(tmp, 'output.bin')
+                with open(partial_path(output_path), 'wb') as f:
+                    f.write(b'AAAAAA')
+                if stale is not None:
+                    with open(partial_meta_path(output_path), 'w') as f:
+                        json.dump(stale, f)
+                http.ranges.clear()
+
+                download_file_from_drive('test_file_id', output_path, chunk_size=1024)
+
+                with open(output_path, 'rb') as f:
+                    self.assertEqual(f.read(), b'BBBBBBBBBB')
+                self.assertEqual(http.ranges, ['bytes=0-1023'])
+
+    @patch('src.gdrive_server.handlers.get_drive_service')
+    def test_download_with_wrong_md5_is_not_renamed_into_place(self, mock_get_service):
+        mock_service = MagicMock()
+        mock_get_service.return_value = mock_service
+        mock_service.files().get_media.return_value = fake_media_request(FakeRangeHttp(b'0123456789'))
+        mock_service.files().get().execute.return_value = drive_revision(b'something else')
+
+        with tempfile.TemporaryDirectory() as tmp:
+            output_path = os.path.join(tmp, 'output.bin')
+
+            with self.assertRaisesRegex(IOError, 'md5'):
+                download_file_from_drive('test_file_id', output_path, chunk_size=1024)
+
+            self.assertEqual(os.listdir(tmp), [])
+
+    @patch('src.gdrive_server.handlers.get_drive_service')
+    def test_list_files(self, mock_get_service):
+        # Mock the cached Drive service
+        mock_service = MagicMock()
+        mock_get_service.return_value = mock_service
 
         # Mock file list response
         mock_files_response = {
@@ -103,15 +209,11 @@ class TestGDriveServer(unittest.TestCase):
         self.assertEqual(len(files), 2)
         self.assertEqual(files[0]['name'], 'file1.txt')
 
-    @patch('src.gdrive_server.handlers.authenticate')
-    @patch('src.gdrive_server.handlers.build')
-    def test_delete_file(self, mock_build, mock_auth):
-        # Mock authentication and service
-        mock_creds = MagicMock()
-        mock_auth.return_value = mock_creds
-
+    @patch('src.gdrive_server.handlers.get_drive_service')
+    def test_delete_file(self, mock_get_service):
+        # Mock the cached Drive service
         mock_service = MagicMock()
-        mock_build.return_value = mock_service
+        mock_get_service.return_value = mock_service
 
         # Mock file metadata for name retrieval
         mock_file_meta = {'name': 'test_file.txt'}
@@ -127,5 +229,624 @@ class TestGDriveServer(unittest.TestCase):
         self.assertIn('deleted successfully', result)
 
 
+class TestResumableUpload(unittest.TestCase):
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.file_path = os.path.join(tmp.name, 'big.bin')
+        with open(self.file_path, 'wb') as f:
+            f.write(b'x' * 1024)
+        self.sessions = UploadSessionStore(os.path.join(tmp.name, 'sessions.json'))
+        self.service = MagicMock()
+        self.request = MagicMock()
+        self.request.resumable_uri = None
+        self.request.resumable_progress = 0
+        self.service.files().create.return_value = self.request
+
+    def test_session_uri_is_persisted_after_first_chunk(self):
+        def next_chunk(http=None):
+            self.request.resumable_uri = 'https://upload.example/session'
+            return MagicMock(), None
+        self.request.next_chunk.side_effect = next_chunk
+
+        upload = ResumableUpload(self.service, self.file_path, {'name': 'big.bin'},
+                                 sessions=self.sessions)
+        self.assertFalse(upload.next_chunk())
+
+        key = UploadSessionStore.session_key(self.file_path, {'name': 'big.bin'})
+        self.assertEqual(self.sessions.get(key), 'https://upload.example/session')
+
+    def test_restarted_upload_resumes_from_server_offset(self):
+        key = UploadSessionStore.session_key(self.file_path, {'name': 'big.bin'})
+        self.sessions.put(key, 'https://upload.example/session')
+        http = MagicMock()
+        http.request.return_value = (MagicMock(status=308, get=lambda h: 'bytes=0-511'), b'')
+
+        upload = ResumableUpload(self.service, self.file_path, {'name': 'big.bin'},
+                                 sessions=self.sessions, http=http)
+
+        self.assertEqual(self.request.resumable_uri, 'https://upload.example/session')
+        self.assertEqual(self.request.resumable_progress, 512)
+        self.assertEqual(http.request.call_args[0][1], 'PUT')
+        self.assertEqual(http.request.call_args[1]['headers']['Content-Range'], 'bytes */1024')
+
+    def test_chunk_size_is_aligned(self):
+        self.assertEqual(align_upload_chunk_size(1), 256 * 1024)
+        self.assertEqual(align_upload_chunk_size(256 * 1024), 256 * 1024)
+        self.assertEqual(align_upload_chunk_size(300 * 1024), 512 * 1024)
+
+
+class TestBulkTransfers(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        patcher = patch.object(bulk, 'RETRY_BACKOFF', 0)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_expand_sources(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            os.makedirs(os.path.join(tmp, 'sub'))
+            for name in ('a.txt', 'b.zip', os.path.join('sub', 'c.zip')):
+                open(os.path.join(tmp, name), 'w').close()
+
+            self.assertEqual([os.path.basename(p) for p in bulk.expand_sources(tmp)],
+                             ['a.txt', 'b.zip'])
+            self.assertEqual(len(bulk.expand_sources(tmp, recursive=True)), 3)
+            self.assertEqual([os.path.basename(p) for p in
+                              bulk.expand_sources(os.path.join(tmp, '**', '*.zip'), recursive=True)],
+                             ['b.zip', 'c.zip'])
+
+    async def test_run_bulk_retries_each_item_and_reports(self):
+        attempts = {}
+
+        def transfer(item):
+            attempts[item] = attempts.get(item, 0) + 1
+            if item == 'flaky' and attempts[item] < 2:
+                raise IOError('connection reset')
+            if item == 'broken':
+                raise IOError('permission denied')
+            return {"bytes": 10}
+
+        report = await bulk.run_bulk(['ok', 'flaky', 'broken'], transfer, max_workers=2, retries=2)
+
+        self.assertEqual((report["total"], report["succeeded"], report["failed"]), (3, 2, 1))
+        self.assertEqual(report["bytes"], 20)
+        self.assertEqual([r["attempts"] for r in report["results"]], [1, 2, 3])
+        self.assertEqual(report["results"][2]["error"], 'permission denied')
+
+        # A retried download keeps its destination and resumes its .part file
+        content = b'0123456789'
+        http = FakeRangeHttp(content)
+        served = http.request
+
+        def drop_second_chunk(uri, headers=None):
+            if len(http.ranges) == 1:
+                http.request = served
+                raise IOError('connection reset')
+            return served(uri, headers)
+        http.request = drop_second_chunk
+        service = MagicMock()
+        service.files().get_media.return_value = fake_media_request(http)
+        service.files().get().execute.return_value = {'name': 'report.pdf', **drive_revision(content)}
+
+        with tempfile.TemporaryDirectory() as tmp, \
+                patch.object(bulk, 'get_thread_http', return_value=http):
+            report = await bulk.bulk_download(service, ['ID1'], tmp, retries=1, chunk_size=4)
+
+            self.assertEqual(report["results"][0]["attempts"], 2)
+            self.assertEqual(report["results"][0]["output_path"], os.path.join(tmp, 'report.pdf'))
+            self.assertEqual(os.listdir(tmp), ['report.pdf'])
+            with open(os.path.join(tmp, 'report.pdf'), 'rb') as f:
+                self.assertEqual(f.read(), content)
+            # The retry continued from the first chunk rather than starting over
+            self.assertEqual(http.ranges, ['bytes=0-3', 'bytes=4-7', 'bytes=8-11'])
+
+    async def test_run_bulk_caps_concurrent_transfers(self):
+        lock = threading.Lock()
+        active = []
+        peak = []
+
+        def transfer(item):
+            with lock:
+                active.append(item)
+                peak.append(len(active))
+            threading.Event().wait(0.01)
+            with lock:
+                active.remove(item)
+            return {}
+
+        await bulk.run_bulk(list(range(12)), transfer, max_workers=3)
+
+        self.assertLessEqual(max(peak), 3)
+
+
+class FakeBatch:
+    """Records added requests and answers them through the batch callback."""
+
+    def __init__(self, callback, failing_ids):
+        self.callback = callback
+        self.failing_ids = failing_ids
+        self.requests = []
+
+    def add(self, request, request_id):
+        self.requests.append((request_id, request))
+
+    def execute(self, http=None):
+        for request_id, request in self.requests:
+            file_id = request.kwargs['fileId']
+            if file_id in self.failing_ids:
+                self.callback(request_id, None, Exception(f"File not found: {file_id}"))
+            else:
+                self.callback(request_id, {'id': file_id}, None)
+
+
+class TestBatchRequests(unittest.TestCase):
+
+    def setUp(self):
+        self.service = MagicMock()
+        self.batches = []
+
+        def new_batch(callback):
+            self.batches.append(FakeBatch(callback, failing_ids={'missing'}))
+            return self.batches[-1]
+        self.service.new_batch_http_request.side_effect = new_batch
+        for method in ('delete', 'get', 'update'):
+            getattr(self.service.files(), method).side_effect = lambda **kwargs: MagicMock(kwargs=kwargs)
+
+    def test_delete_packs_up_to_batch_limit_per_request(self):
+        file_ids = [f'id{i}' for i in range(250)]
+
+        report = batch.batch_delete(self.service, file_ids)
+
+        self.assertEqual(report['batch_requests'], 3)
+        self.assertEqual([len(b.requests) for b in self.batches], [100, 100, 50])
+        self.assertEqual(report['succeeded'], 250)
+        self.assertEqual([r['file_id'] for r in report['results']], file_ids)
+
+    def test_per_item_failures_are_reported(self):
+        report = batch.batch_get_metadata(self.service, ['a', 'missing', 'b'])
+
+        self.assertEqual((report['succeeded'], report['failed']), (2, 1))
+        self.assertEqual(report['results'][0]['file'], {'id': 'a'})
+        self.assertIn('File not found', report['results'][1]['error'])
+
+    def test_update_sends_metadata_bodies(self):
+        report = batch.batch_update_metadata(
+            self.service, [{'file_id': 'a', 'metadata': {'name': 'renamed.txt'}}])
+
+        _, request = self.batches[0].requests[0]
+        self.assertEqual(request.kwargs['body'], {'name': 'renamed.txt'})
+        self.assertEqual(report['results'][0]['status'], 'ok')
+
+
+class FakePagedFiles:
+    """files().list() over a fixed file set, honouring pageSize and pageToken."""
+
+    def __init__(self, count):
+        self.files = [{'id': str(i), 'name': f'file{i}.txt'} for i in range(count)]
+        self.page_sizes = []
+
+    def list(self, pageSize, fields, q, pageToken):
+        self.page_sizes.append(pageSize)
+        start = int(pageToken or 0)
+        end = start + pageSize
+        response = {'files': self.files[start:end]}
+        if end < len(self.files):
+            response['nextPageToken'] = str(end)
+        return MagicMock(**{'execute.return_value': response})
+
+
+class TestListingPagination(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.files = FakePagedFiles(2500)
+        self.service = MagicMock()
+        self.service.files.return_value = self.files
+
+    def test_walks_every_page(self):
+        ids = [f['id'] for f, _ in listing.iter_drive_files(self.service)]
+
+        self.assertEqual(ids, [str(i) for i in range(2500)])
+        self.assertEqual(self.files.page_sizes, [1000, 1000, 1000])
+
+    def test_cursor_resumes_mid_page_without_gaps(self):
+        first = list(listing.iter_drive_files(self.service, limit=1500))
+        cursor = first[-1][1]
+        rest = list(listing.iter_drive_files(self.service, cursor=cursor))
+
+        ids = [f['id'] for f, _ in first + rest]
+        self.assertEqual(ids, [str(i) for i in range(2500)])
+        self.assertIsNone(rest[-1][1])
+        self.assertEqual(self.files.page_sizes[:2], [1000, 500])
+
+    def test_invalid_cursor(self):
+        with self.assertRaises(ValueError):
+            list(listing.iter_drive_files(self.service, cursor='not-a-cursor'))
+
+    @patch('src.gdrive_server.server.get_drive_index', return_value=None)
+    @patch('src.gdrive_server.server.get_thread_http')
+    async def test_list_files_tool_returns_next_cursor(self, mock_http, mock_index):
+        page = await gdrive_server.list_drive_files(self.service, {"max_results": 3})
+        following = await gdrive_server.list_drive_files(
+            self.service, {"max_results": 3, "cursor": page["next_cursor"]})
+
+        self.assertEqual([f['id'] for f in page['files']], ['0', '1', '2'])
+        self.assertEqual([f['id'] for f in following['files']], ['3', '4', '5'])
+
+
+class TestDriveIndex(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.index = DriveIndex(':memory:')
+        self.service = MagicMock()
+        self.service.changes().getStartPageToken().execute.return_value = {'startPageToken': '100'}
+        self.service.files().list().execute.return_value = {'files': [
+            {'id': '1', 'name': 'report.pdf', 'mimeType': 'application/pdf',
+             'modifiedTime': '2024-01-01T00:00:00Z', 'size': '10', 'parents': ['folderA']},
+            {'id': '2', 'name': 'notes.txt', 'mimeType': 'text/plain',
+             'modifiedTime': '2024-01-02T00:00:00Z', 'size': '5', 'parents': ['folderB']},
+        ]}
+        self.index.populate(self.service)
+
+    def test_answers_supported_queries_locally(self):
+        self.assertEqual([f['id'] for f in self.index.query(None, 10)], ['2', '1'])
+        self.assertEqual([f['id'] for f in self.index.query("name = 'report.pdf'", 10)], ['1'])
+        self.assertEqual([f['id'] for f in self.index.query(
+            "mimeType = 'text/plain' and trashed = false", 10)], ['2'])
+        self.assertEqual([f['id'] for f in self.index.query("name contains 'NOTES'", 10)], ['2'])
+        self.assertEqual([f['id'] for f in self.index.query("'folderA' in parents", 10)], ['1'])
+
+    def test_unsupported_queries_fall_back(self):
+        self.assertIsNone(translate_query("fullText contains 'budget'"))
+        self.assertIsNone(translate_query("name = 'a' or name = 'b'"))
+        self.assertIsNone(self.index.query("modifiedTime > '2024-01-01T00:00:00'", 10))
+
+    def test_sync_applies_changes_feed(self):
+        self.service.changes().list().execute.return_value = {
+            'newStartPageToken': '101',
+            'changes': [
+                {'fileId': '1', 'removed': True},
+                {'fileId': '2', 'file': {'id': '2', 'name': 'notes-v2.txt', 'mimeType': 'text/plain',
+                                         'modifiedTime': '2024-01-03T00:00:00Z', 'trashed': False}},
+                {'fileId': '3', 'file': {'id': '3', 'name': 'old.txt', 'trashed': True}},
+            ]}
+
+        self.assertEqual(self.index.sync(self.service), 3)
+
+        self.assertEqual([f['name'] for f in self.index.query("trashed = false", 10)], ['notes-v2.txt'])
+        self.assertEqual([f['id'] for f in self.index.query("trashed = true", 10)], ['3'])
+        self.assertEqual(self.service.changes().list.call_args.kwargs['pageToken'], '100')
+
+    @patch('src.gdrive_server.server.DriveIndex')
+    def test_server_stats_reports_the_existing_index_without_creating_one(self, mock_index_class):
+        with patch.object(gdrive_server, 'drive_index', None):
+            self.assertIsNone(gdrive_server.server_stats()["index_age_seconds"])
+        with patch.object(gdrive_server, 'drive_index', self.index):
+            self.assertLess(gdrive_server.server_stats()["index_age_seconds"], 60)
+        mock_index_class.assert_not_called()
+
+    @patch('src.gdrive_server.server.get_thread_http')
+    async def test_failed_background_build_is_logged_and_counted(self, mock_http):
+        service = MagicMock()
+        service.changes().getStartPageToken().execute.side_effect = IOError("quota exceeded")
+        stderr = io.StringIO()
+        with patch('src.gdrive_server.server.get_drive_index', return_value=DriveIndex(':memory:')), \
+                patch.object(gdrive_server, 'index_failures', 0), \
+                patch.object(gdrive_server, 'index_last_error', None), patch('sys.stderr', stderr):
+            self.assertIsNone(await gdrive_server.list_from_index(service, "", 10, None))
+            await asyncio.gather(*gdrive_server.background_tasks, return_exceptions=True)
+            await asyncio.sleep(0)
+            stats = gdrive_server.server_stats()
+
+        self.assertEqual((stats["index_failures"], stats["index_last_error"]), (1, "quota exceeded"))
+        self.assertIn("Drive index update failed", stderr.getvalue())
+
+    @patch('src.gdrive_server.server.get_thread_http')
+    async def test_list_files_tool_uses_index_until_fresh_requested(self, mock_http):
+        with patch('src.gdrive_server.server.get_drive_index', return_value=self.index):
+            self.service.files().list.reset_mock()
+            cached = await gdrive_server.list_drive_files(self.service, {"max_results": 1})
+            following = await gdrive_server.list_drive_files(
+                self.service, {"max_results": 1, "cursor": cached["next_cursor"]})
+            self.service.files().list.assert_not_called()
+
+            await gdrive_server.list_drive_files(self.service, {"fresh": True})
+            self.service.files().list.assert_called()
+
+        self.assertEqual([f['id'] for f in cached['files'] + following['files']], ['2', '1'])
+        self.assertIsNone(following['next_cursor'])
+
+
+class TestUploadDedup(unittest.TestCase):
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.file_path = os.path.join(tmp.name, 'artifact.zip')
+        with open(self.file_path, 'wb') as f:
+            f.write(b'build output')
+        self.hashes = dedup.HashCache(':memory:')
+        patcher = patch.object(dedup, 'hash_cache', self.hashes)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_hash_cache_skips_unchanged_files(self):
+        first = self.hashes.md5(self.file_path)
+        with patch('src.gdrive_server.dedup.md5_file') as mock_md5:
+            second = self.hashes.md5(self.file_path)
+            mock_md5.assert_not_called()
+
+        self.assertEqual(first, second)
+        self.assertEqual(first, dedup.md5_file(self.file_path))
+        self.assertEqual((self.hashes.hits, self.hashes.misses), (1, 1))
+
+    def test_find_remote_duplicate_matches_md5(self):
+        service = MagicMock()
+        md5 = dedup.md5_file(self.file_path)
+        service.files().list().execute.return_value = {'files': [
+            {'id': 'other', 'md5Checksum': 'ffff'},
+            {'id': 'same', 'md5Checksum': md5},
+        ]}
+
+        match = dedup.find_remote_duplicate(service, self.file_path, "it's.zip",
+                                            hashes=self.hashes)
+
+        self.assertEqual(match['id'], 'same')
+        self.assertEqual(service.files().list.call_args.kwargs['q'],
+                         "name = 'it\\'s.zip' and trashed = false")
+
+    @patch('src.gdrive_server.handlers.ResumableUpload')
+    @patch('src.gdrive_server.handlers.get_drive_service')
+    def test_dedup_upload_returns_existing_file(self, mock_get_service, mock_upload):
+        mock_service = MagicMock()
+        mock_get_service.return_value = mock_service
+        mock_service.files().list().execute.return_value = {'files': [
+            {'id': 'existing_id', 'md5Checksum': dedup.md5_file(self.file_path)}]}
+
+        result = upload_file_to_drive(self.file_path, dedup=True)
+
+        self.assertEqual(result['file_id'], 'existing_id')
+        self.assertTrue(result['deduplicated'])
+        mock_upload.assert_not_called()
+
+
+
+class ScriptedHttp:
+    """Returns a fixed sequence of (status, reason) responses."""
+
+    def __init__(self, *responses):
+        self.responses = list(responses)
+        self.calls = 0
+
+    def request(self, uri, method="GET", body=None, headers=None):
+        status, reason = self.responses[min(self.calls, len(self.responses) - 1)]
+        self.calls += 1
+        content = json.dumps({"error": {"errors": [{"reason": reason}]}} if reason else {"id": "1"})
+        return httplib2.Response({'status': str(status), 'retry-after': '0'}), content.encode()
+
+
+class TestDriveTransport(unittest.TestCase):
+
+    def make_http(self, *responses):
+        self.retrier = Retrier(classify_drive_error, RetryPolicy(max_attempts=3, base_delay=0),
+                               TokenBucket(rate=1000, capacity=100))
+        self.inner = ScriptedHttp(*responses)
+        return RetryingHttp(self.inner, self.retrier)
+
+    def test_rate_limit_403_is_retried(self):
+        http = self.make_http((403, 'userRateLimitExceeded'), (200, None))
+
+        resp, content = http.request('https://www.googleapis.com/drive/v3/files')
+
+        self.assertEqual(resp.status, 200)
+        self.assertEqual(self.inner.calls, 2)
+        self.assertEqual(self.retrier.stats()["throttled"], 1)
+        self.assertLess(self.retrier.bucket.rate, 1000)
+
+    def test_permission_403_is_returned_immediately(self):
+        http = self.make_http((403, 'insufficientFilePermissions'))
+
+        resp, _ = http.request('https://www.googleapis.com/drive/v3/files/1', 'DELETE')
+
+        self.assertEqual(resp.status, 403)
+        self.assertEqual(self.inner.calls, 1)
+
+    def test_last_response_is_returned_when_retries_run_out(self):
+        http = self.make_http((503, 'backendError'))
+
+        resp, content = http.request('https://www.googleapis.com/drive/v3/files', 'POST', body='{}')
+
+        self.assertEqual(resp.status, 503)
+        self.assertEqual(self.inner.calls, 3)
+        self.assertIn(b'backendError', content)
+
+    def test_stream_bodies_are_not_replayed(self):
+        http = self.make_http((503, 'backendError'), (200, None))
+
+        resp, _ = http.request('https://www.googleapis.com/upload/drive/v3/files', 'PUT',
+                               body=io.BytesIO(b'chunk'))
+
+        self.assertEqual(resp.status, 503)
+        self.assertEqual(self.inner.calls, 1)
+
+    def test_every_attempt_is_timed(self):
+        metrics.reset()
+        http = self.make_http((503, 'backendError'), (200, None))
+
+        http.request('https://www.googleapis.com/drive/v3/files?q=x', body='{}')
+
+        snapshot = metrics.snapshot()
+        self.assertEqual(snapshot["latency"]["upstream"]["GET files"]["count"], 2)
+        self.assertEqual(snapshot["counters"]["upstream_bytes_sent"]["GET files"], 4)
+        self.assertEqual(request_kind('https://www.googleapis.com/upload/drive/v3/files', 'PUT'),
+                         'PUT upload')
+        self.assertEqual(request_kind('https://www.googleapis.com/drive/v3/files/1?alt=media', 'GET'),
+                         'GET media')
+
+
+class TestDriveExecutor(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self.executor = DriveExecutor(max_workers=2)
+        self.addCleanup(self.executor.shutdown)
+
+    async def test_blocking_calls_run_concurrently_off_the_loop(self):
+        barrier = threading.Barrier(2, timeout=1)
+        loop_thread = threading.get_ident()
+
+        def blocking_call(value):
+            # Both calls must be in flight at once for the barrier to release
+            barrier.wait()
+            return value, threading.get_ident()
+
+        results = await asyncio.gather(self.executor.run(blocking_call, 'a'),
+                                       self.executor.run(blocking_call, 'b'))
+
+        self.assertEqual([value for value, _ in results], ['a', 'b'])
+        self.assertNotIn(loop_thread, [thread for _, thread in results])
+
+    async def test_queue_depth_metrics(self):
+        release = threading.Event()
+        calls = [self.executor.run(release.wait, 1) for _ in range(5)]
+        tasks = [asyncio.ensure_future(call) for call in calls]
+        await asyncio.sleep(0.05)
+
+        stats = self.executor.stats()
+        self.assertEqual((stats["running"], stats["queued"]), (2, 3))
+
+        release.set()
+        await asyncio.gather(*tasks)
+        stats = self.executor.stats()
+        self.assertEqual((stats["completed"], stats["queued"]), (5, 0))
+        self.assertGreaterEqual(stats["max_queue_depth"], 3)
+
+    @patch('src.gdrive_server.server.get_thread_http')
+    async def test_server_helpers_use_the_executor(self, mock_http):
+        service = MagicMock()
+        with patch.object(gdrive_server, 'drive_executor', self.executor):
+            result = await gdrive_server.delete_file_from_drive(service, {"file_id": "abc"})
+
+        self.assertIn('deleted successfully', result)
+        self.assertEqual(self.executor.stats()["completed"], 1)
+        service.files().delete().execute.assert_called_once_with(http=mock_http.return_value)
+
+
+class TestDriveAuthCache(unittest.TestCase):
+
+    def setUp(self):
+        auth._creds = auth._service = auth._service_creds = None
+        self.addCleanup(setattr, auth, '_creds', None)
+        self.addCleanup(setattr, auth, '_service', None)
+        self.addCleanup(setattr, auth, '_service_creds', None)
+
+    def make_creds(self, expires_in):
+        creds = MagicMock()
+        creds.valid = True
+        creds.expiry = datetime.utcnow() + expires_in
+        return creds
+
+    @patch('src.gdrive_server.auth.build')
+    @patch('src.gdrive_server.auth.authenticate')
+    def test_service_is_built_once(self, mock_auth, mock_build):
+        mock_auth.return_value = self.make_creds(timedelta(hours=1))
+
+        first = auth.get_drive_service()
+        second = auth.get_drive_service()
+
+        self.assertIs(first, second)
+        mock_auth.assert_called_once()
+        mock_build.assert_called_once()
+
+    @patch('src.gdrive_server.auth._save_token')
+    @patch('src.gdrive_server.auth.Request')
+    @patch('src.gdrive_server.auth.authenticate')
+    def test_concurrent_callers_refresh_expiring_token_once(self, mock_auth, mock_request, mock_save):
+        creds = self.make_creds(timedelta(minutes=1))
+
+        def refresh(request):
+            creds.expiry = datetime.utcnow() + timedelta(hours=1)
+        creds.refresh.side_effect = refresh
+        auth._creds = creds
+
+        threads = [threading.Thread(target=auth.get_credentials) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        creds.refresh.assert_called_once()
+        mock_save.assert_called_once_with(creds)
+        mock_auth.assert_not_called()
+
+    @patch('src.gdrive_server.auth.authenticate')
+    def test_api_root_redirects_every_endpoint(self, mock_auth):
+        with patch.multiple(auth, API_ROOT='http://127.0.0.1:8080', NO_AUTH=True):
+            service = auth.get_drive_service()
+
+        mock_auth.assert_not_called()
+        self.assertTrue(auth.get_credentials().valid)
+        self.assertTrue(service.files().list().uri.startswith('http://127.0.0.1:8080/drive/v3/files'))
+        self.assertEqual(service.new_batch_http_request()._batch_uri,
+                         'http://127.0.0.1:8080/batch/drive/v3')
+
+
+class TestGDriveServerCoalescing(unittest.IsolatedAsyncioTestCase):
+
+    @patch('src.gdrive_server.server.get_drive_index', return_value=None)
+    @patch('src.gdrive_server.server.get_thread_http')
+    @patch('src.gdrive_server.server.get_drive_service')
+    async def test_concurrent_identical_list_calls_share_one_request(self, mock_get_service, mock_http, mock_index):
+        mock_service = MagicMock()
+        mock_get_service.return_value = mock_service
+        mock_service.files().list().execute.return_value = {'files': [{'id': '1', 'name': 'a.txt'}]}
+        mock_service.files().list.reset_mock()
+
+        arguments = {"query": "name contains 'a'", "max_results": 10}
+        results = await asyncio.gather(*(
+            gdrive_server.handle_call_tool("list_files", dict(arguments)) for _ in range(8)))
+
+        self.assertEqual(mock_service.files().list.call_count, 1)
+        self.assertTrue(all('a.txt' in r[0].text for r in results))
+
+
+class TestGDriveServerUpload(unittest.IsolatedAsyncioTestCase):
+
+    @patch('src.gdrive_server.server.get_thread_http')
+    @patch('src.gdrive_server.server.report_progress')
+    @patch('src.gdrive_server.server.ResumableUpload')
+    async def test_upload_reports_progress_per_chunk(self, mock_upload_class, mock_progress, mock_http):
+        upload = mock_upload_class.return_value
+        upload.total_size = 300
+        upload.response = {'id': 'new_id'}
+        sent = iter([100, 200])
+
+        def next_chunk(http=None):
+            upload.bytes_sent = next(sent, 300)
+            return upload.bytes_sent == 300
+        upload.next_chunk.side_effect = next_chunk
+
+        result = await gdrive_server.upload_file_to_drive(MagicMock(), {"file_path": "/tmp/big.bin"})
+
+        self.assertEqual(result["file_id"], 'new_id')
+        progress = [c.args[1:3] for c in mock_progress.call_args_list]
+        self.assertEqual(progress, [(100, 300), (200, 300), (300, 300)])
+
+
+class TestColdStart(unittest.TestCase):
+
+    def test_google_client_libraries_load_on_first_use(self):
+        heavy = ["googleapiclient.discovery", "googleapiclient.http", "google_auth_oauthlib",
+                 "google_auth_httplib2", "httplib2"]
+        code = ("import sys, src.gdrive_server.server; "
+                f"print([m for m in {heavy!r} if m in sys.modules])")
+        root = os.path.join(os.path.dirname(__file__), '..')
+
+        output = subprocess.run([sys.executable, "-c", code], cwd=root, capture_output=True,
+                                text=True, check=True).stdout
+
+        self.assertEqual(output.strip(), "[]")
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,519 @@
+import unittest
+import asyncio
+import io
+import json
+import os
+import subprocess
+import sys
+import tempfile
+from unittest.mock import patch
+from src.shared.cache import DiskCache, TTLCache
+from src.shared.circuit_breaker import CircuitBreaker, CircuitOpenError
+from src.shared.coalesce import SingleFlight, call_key
+from src.shared.metrics import Metrics, percentile
+from src.shared.progress import report_progress
+from src.shared import utils
+from src.shared.retry import (NO_RETRY, Retrier, RetryDecision, RetryPolicy, TokenBucket,
+                              parse_retry_after)
+from src.shared.serve import parse_transport_args, serve
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestTTLCache(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+        self.cache = TTLCache(max_entries=2, default_ttl=60, clock=self.clock)
+
+    def test_hit_and_miss_counters(self):
+        self.cache.set("london", {"temp_c": 15})
+
+        self.assertEqual(self.cache.get("london"), {"temp_c": 15})
+        self.assertIsNone(self.cache.get("paris"))
+
+        stats = self.cache.stats()
+        self.assertEqual(stats["hits"], 1)
+        self.assertEqual(stats["misses"], 1)
+        self.assertEqual(stats["hit_rate"], 0.5)
+
+    def test_entries_expire_after_ttl(self):
+        self.cache.set("current", 1)
+        self.cache.set("forecast", 2, ttl=600)
+
+        self.clock.now = 61
+        self.assertIsNone(self.cache.get("current"))
+        self.assertEqual(self.cache.get("forecast"), 2)
+        self.assertEqual(self.cache.stats()["expirations"], 1)
+
+    def test_least_recently_used_entry_is_evicted(self):
+        self.cache.set("a", 1)
+        self.cache.set("b", 2)
+        self.cache.get("a")
+        self.cache.set("c", 3)
+
+        self.assertIn("a", self.cache)
+        self.assertNotIn("b", self.cache)
+        self.assertEqual(self.cache.stats()["evictions"], 1)
+
+    def test_expires_in_is_not_a_lookup(self):
+        self.cache.set("current", 1)
+        self.clock.now = 20
+
+        self.assertEqual(self.cache.expires_in("current"), 40)
+        self.assertIsNone(self.cache.expires_in("forecast"))
+        self.assertEqual(self.cache.stats()["hits"] + self.cache.stats()["misses"], 0)
+
+
+class TestDiskCache(unittest.TestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, "cache.sqlite")
+        self.clock = FakeClock()
+        self.cache = self.open_cache()
+
+    def open_cache(self):
+        cache = DiskCache(self.path, max_entries=2, default_ttl=60, table="responses", clock=self.clock)
+        self.addCleanup(cache.close)
+        return cache
+
+    def test_entries_are_shared_between_instances(self):
+        self.cache.set(("current.json", "london"), {"temp_c": 15})
+
+        restarted = self.open_cache()
+
+        self.assertEqual(restarted.get(("current.json", "london")), {"temp_c": 15})
+        self.assertIsNone(restarted.get(("current.json", "paris")))
+        self.assertEqual(restarted.stats()["hits"], 1)
+        self.assertEqual(restarted.stats()["size"], 1)
+
+    def test_entries_expire_after_ttl(self):
+        self.cache.set("current", 1)
+        self.cache.set("forecast", 2, ttl=600)
+
+        self.clock.now = 61
+        self.assertIsNone(self.cache.get("current"))
+        self.assertEqual(self.cache.get("forecast"), 2)
+        self.assertEqual(self.cache.stats()["expirations"], 1)
+        self.assertEqual(len(self.cache), 1)
+        self.assertEqual(self.cache.expires_in("forecast"), 539)
+
+    def test_least_recently_used_entry_is_evicted(self):
+        self.cache.set("a", 1)
+        self.clock.now = 1
+        self.cache.set("b", 2)
+        self.clock.now = 2
+        self.cache.get("a")
+        self.clock.now = 3
+        self.cache.set("c", 3)
+
+        self.assertIn("a", self.cache)
+        self.assertNotIn("b", self.cache)
+        self.assertEqual(self.cache.stats()["evictions"], 1)
+
+    def test_concurrent_writers_in_other_processes(self):
+        writer = ("import sys; from src.shared.cache import DiskCache; "
+                  "cache = DiskCache(sys.argv[1], max_entries=1000, table='responses'); "
+                  "[cache.set([sys.argv[2], n], n) for n in range(100)]; "
+                  "sys.exit(cache.errors)")
+        processes = [subprocess.Popen([sys.executable, "-c", writer, self.path, name])
+                     for name in ("a", "b", "c")]
+
+        self.assertEqual([process.wait() for process in processes], [0, 0, 0])
+        self.assertEqual(len(self.cache), 300)
+
+    def test_database_errors_are_counted_not_raised(self):
+        import sqlite3
+        from unittest.mock import MagicMock
+
+        self.cache.set("a", 1)
+        self.cache._conn, conn = MagicMock(), self.cache._conn
+        self.addCleanup(conn.close)
+        self.cache._conn.execute.side_effect = sqlite3.OperationalError("database is locked")
+
+        with patch("sys.stderr", io.StringIO()):
+            self.assertIsNone(self.cache.get("a"))
+            self.cache.set("b", 2)
+            self.assertNotIn("a", self.cache)
+            self.assertIsNone(self.cache.expires_in("a"))
+            self.cache.clear()
+            stats = self.cache.stats()
+
+        self.assertEqual((stats["size"], stats["errors"]), (0, 6))
+
+
+class TestSingleFlight(unittest.IsolatedAsyncioTestCase):
+
+    async def test_concurrent_callers_share_one_call(self):
+        flight = SingleFlight()
+        calls = []
+
+        async def upstream():
+            calls.append(1)
+            await asyncio.sleep(0.01)
+            return {"files": []}
+
+        results = await asyncio.gather(*(flight.do("k", upstream) for _ in range(10)))
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, [{"files": []}] * 10)
+        self.assertEqual(flight.stats(), {"started": 1, "coalesced": 9, "in_flight": 0})
+
+    async def test_exceptions_fan_out_and_key_is_released(self):
+        flight = SingleFlight()
+
+        async def failing():
+            await asyncio.sleep(0)
+            raise RuntimeError("upstream down")
+
+        results = await asyncio.gather(flight.do("k", failing), flight.do("k", failing),
+                                       return_exceptions=True)
+        self.assertTrue(all(isinstance(r, RuntimeError) for r in results))
+
+        async def ok():
+            return 42
+        self.assertEqual(await flight.do("k", ok), 42)
+
+    def test_call_key_ignores_argument_order(self):
+        self.assertEqual(call_key("list_files", {"query": "q", "max_results": 5}),
+                         call_key("list_files", {"max_results": 5, "query": "q"}))
+        self.assertNotEqual(call_key("list_files", {}), call_key("delete_file", {}))
+
+
+
+class TestServe(unittest.IsolatedAsyncioTestCase):
+
+    def test_defaults_to_stdio_on_loopback(self):
+        args = parse_transport_args("test", 8700, [])
+        self.assertEqual((args.transport, args.host, args.port), ("stdio", "127.0.0.1", 8700))
+
+    def test_http_refuses_non_loopback_hosts(self):
+        with patch("sys.stderr", io.StringIO()), self.assertRaises(SystemExit):
+            parse_transport_args("test", 8700, ["--transport", "http", "--host", "0.0.0.0"])
+
+    async def start_http(self, server) -> str:
+        """Serve server over --transport http until the test ends; returns its URL."""
+        import socket
+
+        with socket.socket() as sock:
+            sock.bind(("127.0.0.1", 0))
+            port = sock.getsockname()[1]
+        stderr = io.StringIO()
+        args = parse_transport_args("test", port, ["--transport", "http"])
+        with patch("sys.stderr", stderr):
+            task = asyncio.ensure_future(serve(server, args, "ready"))
+            while "ready" not in stderr.getvalue():
+                self.assertFalse(task.done())
+                await asyncio.sleep(0.01)
+
+        async def stop():
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+        self.addAsyncCleanup(stop)
+        return f"http://127.0.0.1:{port}/mcp/"
+
+    async def test_http_serves_concurrent_sessions_from_one_process(self):
+        import mcp.types as types
+        from mcp import ClientSession
+        from mcp.client.streamable_http import streamable_http_client
+        from mcp.server import Server
+
+        server = Server("test-server", version="0.1.0")
+
+        @server.list_tools()
+        async def list_tools():
+            return [types.Tool(name="ping", description="Ping", inputSchema={"type": "object"})]
+
+        url = await self.start_http(server)
+
+        async def client():
+            async with streamable_http_client(url) as streams, \
+                    ClientSession(streams[0], streams[1]) as session:
+                info = await session.initialize()
+                tools = await session.list_tools()
+                return info.serverInfo.name, [tool.name for tool in tools.tools]
+
+        results = await asyncio.gather(client(), client(), client())
+        self.assertEqual(results, [("test-server", ["ping"])] * 3)
+
+    async def test_http_progress_arrives_on_the_calls_response_stream(self):
+        import httpx
+        import mcp.types as types
+        from mcp.server import Server
+
+        server = Server("test-server", version="0.1.0")
+
+        @server.call_tool()
+        async def call_tool(name, arguments):
+            for done in (1, 2):
+                await report_progress(server, done, 2, f"step {done}")
+            return [types.TextContent(type="text", text="done")]
+
+        url = await self.start_http(server)
+        headers = {"Accept": "application/json, text/event-stream"}
+        async with httpx.AsyncClient(headers=headers, timeout=10) as client:
+            response = await client.post(url, json={
+                "jsonrpc": "2.0", "id": 1, "method": "initialize",
+                "params": {"protocolVersion": types.LATEST_PROTOCOL_VERSION, "capabilities": {},
+                           "clientInfo": {"name": "test", "version": "1"}}})
+            headers = {"mcp-session-id": response.headers["mcp-session-id"],
+                       "mcp-protocol-version": types.LATEST_PROTOCOL_VERSION}
+            await client.post(url, headers=headers,
+                              json={"jsonrpc": "2.0", "method": "notifications/initialized"})
+            # Every event of the tool call's own POST response, up to its result
+            response = await client.post(url, headers=headers, json={
+                "jsonrpc": "2.0", "id": 2, "method": "tools/call",
+                "params": {"name": "work", "arguments": {}, "_meta": {"progressToken": "t"}}})
+        events = [json.loads(line[len("data:"):]) for line in response.text.splitlines()
+                  if line.startswith("data:")]
+        progress = [event["params"] for event in events
+                    if event.get("method") == "notifications/progress"]
+        self.assertEqual([(p["progressToken"], p["progress"], p["total"]) for p in progress],
+                         [("t", 1, 2), ("t", 2, 2)])
+        self.assertEqual(events[-1]["id"], 2)
+
+
+class TestRetry(unittest.IsolatedAsyncioTestCase):
+
+    def test_parse_retry_after(self):
+        self.assertEqual(parse_retry_after("3"), 3.0)
+        self.assertEqual(parse_retry_after("Wed, 21 Oct 2015 07:28:00 GMT"), 0.0)
+        self.assertIsNone(parse_retry_after(None))
+        self.assertIsNone(parse_retry_after("soon"))
+
+    def test_backoff_is_jittered_and_capped(self):
+        policy = RetryPolicy(base_delay=1, max_delay=4, max_retry_after=10)
+
+        for attempt in range(1, 6):
+            self.assertLessEqual(policy.delay(attempt), min(4, 2 ** (attempt - 1)))
+        self.assertEqual(policy.delay(1, retry_after=2.5), 2.5)
+        self.assertEqual(policy.delay(1, retry_after=30), 10)
+
+    def test_token_bucket_spaces_out_requests_beyond_burst(self):
+        clock = FakeClock()
+        bucket = TokenBucket(rate=10, capacity=2, clock=clock)
+
+        self.assertEqual([bucket.reserve() for _ in range(4)], [0.0, 0.0, 0.1, 0.2])
+        clock.now = 1.0
+        self.assertEqual(bucket.reserve(), 0.0)
+
+    def test_try_acquire_never_waits(self):
+        clock = FakeClock()
+        bucket = TokenBucket(rate=10, capacity=2, clock=clock)
+
+        self.assertEqual([bucket.try_acquire() for _ in range(3)], [True, True, False])
+        clock.now = 0.1
+        self.assertTrue(bucket.try_acquire())
+
+    def test_throttle_slows_and_pauses_bucket_until_recovered(self):
+        clock = FakeClock()
+        bucket = TokenBucket(rate=10, capacity=1, clock=clock)
+
+        bucket.throttle(pause=5)
+        self.assertEqual(bucket.rate, 5)
+        self.assertEqual(bucket.reserve(), 5)
+        for _ in range(10):
+            bucket.recover()
+        self.assertEqual(bucket.rate, 10)
+
+    async def test_retries_transient_failures(self):
+        attempts = []
+
+        async def flaky():
+            attempts.append(1)
+            if len(attempts) < 3:
+                raise ConnectionError("reset")
+            return "ok"
+
+        retrier = Retrier(lambda exc: RetryDecision(True, retry_after=0), RetryPolicy(max_attempts=3))
+
+        self.assertEqual(await retrier.call(flaky), "ok")
+        self.assertEqual(retrier.stats(), {"calls": 1, "retries": 2, "throttled": 0, "failures": 0})
+
+    def test_gives_up_on_permanent_failures_and_exhausted_attempts(self):
+        def failing():
+            raise ValueError("bad request")
+
+        permanent = Retrier(lambda exc: NO_RETRY)
+        with self.assertRaises(ValueError):
+            permanent.call_sync(failing)
+        self.assertEqual(permanent.stats()["retries"], 0)
+
+        bucket = TokenBucket(rate=1000, capacity=10)
+        throttled = Retrier(lambda exc: RetryDecision(True, 0, throttled=True),
+                            RetryPolicy(max_attempts=2), bucket)
+        with self.assertRaises(ValueError):
+            throttled.call_sync(failing)
+        self.assertEqual(throttled.stats(), {"calls": 1, "retries": 1, "throttled": 2,
+                                             "failures": 1, "rate_limit": 250.0})
+
+
+class TestCircuitBreaker(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+        self.breaker = CircuitBreaker("test", failure_threshold=0.5, min_requests=4, window=10,
+                                      open_seconds=5, is_failure=lambda exc: isinstance(exc, IOError),
+                                      clock=self.clock)
+
+    async def ok(self):
+        return "ok"
+
+    async def down(self):
+        raise IOError("upstream down")
+
+    async def open_circuit(self):
+        await self.breaker.call(self.ok)
+        await self.breaker.call(self.ok)
+        for _ in range(2):
+            with self.assertRaises(IOError):
+                await self.breaker.call(self.down)
+
+    async def test_opens_at_failure_rate_and_fails_fast(self):
+        await self.open_circuit()
+
+        with self.assertRaises(CircuitOpenError) as raised:
+            await self.breaker.call(self.ok)
+        self.assertEqual(raised.exception.retry_in, 5)
+        self.assertEqual(self.breaker.stats()["state"], "open")
+        self.assertEqual(self.breaker.stats()["rejected"], 1)
+
+    async def test_non_failures_do_not_count(self):
+        async def bad_request():
+            raise ValueError("no such location")
+
+        for _ in range(6):
+            with self.assertRaises(ValueError):
+                await self.breaker.call(bad_request)
+
+        self.assertEqual(self.breaker.state, "closed")
+
+    async def test_half_open_probe_closes_or_reopens(self):
+        await self.open_circuit()
+
+        self.clock.now = 5
+        self.assertEqual(self.breaker.state, "half_open")
+        with self.assertRaises(IOError):
+            await self.breaker.call(self.down)
+        self.assertEqual(self.breaker.state, "open")
+
+        self.clock.now = 10
+        self.assertEqual(await self.breaker.call(self.ok), "ok")
+        self.assertEqual(self.breaker.state, "closed")
+        self.assertEqual(self.breaker.stats()["opened"], 2)
+
+    async def test_half_open_admits_limited_probes(self):
+        await self.open_circuit()
+        self.clock.now = 5
+        release = asyncio.Event()
+
+        async def slow_probe():
+            await release.wait()
+            return "ok"
+
+        probe = asyncio.ensure_future(self.breaker.call(slow_probe))
+        await asyncio.sleep(0)
+        with self.assertRaises(CircuitOpenError):
+            await self.breaker.call(self.ok)
+        release.set()
+
+        self.assertEqual(await probe, "ok")
+        self.assertEqual(self.breaker.state, "closed")
+
+    async def test_calls_from_before_the_trip_are_not_probes(self):
+        release_old, release_probe = asyncio.Event(), asyncio.Event()
+
+        async def slow(release):
+            await release.wait()
+            return "ok"
+
+        old = asyncio.ensure_future(self.breaker.call(lambda: slow(release_old)))
+        await asyncio.sleep(0)
+        await self.open_circuit()
+        self.clock.now = 5
+        probe = asyncio.ensure_future(self.breaker.call(lambda: slow(release_probe)))
+        await asyncio.sleep(0)
+
+        # The old call finishing neither closes the circuit nor frees a probe slot
+        release_old.set()
+        self.assertEqual(await old, "ok")
+        self.assertEqual(self.breaker.state, "half_open")
+        with self.assertRaises(CircuitOpenError):
+            await self.breaker.call(self.ok)
+
+        release_probe.set()
+        self.assertEqual(await probe, "ok")
+        self.assertEqual(self.breaker.state, "closed")
+
+
+class TestSerializer(unittest.TestCase):
+
+    PAYLOAD = {"files": [{"id": "1", "name": "Réunion.txt", "size": "10"}], 1: None}
+
+    def test_backends_agree(self):
+        for backend in utils.SERIALIZERS:
+            dumps = utils.get_serializer(backend)
+            with self.subTest(backend=backend):
+                expected = {"files": self.PAYLOAD["files"], "1": None}
+                self.assertEqual(json.loads(dumps(self.PAYLOAD)), expected)
+                self.assertEqual(json.loads(dumps(self.PAYLOAD, compact=True)), expected)
+                self.assertNotIn("\n", dumps(self.PAYLOAD, compact=True))
+                self.assertIn('\n  "files"', dumps(self.PAYLOAD))
+
+    def test_backend_selection(self):
+        self.assertIs(utils.get_serializer("json"), utils._stdlib_dumps)
+        with patch.dict("os.environ", {"MCP_JSON_BACKEND": "json"}):
+            self.assertIs(utils.get_serializer(), utils._stdlib_dumps)
+        with self.assertRaises(ValueError):
+            utils.get_serializer("simdjson")
+
+
+class TestMetrics(unittest.TestCase):
+
+    def setUp(self):
+        self.metrics = Metrics("test-server", log="off")
+
+    def test_percentiles_use_nearest_rank(self):
+        values = [float(n) for n in range(1, 101)]
+
+        self.assertEqual(percentile(values, 0.50), 50.0)
+        self.assertEqual(percentile(values, 0.99), 99.0)
+        self.assertEqual(percentile([], 0.95), 0.0)
+
+    def test_timer_records_latency_and_errors(self):
+        with self.metrics.timer("upstream", "forecast.json"):
+            pass
+        with self.assertRaises(RuntimeError):
+            with self.metrics.timer("upstream", "forecast.json"):
+                raise RuntimeError("boom")
+
+        snapshot = self.metrics.snapshot()
+        self.assertEqual(snapshot["latency"]["upstream"]["forecast.json"]["count"], 2)
+        self.assertEqual(snapshot["counters"]["upstream_errors"], {"forecast.json": 1})
+
+    def test_events_are_json_lines(self):
+        stream = io.StringIO()
+        self.metrics._log = "stream"
+        self.metrics._log_file = stream
+
+        with self.metrics.timer("tool", "get_current_weather", cached=True):
+            pass
+
+        event = json.loads(stream.getvalue())
+        self.assertEqual(event["service"], "test-server")
+        self.assertEqual(event["event"], "tool")
+        self.assertEqual(event["key"], "get_current_weather")
+        self.assertTrue(event["ok"])
+        self.assertTrue(event["cached"])
+
+
+if __name__ == '__main__':
+    unittest.main()
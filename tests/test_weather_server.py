@@ -1,11 +1,52 @@
 import unittest
 import asyncio
+import io
+import json
+import os
+import subprocess
+import sys
+import tempfile
 from unittest.mock import patch, MagicMock
+import httpx
+from src.weather_server import handlers
+from src.weather_server.cache import build_response_cache, normalize_location
 from src.weather_server.handlers import fetch_current_weather, get_current_weather
+from src.shared.cache import DiskCache, TTLCache
+from src.shared.circuit_breaker import CircuitBreaker, CircuitOpenError
+from src.shared.metrics import metrics
+from src.weather_server.config import ConfigProvider, env_overrides
+from src.weather_server.forecast import HorizonPolicy
+from src.weather_server.prefetch import Prefetcher
+from src.weather_server.projection import project
+from src.weather_server.retry import build_retrier, classify_weather_error
+
+TEST_CONFIG = {
+    "api_key": "test_key",
+    "base_url": "https://api.weatherapi.com/v1",
+    "timeout": 10
+}
+
+
+def import_weather_server():
+    """Import the MCP weather server module against a temporary config file."""
+    with tempfile.NamedTemporaryFile('w', suffix='.json', delete=False) as f:
+        json.dump(TEST_CONFIG, f)
+    try:
+        with patch.dict(os.environ, {"WEATHER_CONFIG_PATH": f.name}):
+            from src.weather_server import server
+    finally:
+        os.unlink(f.name)
+    return server
+
+
+weather_server = import_weather_server()
 
 
 class TestWeatherServer(unittest.TestCase):
 
+    def setUp(self):
+        handlers._response_cache = None
+
     @patch('src.weather_server.handlers.requests.get')
     @patch('src.weather_server.handlers.load_weather_config')
     def test_fetch_current_weather(self, mock_config, mock_get):
@@ -60,6 +101,514 @@ class TestWeatherServer(unittest.TestCase):
         self.assertIn("location", weather_data)
         self.assertIn("current", weather_data)
 
+    @patch('src.weather_server.handlers.requests.get')
+    @patch('src.weather_server.handlers.load_weather_config')
+    def test_repeat_lookups_are_cached(self, mock_config, mock_get):
+        mock_config.return_value = dict(TEST_CONFIG, cache={"merge_country_suffix": True})
+        mock_get.return_value.json.return_value = {"location": {"name": "London"}}
+
+        for city in ("london", "London ", "London,UK"):
+            get_current_weather(city)
+
+        self.assertEqual(mock_get.call_count, 1)
+        self.assertEqual(handlers._response_cache.stats()["hits"], 2)
+
+    def test_normalize_location(self):
+        self.assertEqual(normalize_location("  New   York "), "new york")
+        self.assertEqual(normalize_location("London, UK"), "london,uk")
+        self.assertEqual(normalize_location("London, UK", merge_country_suffix=True), "london")
+        self.assertEqual(normalize_location("51.5, -0.12", merge_country_suffix=True), "51.5,-0.12")
+
+
+class TestWeatherServerAsyncClient(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self.requests = []
+
+        def respond(request):
+            self.requests.append(request)
+            return httpx.Response(200, json={
+                "location": {"name": request.url.params["q"]},
+                "current": {"temp_c": 15}
+            })
+
+        self.client = httpx.AsyncClient(transport=httpx.MockTransport(respond))
+        weather_server.response_cache.clear()
+        patcher = patch.object(weather_server, 'http_client', self.client)
+        patcher.start()
+        policy_patcher = patch.object(weather_server, 'horizon_policy', HorizonPolicy())
+        policy_patcher.start()
+        self.addCleanup(policy_patcher.stop)
+        self.addAsyncCleanup(self.client.aclose)
+        self.addCleanup(patcher.stop)
+
+    async def test_get_current_weather_uses_shared_client(self):
+        results = await asyncio.gather(
+            weather_server.get_current_weather("London"),
+            weather_server.get_current_weather("Paris"))
+
+        self.assertEqual([r["location"]["name"] for r in results], ["London", "Paris"])
+        self.assertEqual(len(self.requests), 2)
+        self.assertEqual(self.requests[0].url.path, "/v1/current.json")
+        self.assertEqual(self.requests[0].url.params["key"], "test_key")
+
+    async def test_get_weather_forecast_passes_days(self):
+        await weather_server.get_weather_forecast("London", 5)
+
+        self.assertEqual(self.requests[0].url.path, "/v1/forecast.json")
+        self.assertEqual(self.requests[0].url.params["days"], "5")
+
+    def forecast_client(self, plan_days=14):
+        """A client whose forecasts hold the requested days, up to plan_days."""
+        def respond(request):
+            self.requests.append(request)
+            days = min(int(request.url.params["days"]), plan_days)
+            return httpx.Response(200, json={"forecast": {"forecastday": [
+                {"date": f"2024-01-{day + 1:02d}"} for day in range(days)]}})
+        client = httpx.AsyncClient(transport=httpx.MockTransport(respond))
+        self.addAsyncCleanup(client.aclose)
+        return patch.object(weather_server, 'http_client', client)
+
+    async def test_shorter_forecasts_are_sliced_from_a_cached_longer_one(self):
+        with self.forecast_client():
+            results = [await weather_server.get_weather_forecast(location, days)
+                       for location, days in [("London", 7), ("london", 3), ("London ", 1)]]
+
+        self.assertEqual(len(self.requests), 1)
+        self.assertEqual([len(r["forecast"]["forecastday"]) for r in results], [7, 3, 1])
+
+    async def test_misses_widen_to_recently_requested_horizons(self):
+        with self.forecast_client():
+            await weather_server.get_weather_forecast("Paris", 7)
+            await weather_server.get_weather_forecast("Oslo", 2)
+            await weather_server.get_weather_forecast("Oslo", 5)
+
+        self.assertEqual([r.url.params["days"] for r in self.requests], ["7", "7"])
+
+    async def test_plan_capped_forecast_covers_longer_requests(self):
+        with self.forecast_client(plan_days=3):
+            first = await weather_server.get_weather_forecast("Rome", 7)
+            second = await weather_server.get_weather_forecast("Rome", 10)
+
+        self.assertEqual(len(self.requests), 1)
+        self.assertEqual(len(second["forecast"]["forecastday"]), 3)
+        self.assertEqual(first, second)
+        self.assertEqual(weather_server.horizon_policy.upstream_limit, 3)
+
+    def test_exact_and_max_widening(self):
+        self.assertEqual(HorizonPolicy("exact").fetch_days(2), 2)
+        self.assertEqual(HorizonPolicy("max", max_days=10).fetch_days(2), 10)
+        self.assertEqual(HorizonPolicy("max", max_days=10).fetch_days(14), 14)
+        with self.assertRaises(ValueError):
+            HorizonPolicy("always")
+
+    async def test_concurrent_identical_calls_share_one_request(self):
+        async def slow_respond(request):
+            self.requests.append(request)
+            await asyncio.sleep(0.01)
+            return httpx.Response(200, json={"forecast": {"forecastday": []}})
+
+        async with httpx.AsyncClient(transport=httpx.MockTransport(slow_respond)) as client:
+            with patch.object(weather_server, 'http_client', client):
+                results = await asyncio.gather(*(
+                    weather_server.handle_call_tool(
+                        "get_weather_forecast", {"location": location, "days": 3})
+                    for location in ["Tokyo"] * 5 + ["tokyo "] * 5))
+
+        self.assertEqual(len(self.requests), 1)
+        self.assertEqual(len({r[0].text for r in results}), 1)
+
+    async def test_diagnostic_tool_reports_latency_and_caches(self):
+        metrics.reset()
+        await weather_server.handle_call_tool("get_current_weather", {"location": "London"})
+        await weather_server.handle_call_tool("get_current_weather", {"location": "London"})
+
+        result = await weather_server.handle_call_tool("get_server_metrics", {})
+
+        stats = json.loads(result[0].text)
+        self.assertEqual(stats["latency"]["tool"]["get_current_weather"]["count"], 2)
+        self.assertEqual(stats["latency"]["upstream"]["current.json"]["count"], 1)
+        self.assertEqual(stats["response_cache"]["hits"], 1)
+        self.assertIn("p95_ms", stats["latency"]["tool"]["get_current_weather"])
+
+    async def test_retries_throttled_requests_honoring_retry_after(self):
+        statuses = iter([429, 503, 200])
+
+        def respond(request):
+            self.requests.append(request)
+            return httpx.Response(next(statuses), headers={"Retry-After": "0"},
+                                  json={"current": {"temp_c": 15}})
+
+        retrier = build_retrier(TEST_CONFIG)
+        async with httpx.AsyncClient(transport=httpx.MockTransport(respond)) as client:
+            with patch.object(weather_server, 'http_client', client), \
+                    patch.object(weather_server, 'retrier', retrier):
+                data = await weather_server.get_current_weather("Oslo")
+
+        self.assertEqual(data, {"current": {"temp_c": 15}})
+        self.assertEqual(len(self.requests), 3)
+        self.assertEqual(retrier.stats()["retries"], 2)
+        self.assertEqual(retrier.stats()["throttled"], 1)
+
+    async def test_client_errors_are_not_retried(self):
+        def respond(request):
+            self.requests.append(request)
+            return httpx.Response(401, json={"error": {"message": "API key is invalid"}})
+
+        async with httpx.AsyncClient(transport=httpx.MockTransport(respond)) as client:
+            with patch.object(weather_server, 'http_client', client):
+                with self.assertRaises(httpx.HTTPStatusError):
+                    await weather_server.get_current_weather("Oslo")
+
+        self.assertEqual(len(self.requests), 1)
+
+
+    async def test_last_known_good_is_served_stale_while_circuit_is_open(self):
+        healthy = True
+
+        def respond(request):
+            self.requests.append(request)
+            if healthy:
+                return httpx.Response(200, json={"current": {"temp_c": 15}})
+            return httpx.Response(500, json={"error": {"message": "Internal error"}})
+
+        breaker = CircuitBreaker("WeatherAPI", min_requests=1, open_seconds=60,
+                                 is_failure=lambda exc: classify_weather_error(exc).retry)
+        retrier = build_retrier(dict(TEST_CONFIG, retry={"max_attempts": 1}))
+        async with httpx.AsyncClient(transport=httpx.MockTransport(respond)) as client:
+            with patch.object(weather_server, 'http_client', client), \
+                    patch.object(weather_server, 'retrier', retrier), \
+                    patch.object(weather_server, 'circuit_breaker', breaker), \
+                    patch.object(weather_server, 'stale_cache', TTLCache()):
+                await weather_server.get_current_weather("Oslo")
+                weather_server.response_cache.clear()
+                healthy = False
+
+                tripped = await weather_server.get_current_weather("Oslo")
+                fast_failed = await weather_server.get_current_weather("Oslo")
+                with self.assertRaises(CircuitOpenError):
+                    await weather_server.get_current_weather("Bergen")
+
+        self.assertEqual(len(self.requests), 2)
+        self.assertEqual(breaker.state, "open")
+        for data in (tripped, fast_failed):
+            self.assertEqual(data["current"], {"temp_c": 15})
+            self.assertEqual(data["stale"]["age_seconds"], 0)
+        self.assertIn("circuit is open", fast_failed["stale"]["reason"])
+
+    async def test_persistent_cache_is_warm_after_restart(self):
+        with tempfile.TemporaryDirectory() as directory:
+            config = dict(TEST_CONFIG, cache={"persistent": True,
+                                              "path": os.path.join(directory, "cache.sqlite")})
+            for _ in range(2):
+                # Each pass stands in for a freshly started server process
+                cache = build_response_cache(config)
+                with patch.object(weather_server, 'response_cache', cache):
+                    data = await weather_server.get_current_weather("London")
+                cache.close()
+
+        self.assertIsInstance(cache, DiskCache)
+        self.assertEqual(data["location"]["name"], "London")
+        self.assertEqual(len(self.requests), 1)
+
+
+class TestConfigProvider(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.path = os.path.join(self.tmp.name, 'weather_config.json')
+        self.dotenv_path = os.path.join(self.tmp.name, '.env')
+        self.now = 0.0
+        self.write_config(api_key="old_key")
+        self.provider = ConfigProvider(self.path, self.dotenv_path, check_interval=1.0,
+                                       clock=lambda: self.now)
+
+    def write_config(self, **overrides):
+        with open(self.path, 'w') as f:
+            json.dump(dict(TEST_CONFIG, **overrides), f)
+
+    def touch(self, path, seconds):
+        stat = os.stat(path)
+        os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + seconds * 10 ** 9))
+
+    def test_reloads_only_when_file_changes(self):
+        first = self.provider.get()
+        self.assertIs(self.provider.get(), first)
+
+        self.write_config(api_key="new_key")
+        self.touch(self.path, 1)
+        self.assertEqual(self.provider.get()["api_key"], "old_key")  # within check_interval
+        self.now = 1.0
+        self.assertEqual(self.provider.get()["api_key"], "new_key")
+        self.now = 2.0
+        self.provider.get()
+        self.assertEqual(self.provider.reloads, 2)
+
+    def test_invalidate_forces_reload(self):
+        self.provider.get()
+        self.provider.invalidate()
+
+        self.provider.get()
+
+        self.assertEqual(self.provider.reloads, 2)
+
+    def test_failed_reload_keeps_last_good_config(self):
+        self.provider.get()
+        with open(self.path, 'w') as f:
+            f.write("{not json")
+        self.touch(self.path, 1)
+        self.now = 1.0
+
+        with patch('sys.stderr'):
+            self.assertEqual(self.provider.get()["api_key"], "old_key")
+
+    def test_environment_overrides_dotenv_overrides_file(self):
+        with open(self.dotenv_path, 'w') as f:
+            f.write("WEATHER_API_KEY=dotenv_key\nWEATHER_TIMEOUT=5\nWEATHER_CACHE__CURRENT_TTL=60\n")
+        with patch.dict(os.environ, {"WEATHER_TIMEOUT": "2.5"}):
+            config = self.provider.get()
+
+        self.assertEqual(config["api_key"], "dotenv_key")
+        self.assertEqual(config["timeout"], 2.5)
+        self.assertEqual(config["cache"], {"current_ttl": 60})
+        self.assertEqual(config["base_url"], TEST_CONFIG["base_url"])
+
+    def test_env_overrides_skip_provider_settings(self):
+        self.assertEqual(env_overrides({"WEATHER_CONFIG_PATH": "/tmp/x.json", "HOME": "/root",
+                                        "WEATHER_BASE_URL": "http://localhost:8080"}),
+                         {"base_url": "http://localhost:8080"})
+
+    def test_string_settings_are_not_json_typed(self):
+        environ = {"WEATHER_API_KEY": "12345", "WEATHER_DEFAULT_LOCATION": "1e10",
+                   "WEATHER_UNITS": "true", "WEATHER_TIMEOUT": "5", "WEATHER_CACHE__PATH": "null"}
+        self.assertEqual(env_overrides(environ, base={"units": "metric"}),
+                         {"api_key": "12345", "default_location": "1e10", "units": "true",
+                          "timeout": 5, "cache": {"path": "null"}})
+
+
+FORECAST = {
+    "location": {"name": "Oslo", "country": "Norway", "lat": 59.91},
+    "current": {"temp_c": 3.0, "condition": {"text": "Snow", "code": 1219}, "uv": 1.0},
+    "forecast": {"forecastday": [
+        {"date": f"2024-01-0{day}", "day": {"maxtemp_c": day, "mintemp_c": -day},
+         "astro": {"sunrise": "09:18 AM"},
+         "hour": [{"time": f"{hour:02d}:00", "temp_c": 1.0} for hour in range(24)]}
+        for day in (1, 2)
+    ]},
+}
+
+
+class TestWeatherProjection(unittest.IsolatedAsyncioTestCase):
+
+    def test_standard_detail_drops_hourly_blocks_without_mutating(self):
+        original = json.dumps(FORECAST)
+
+        projected = project(FORECAST)
+
+        self.assertEqual([set(day) for day in projected["forecast"]["forecastday"]],
+                         [{"date", "day", "astro"}] * 2)
+        self.assertEqual(projected["current"], FORECAST["current"])
+        self.assertEqual(json.dumps(FORECAST), original)
+        self.assertIs(project(FORECAST, detail="full"), FORECAST)
+
+    def test_fields_select_paths_through_lists(self):
+        projected = project(dict(FORECAST, stale={"age_seconds": 5}),
+                            ["current.temp_c", "current.condition.text",
+                             "forecast.forecastday.date", "forecast.forecastday.day.maxtemp_c",
+                             "location.missing"])
+
+        self.assertEqual(projected, {
+            "current": {"temp_c": 3.0, "condition": {"text": "Snow"}},
+            "forecast": {"forecastday": [{"date": "2024-01-01", "day": {"maxtemp_c": 1}},
+                                         {"date": "2024-01-02", "day": {"maxtemp_c": 2}}]},
+            "stale": {"age_seconds": 5},
+        })
+        self.assertIn("uv", FORECAST["current"])
+
+    def test_summary_and_unknown_detail(self):
+        summary = project(FORECAST, detail="summary")
+
+        self.assertEqual(summary["location"], {"name": "Oslo", "country": "Norway"})
+        self.assertNotIn("hour", summary["forecast"]["forecastday"][0])
+        with self.assertRaises(ValueError):
+            project(FORECAST, detail="verbose")
+
+    async def test_tool_applies_projection_and_compact_serialization(self):
+        async def fake_forecast(location, days):
+            return FORECAST
+
+        with patch.object(weather_server, 'get_weather_forecast', fake_forecast):
+            compact = await weather_server.handle_call_tool(
+                "get_weather_forecast",
+                {"location": "Oslo", "fields": ["current.temp_c"], "compact": True})
+            default = await weather_server.handle_call_tool(
+                "get_weather_forecast", {"location": "Oslo"})
+
+        self.assertEqual(compact[0].text, '{"current":{"temp_c":3.0}}')
+        self.assertNotIn('"hour"', default[0].text)
+        self.assertIn('\n  "location"', default[0].text)
+
+
+class TestPrefetcher(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.now = 0.0
+        self.refreshed = []
+        self.expiry = {}
+
+        async def refresh(endpoint, location):
+            self.refreshed.append(location)
+            self.expiry[location] = 300
+
+        self.prefetcher = Prefetcher(refresh, self.expiry.get, top_n=2, min_score=2,
+                                     half_life=600, refresh_ahead=60,
+                                     requests_per_hour=3600, clock=lambda: self.now)
+
+    def lookup(self, location, times=1):
+        for _ in range(times):
+            self.prefetcher.record(location, "current.json", location)
+
+    async def test_popular_lookups_are_refreshed_before_they_expire(self):
+        self.lookup("London", 5)
+        self.lookup("Paris", 3)
+        self.lookup("Tokyo", 2)  # popular enough, but not in the top 2
+        self.lookup("Lima")      # seen once
+        self.expiry.update(London=30, Paris=200)
+
+        await self.prefetcher.run_once()
+
+        self.assertEqual(self.refreshed, ["London"])
+
+    async def test_popularity_decays(self):
+        self.lookup("London", 3)
+        self.now = 1200  # two half-lives: 3 lookups now count as 0.75
+        self.lookup("Paris", 2)
+
+        await self.prefetcher.run_once()
+
+        self.assertEqual(self.refreshed, ["Paris"])
+
+    async def test_refreshes_stay_within_the_budget(self):
+        self.prefetcher.pin("Home", "current.json", "Home")
+        self.lookup("London", 5)
+        self.lookup("Paris", 5)
+
+        await self.prefetcher.run_once()  # the bucket starts with top_n tokens
+        self.assertEqual(self.refreshed, ["Home", "London"])
+        self.assertEqual(self.prefetcher.stats()["over_budget"], 1)
+
+        self.now = 1  # one request per second refills one token
+        await self.prefetcher.run_once()
+        self.assertEqual(self.refreshed, ["Home", "London", "Paris"])
+
+    async def test_failing_key_backs_off_then_waits_for_a_lookup(self):
+        attempts = []
+
+        async def refresh(endpoint, location):
+            attempts.append(self.now)
+            raise httpx.HTTPStatusError("400", request=None, response=None)
+
+        prefetcher = Prefetcher(refresh, self.expiry.get, interval=15, max_failures=3,
+                                requests_per_hour=3600, clock=lambda: self.now)
+        prefetcher.pin("Nowhere", "current.json", "Nowhere")
+        with patch('sys.stderr', io.StringIO()):
+            for self.now in range(0, 300, 15):
+                await prefetcher.run_once()
+            self.assertEqual(attempts, [0, 15, 45])  # backoff of 15s, then 30s, then stop
+            self.assertEqual(prefetcher.stats()["backing_off"], 1)
+
+            prefetcher.record("Nowhere", "current.json", "Nowhere")
+            await prefetcher.run_once()
+        self.assertEqual(attempts, [0, 15, 45, 285])
+
+    async def test_no_refreshes_while_paused(self):
+        paused = True
+        prefetcher = Prefetcher(self.prefetcher.refresh, self.expiry.get, paused=lambda: paused,
+                                clock=lambda: self.now)
+        prefetcher.pin("Home", "current.json", "Home")
+
+        await prefetcher.run_once()
+        self.assertEqual(self.refreshed, [])
+
+        paused = False
+        await prefetcher.run_once()
+        self.assertEqual(self.refreshed, ["Home"])
+
+    async def test_server_refresh_warms_the_cache(self):
+        requests = []
+
+        def respond(request):
+            requests.append(request)
+            return httpx.Response(200, json={"location": {"name": request.url.params["q"]}})
+
+        weather_server.response_cache.clear()
+        prefetcher = Prefetcher(weather_server.refresh_cached,
+                                weather_server.response_cache.expires_in)
+        prefetcher.pin(("current.json", "oslo"), "current.json", "Oslo")
+        async with httpx.AsyncClient(transport=httpx.MockTransport(respond)) as client:
+            with patch.object(weather_server, 'http_client', client):
+                await prefetcher.run_once()
+                await prefetcher.run_once()
+                data = await weather_server.get_current_weather("oslo")
+
+        self.assertEqual(len(requests), 1)
+        self.assertEqual(data["location"]["name"], "Oslo")
+
+
+class TestWeatherBatch(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+        async def respond(request):
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+            await asyncio.sleep(0.01)
+            self.in_flight -= 1
+            location = request.url.params["q"]
+            if location == "Atlantis":
+                return httpx.Response(400, json={"error": {"message": "No matching location"}})
+            return httpx.Response(200, json={"location": {"name": location}})
+
+        self.client = httpx.AsyncClient(transport=httpx.MockTransport(respond))
+        weather_server.response_cache.clear()
+        patcher = patch.object(weather_server, 'http_client', self.client)
+        patcher.start()
+        self.addAsyncCleanup(self.client.aclose)
+        self.addCleanup(patcher.stop)
+
+    @patch('src.weather_server.server.report_progress')
+    async def test_batch_returns_results_and_errors_in_order(self, mock_progress):
+        locations = [f"City {i}" for i in range(12)] + ["Atlantis"]
+
+        batch = await weather_server.get_weather_batch(locations, max_concurrency=4)
+
+        self.assertEqual([r["location"] for r in batch["results"]], locations)
+        self.assertEqual(batch["results"][0]["data"]["location"]["name"], "City 0")
+        self.assertIn("400", batch["results"][-1]["error"])
+        self.assertEqual((batch["succeeded"], batch["failed"]), (12, 1))
+        self.assertLessEqual(self.max_in_flight, 4)
+        self.assertEqual(mock_progress.call_count, len(locations))
+
+
+class TestColdStart(unittest.TestCase):
+
+    def test_server_does_not_import_requests(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.json', delete=False) as f:
+            json.dump(TEST_CONFIG, f)
+        self.addCleanup(os.unlink, f.name)
+        code = ("import sys, src.weather_server.server; "
+                "print('requests' in sys.modules)")
+
+        output = subprocess.run([sys.executable, "-c", code],
+                                cwd=os.path.join(os.path.dirname(__file__), '..'),
+                                env=dict(os.environ, WEATHER_CONFIG_PATH=f.name),
+                                capture_output=True, text=True, check=True).stdout
+
+        self.assertEqual(output.strip(), "False")
+
 
 if __name__ == '__main__':
     unittest.main()